@@ -0,0 +1,161 @@
+-- ============================================================================
+-- Migration: Partition Balance Snapshots
+-- Version: 003
+-- Date: 2025-12-01
+-- Description: Переводит balance_snapshots на помесячные партиции по timestamp
+--              и заменяет индексы одним covering index для index-only scan
+--              в get_by_timerange / get_by_timerange_bulk
+-- ============================================================================
+
+BEGIN;
+
+-- ============================================================================
+-- DEPENDENCIES
+-- ============================================================================
+
+-- Unique constraint на партиционированной таблице обязан включать ключ
+-- партиционирования, поэтому FK на balance_snapshots(id) невозможен
+ALTER TABLE detected_transactions DROP CONSTRAINT IF EXISTS detected_transactions_from_snapshot_id_fkey;
+ALTER TABLE detected_transactions DROP CONSTRAINT IF EXISTS detected_transactions_to_snapshot_id_fkey;
+
+DROP VIEW IF EXISTS v_balance_history;
+DROP VIEW IF EXISTS v_latest_balances;
+
+ALTER TABLE balance_snapshots RENAME TO balance_snapshots_old;
+
+-- ============================================================================
+-- PARTITIONED BALANCE SNAPSHOTS TABLE
+-- ============================================================================
+
+CREATE TABLE balance_snapshots (
+    id UUID NOT NULL DEFAULT gen_random_uuid(),
+    
+    -- Wallet info
+    wallet_id UUID REFERENCES wallets(id) ON DELETE CASCADE,
+    user_id UUID REFERENCES users(id) ON DELETE CASCADE,
+    
+    -- Balance info
+    currency VARCHAR(10) NOT NULL,
+    balance DECIMAL(30, 8) NOT NULL,  -- Support crypto precision
+    
+    -- Timestamp
+    timestamp TIMESTAMPTZ DEFAULT NOW() NOT NULL,
+    
+    -- Source
+    source VARCHAR(50) NOT NULL,  -- 'blockchain', 'api', 'manual'
+    
+    -- Blockchain metadata
+    block_number BIGINT,
+    chain_id VARCHAR(50),
+    
+    -- Metadata
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    
+    PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp);
+
+-- Rows outside every monthly partition (safety net, should stay empty)
+CREATE TABLE balance_snapshots_default PARTITION OF balance_snapshots DEFAULT;
+
+-- Function: Create the monthly partition containing p_month (idempotent)
+CREATE OR REPLACE FUNCTION create_balance_snapshot_partition(p_month DATE)
+RETURNS VOID AS $$
+DECLARE
+    v_from DATE := date_trunc('month', p_month)::DATE;
+    v_to DATE := (date_trunc('month', p_month) + INTERVAL '1 month')::DATE;
+BEGIN
+    EXECUTE format(
+        'CREATE TABLE IF NOT EXISTS %I PARTITION OF balance_snapshots FOR VALUES FROM (%L) TO (%L)',
+        'balance_snapshots_' || to_char(v_from, 'YYYY_MM'),
+        v_from,
+        v_to
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+-- Partitions for existing data plus the next 3 months.
+-- Future months must exist before data arrives (run the function monthly
+-- from a scheduler, or hand the table over to pg_partman)
+DO $$
+DECLARE
+    v_month DATE;
+BEGIN
+    SELECT date_trunc('month', COALESCE(MIN(timestamp), NOW()))::DATE
+    INTO v_month
+    FROM balance_snapshots_old;
+    
+    WHILE v_month <= (NOW() + INTERVAL '3 months')::DATE LOOP
+        PERFORM create_balance_snapshot_partition(v_month);
+        v_month := (v_month + INTERVAL '1 month')::DATE;
+    END LOOP;
+END;
+$$;
+
+INSERT INTO balance_snapshots (
+    id, wallet_id, user_id, currency, balance, timestamp,
+    source, block_number, chain_id, created_at
+)
+SELECT
+    id, wallet_id, user_id, currency, balance, timestamp,
+    source, block_number, chain_id, created_at
+FROM balance_snapshots_old;
+
+DROP TABLE balance_snapshots_old;
+
+-- ============================================================================
+-- INDEXES (created on the parent, propagated to every partition)
+-- ============================================================================
+
+-- One snapshot per wallet per currency per timestamp. Covers the timerange
+-- queries (all columns they select are in the index), so they run as
+-- index-only scans on the partitions left after pruning
+CREATE UNIQUE INDEX idx_balance_snapshots_unique
+    ON balance_snapshots(wallet_id, currency, timestamp DESC)
+    INCLUDE (balance, id, source, block_number, chain_id);
+
+CREATE INDEX idx_balance_snapshots_user ON balance_snapshots(user_id);
+
+-- ============================================================================
+-- VIEWS
+-- ============================================================================
+
+-- View: Latest balance for each wallet/currency
+CREATE OR REPLACE VIEW v_latest_balances AS
+SELECT DISTINCT ON (wallet_id, currency)
+    wallet_id,
+    user_id,
+    currency,
+    balance,
+    timestamp,
+    source
+FROM balance_snapshots
+ORDER BY wallet_id, currency, timestamp DESC;
+
+-- View: Balance history with deltas
+CREATE OR REPLACE VIEW v_balance_history AS
+SELECT 
+    bs.id,
+    bs.wallet_id,
+    bs.user_id,
+    bs.currency,
+    bs.balance,
+    bs.timestamp,
+    bs.source,
+    LAG(bs.balance) OVER (PARTITION BY bs.wallet_id, bs.currency ORDER BY bs.timestamp) AS previous_balance,
+    bs.balance - LAG(bs.balance) OVER (PARTITION BY bs.wallet_id, bs.currency ORDER BY bs.timestamp) AS delta,
+    EXTRACT(EPOCH FROM (bs.timestamp - LAG(bs.timestamp) OVER (PARTITION BY bs.wallet_id, bs.currency ORDER BY bs.timestamp))) AS time_diff_seconds
+FROM balance_snapshots bs
+ORDER BY bs.wallet_id, bs.currency, bs.timestamp DESC;
+
+-- ============================================================================
+-- COMMENTS
+-- ============================================================================
+
+COMMENT ON TABLE balance_snapshots IS 'Snapshots балансов кошельков для balance-based detection (помесячные партиции)';
+COMMENT ON FUNCTION create_balance_snapshot_partition(DATE) IS 'Создает месячную партицию balance_snapshots для указанной даты';
+
+COMMIT;
+
+-- ============================================================================
+-- END OF MIGRATION
+-- ============================================================================
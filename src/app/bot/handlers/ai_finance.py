@@ -3,6 +3,7 @@ AI Finance Analysis handler with DeepSeek integration.
 """
 import os
 import json
+import time
 from datetime import datetime, timedelta
 from decimal import Decimal
 from aiogram import Router, F
@@ -21,6 +22,10 @@ deepseek_service = DeepSeekService()
 
 router = Router()
 
+# Seconds between progressive edits while an analysis streams in (Telegram
+# rate-limits message edits)
+STREAM_EDIT_INTERVAL = 1.5
+
 
 async def call_deepseek_api(prompt: str) -> str:
     """Call DeepSeek API for financial analysis"""
@@ -196,8 +201,19 @@ Provide:
 Keep it concise and use emojis for better readability.
 """
     
-    # Call DeepSeek service with persistent chat
-    analysis = deepseek_service.analyze_transactions(
+    # Format response
+    response_text = "🤖 **AI Financial Insights**\n\n"
+    response_text += f"📊 **Last 30 Days Summary:**\n"
+    response_text += f"• Income: ${financial_data['total_income']:.2f}\n"
+    response_text += f"• Expenses: ${financial_data['total_expenses']:.2f}\n"
+    response_text += f"• Net: ${financial_data['net_balance']:.2f}\n\n"
+    response_text += f"**AI Analysis:**\n\n"
+    
+    # Call DeepSeek service with persistent chat; show the analysis as it
+    # streams in
+    analysis = ""
+    last_edit = time.monotonic()
+    async for chunk in deepseek_service.analyze_transactions(
         user_id=user_id,
         transactions=[{
             'type': tx.type.value,
@@ -207,15 +223,21 @@ Keep it concise and use emojis for better readability.
         } for tx in recent_transactions],
         period_days=30,
         categories={cat.id: cat.name for cat in categories}
-    )
-    
-    # Format response
-    response_text = "🤖 **AI Financial Insights**\n\n"
-    response_text += f"📊 **Last 30 Days Summary:**\n"
-    response_text += f"• Income: ${financial_data['total_income']:.2f}\n"
-    response_text += f"• Expenses: ${financial_data['total_expenses']:.2f}\n"
-    response_text += f"• Net: ${financial_data['net_balance']:.2f}\n\n"
-    response_text += f"**AI Analysis:**\n\n{analysis}"
+    ):
+        analysis += chunk
+        if time.monotonic() - last_edit >= STREAM_EDIT_INTERVAL:
+            last_edit = time.monotonic()
+            try:
+                # Partial output may have unbalanced Markdown, which
+                # Telegram rejects; only the final edit is parsed
+                await callback.message.edit_text(
+                    text=response_text + analysis + " ▌",
+                    parse_mode=None
+                )
+            except Exception as e:
+                logger.debug(f"Skipped progressive analysis edit: {e}")
+    
+    response_text += analysis or "❌ AI analysis unavailable"
     
     await callback.message.edit_text(
         text=response_text,
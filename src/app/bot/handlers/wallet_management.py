@@ -1,6 +1,12 @@
 """
 Wallet management handler with add/remove/monitor functionality.
 """
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from cachetools import TTLCache
 from aiogram import Router, F
 from aiogram.types import CallbackQuery, Message, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
@@ -13,6 +19,50 @@ logger = get_logger(__name__)
 
 router = Router()
 
+# Dedicated executor for blocking wallet_service (Supabase) calls, sized to the
+# DB pool so handler threads never outnumber available connections
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_EXECUTOR = ThreadPoolExecutor(max_workers=DB_POOL_SIZE, thread_name_prefix="walletsvc")
+
+
+async def _db(fn: Callable, *args: Any) -> Any:
+    """Run a blocking wallet_service call on the DB executor"""
+    return await asyncio.get_running_loop().run_in_executor(DB_EXECUTOR, fn, *args)
+
+# Seconds during which an identical wallets render is not re-sent to Telegram
+WALLETS_RENDER_TTL = 30
+
+# chat_id -> (message_id, render_hash) of the last wallets screen; entries
+# expire after WALLETS_RENDER_TTL so idle chats do not accumulate
+LAST_RENDER_MAX_CHATS = 10_000
+_LAST_RENDER = TTLCache(maxsize=LAST_RENDER_MAX_CHATS, ttl=WALLETS_RENDER_TTL)
+
+
+def _render_hash(text: str, keyboard: list) -> int:
+    """Hash rendered wallets screen (text + buttons) for change detection"""
+    return hash(text) ^ hash(tuple(
+        (button.text, button.callback_data)
+        for row in keyboard
+        for button in row
+    ))
+
+
+def _is_unchanged_render(callback: CallbackQuery, render_hash: int, keyboard: list) -> bool:
+    """Check whether the message already shows exactly this wallets screen"""
+    message = callback.message
+    last = _LAST_RENDER.get(message.chat.id)
+    if not last:
+        return False
+    
+    message_id, last_hash = last
+    if message_id != message.message_id or last_hash != render_hash:
+        return False
+    
+    # The user may have navigated away and back within the TTL, so make sure
+    # the message still carries the wallets keyboard before skipping the edit
+    current = message.reply_markup.inline_keyboard if message.reply_markup else []
+    return _render_hash(text="", keyboard=current) == _render_hash(text="", keyboard=keyboard)
+
 
 class WalletStates(StatesGroup):
     """FSM states for wallet management"""
@@ -42,7 +92,7 @@ async def show_wallets(
             return
         
         # Get all user wallets
-        wallets = wallet_service.get_user_wallets(user_id)
+        wallets = await _db(wallet_service.get_user_wallets, user_id)
         logger.info(f"Found {len(wallets) if wallets else 0} wallets")
         
         # Build keyboard
@@ -51,12 +101,12 @@ async def show_wallets(
         if wallets:
             for wallet in wallets:
                 # Show balance and monitoring status
-                monitor_emoji = "🟢" if wallet.is_active else "🔴"
-                button_text = f"{monitor_emoji} {wallet.name} ({wallet.current_balance} {wallet.currency})"
+                monitor_emoji = "🟢" if wallet['is_active'] else "🔴"
+                button_text = f"{monitor_emoji} {wallet['name']} ({wallet['current_balance']} {wallet['currency']})"
                 keyboard.append([
                     InlineKeyboardButton(
                         text=button_text,
-                        callback_data=f"wallet_view:{wallet.id}"
+                        callback_data=f"wallet_view:{wallet['id']}"
                     )
                 ])
         
@@ -78,10 +128,20 @@ async def show_wallets(
             text += "You don't have any wallets yet.\n"
             text += "Add your first wallet to start tracking!"
         
+        render_hash = _render_hash(text, keyboard)
+        if _is_unchanged_render(callback, render_hash, keyboard):
+            # Nothing changed since the last render - skip the edit round-trip
+            await callback.answer()
+            logger.debug("Wallets view unchanged, skipped edit")
+            return
+        
         await callback.message.edit_text(
             text=text,
             reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard)
         )
+        _LAST_RENDER[callback.message.chat.id] = (
+            callback.message.message_id, render_hash
+        )
         await callback.answer()
         logger.info("Wallets displayed successfully")
         
@@ -191,13 +251,12 @@ async def process_wallet_address(message: Message, state: FSMContext, wallet_ser
     
     try:
         # Create wallet
-        wallet = wallet_service.create_wallet(
+        wallet = await wallet_service.create_wallet(
             user_id=user_id,
             name=name,
-            address=address,
-            blockchain=blockchain,
             currency="USD",
-            initial_balance=0.0
+            wallet_type="crypto",
+            metadata={"address": address, "blockchain": blockchain}
         )
         
         await message.answer(
@@ -220,7 +279,7 @@ async def process_wallet_address(message: Message, state: FSMContext, wallet_ser
             current_wallet_id=current_wallet_id
         )
         
-        logger.info(f"Wallet created: {wallet.id} by user {user_id}")
+        logger.info(f"Wallet created: {wallet['id']} by user {user_id}")
         
     except Exception as e:
         logger.error(f"Failed to create wallet: {e}")
@@ -241,21 +300,20 @@ async def view_wallet(
     wallet_id = callback.data.split(":")[1]
     
     try:
-        wallet = wallet_service.get_wallet_by_id(wallet_id)
+        wallet = await _db(wallet_service.get_wallet_by_id, wallet_id)
         
         if not wallet:
             await callback.answer("❌ Wallet not found", show_alert=True)
             return
         
-        monitor_status = "🟢 Enabled" if wallet.is_active else "🔴 Disabled"
+        monitor_status = "🟢 Enabled" if wallet['is_active'] else "🔴 Disabled"
         
         await callback.message.edit_text(
             text=f"**Wallet Details**\n\n"
-            f"💳 **{wallet.name}**\n"
-            f"🔗 Blockchain: {wallet.blockchain.upper() if hasattr(wallet, 'blockchain') else 'Unknown'}\n"
-            f"💰 Balance: {wallet.current_balance} {wallet.currency}\n"
-            f"📊 Auto-monitoring: {monitor_status}\n"
-            f"📅 Created: {wallet.created_at.strftime('%Y-%m-%d')}\n",
+            f"💳 **{wallet['name']}**\n"
+            f"🔗 Blockchain: {wallet['metadata'].get('blockchain', 'unknown').upper()}\n"
+            f"💰 Balance: {wallet['current_balance']} {wallet['currency']}\n"
+            f"📊 Auto-monitoring: {monitor_status}\n",
             reply_markup=InlineKeyboardMarkup(inline_keyboard=[
                 [
                     InlineKeyboardButton(text="🔄 Toggle Monitor", callback_data=f"wallet_toggle:{wallet_id}"),
@@ -284,11 +342,11 @@ async def toggle_wallet_monitoring(
     wallet_id = callback.data.split(":")[1]
     
     try:
-        wallet = wallet_service.get_wallet_by_id(wallet_id)
+        wallet = await _db(wallet_service.get_wallet_by_id, wallet_id)
         
         # Toggle is_active
-        new_status = not wallet.is_active
-        wallet_service.update_wallet_status(wallet_id, new_status)
+        new_status = not wallet['is_active']
+        await _db(wallet_service.update_wallet_status, wallet_id, new_status)
         
         status_text = "enabled" if new_status else "disabled"
         status_emoji = "🟢" if new_status else "🔴"
@@ -312,11 +370,11 @@ async def delete_wallet(
     wallet_id = callback.data.split(":")[1]
     
     try:
-        wallet = wallet_service.get_wallet_by_id(wallet_id)
+        wallet = await _db(wallet_service.get_wallet_by_id, wallet_id)
         
         await callback.message.edit_text(
             text=f"⚠️ **Warning**\n\n"
-            f"Are you sure you want to delete wallet **{wallet.name}**?\n\n"
+            f"Are you sure you want to delete wallet **{wallet['name']}**?\n\n"
             f"This action cannot be undone!",
             reply_markup=InlineKeyboardMarkup(inline_keyboard=[
                 [
@@ -342,11 +400,11 @@ async def confirm_delete_wallet(
     wallet_id = callback.data.split(":")[1]
     
     try:
-        wallet = wallet_service.get_wallet_by_id(wallet_id)
-        wallet_service.delete_wallet(wallet_id)
+        wallet = await _db(wallet_service.get_wallet_by_id, wallet_id)
+        await wallet_service.delete_wallet(wallet_id)
         
         await callback.message.edit_text(
-            text=f"✅ Wallet **{wallet.name}** deleted!",
+            text=f"✅ Wallet **{wallet['name']}** deleted!",
             reply_markup=InlineKeyboardMarkup(inline_keyboard=[
                 [InlineKeyboardButton(text="◀️ Back to Wallets", callback_data="wallets")]
             ])
@@ -370,7 +428,7 @@ async def show_wallet_stats(
     data = await state.get_data()
     user_id = data.get("user_id")
     
-    wallets = wallet_service.get_user_wallets(user_id)
+    wallets = await _db(wallet_service.get_user_wallets, user_id)
     
     if not wallets:
         await callback.answer("No wallets to show stats", show_alert=True)
@@ -383,13 +441,13 @@ async def show_wallet_stats(
     active_count = 0
     
     for wallet in wallets:
-        total_balance += float(wallet.current_balance)
-        if wallet.is_active:
+        total_balance += float(wallet['current_balance'])
+        if wallet['is_active']:
             active_count += 1
         
-        monitor_emoji = "🟢" if wallet.is_active else "🔴"
-        stats_text += f"{monitor_emoji} **{wallet.name}**\n"
-        stats_text += f"   {wallet.current_balance} {wallet.currency}\n\n"
+        monitor_emoji = "🟢" if wallet['is_active'] else "🔴"
+        stats_text += f"{monitor_emoji} **{wallet['name']}**\n"
+        stats_text += f"   {wallet['current_balance']} {wallet['currency']}\n\n"
     
     stats_text += f"**Total Wallets:** {len(wallets)}\n"
     stats_text += f"**Active Monitoring:** {active_count}/{len(wallets)}\n"
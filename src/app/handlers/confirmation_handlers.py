@@ -14,6 +14,9 @@ logger = get_logger(__name__)
 # Create router
 router = Router()
 
+# Characters that make a message need Markdown parsing
+MARKDOWN_SPECIAL_CHARS = "_*`["
+
 
 def create_confirmation_keyboard(
     confirmation_id: str,
@@ -166,11 +169,15 @@ async def send_confirmation_request(
         categories=confirmation_msg["categories"]
     )
     
+    # Only ask Telegram to parse Markdown when the text actually uses it
+    text = confirmation_msg["text"]
+    parse_mode = "Markdown" if any(c in text for c in MARKDOWN_SPECIAL_CHARS) else None
+    
     # Send message
     await message.answer(
-        confirmation_msg["text"],
+        text,
         reply_markup=keyboard,
-        parse_mode="Markdown"
+        parse_mode=parse_mode
     )
     
     logger.info(f"📤 Sent confirmation request: {confirmation_id}")
@@ -33,14 +33,26 @@ class WalletSyncScheduler:
             
             logger.info(f"Syncing wallets for {len(users)} users")
             
+            # Collect per-user outcomes and log a single summary at the end
+            # instead of one INFO record per user.
+            results = {}
+            failures = {}
+            
             for user_id in users:
                 try:
-                    result = await self.sync_service.sync_all_user_wallets(user_id)
-                    logger.info(f"Synced user {user_id}: {result}")
+                    results[user_id] = await self.sync_service.sync_all_user_wallets(user_id)
                 except Exception as e:
-                    logger.error(f"Failed to sync user {user_id}: {e}", exc_info=True)
+                    failures[user_id] = str(e)
+                    logger.debug(f"Failed to sync user {user_id}: {e}", exc_info=True)
+            
+            logger.info(
+                "Scheduled wallet sync complete: %d users, %d ok, %d failed",
+                len(users), len(results), len(failures)
+            )
+            logger.debug("Wallet sync details: %s", results)
             
-            logger.info("Scheduled wallet sync complete")
+            if failures:
+                logger.error("Wallet sync failures: %s", failures)
             
         except Exception as e:
             logger.error(f"Error in scheduled sync: {e}", exc_info=True)
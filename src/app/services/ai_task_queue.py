@@ -3,16 +3,38 @@ AI Task Queue Service
 Manages async AI processing tasks using Redis as backend
 Based on AI Council recommendations (Claude 3.7)
 """
-import json
+import os
 import time
+import asyncio
 import uuid
+import socket
 import logging
-from typing import Optional, Dict, Any, List
+from collections import deque
+from typing import Optional, Dict, Any, List, Tuple, Set
 from datetime import datetime, timedelta
+import msgpack
 import redis.asyncio as redis
+from redis.exceptions import ResponseError
+from redis.utils import HIREDIS_AVAILABLE
 
 logger = logging.getLogger(__name__)
 
+# Payloads are stored as positional msgpack arrays (no field names on the
+# wire) and expanded back into dicts with these schemas
+_TASK_FIELDS = ("task_id", "task_type", "data", "user_id", "created_at", "priority")
+_RESULT_FIELDS = ("task_id", "result", "status", "completed_at")
+
+
+def _pack(values: tuple) -> bytes:
+    """Serialize a payload tuple (unknown types such as Decimal become str)"""
+    return msgpack.packb(values, use_bin_type=True, default=str)
+
+
+def _unpack(fields: tuple, raw: bytes) -> Dict[str, Any]:
+    """Deserialize a positional payload into a dict"""
+    return dict(zip(fields, msgpack.unpackb(raw, raw=False)))
+
+
 
 class TaskStatus:
     """Task status constants"""
@@ -28,47 +50,115 @@ class AITaskQueue:
     Redis-based task queue for async AI processing.
     
     Features:
-    - Priority-based task ordering (sorted set)
+    - Priority-based task ordering (one Redis Stream per priority)
+    - Consumer group delivery with XACK and pending-entries tracking
+    - Stuck task recovery via XAUTOCLAIM
     - Task result caching
-    - Timeout handling
     - Task status tracking
     """
     
+    # Connection pool configuration
+    MAX_CONNECTIONS = 64
+    HEALTH_CHECK_INTERVAL = 30  # seconds
+    
+    # Stream configuration
+    PRIORITIES = (1, 2, 3)  # 1=high, 2=medium, 3=low
+    CONSUMER_GROUP = "workers"
+    DEQUEUE_BLOCK_MS = 5000
+    
     def __init__(self, redis_url: str = "redis://localhost:6379"):
         """
         Initialize AI Task Queue.
         
+        The client is created eagerly on top of a shared connection pool;
+        connections are opened lazily by the pool on first use.
+        
         Args:
             redis_url: Redis connection URL
         """
         self.redis_url = redis_url
-        self.redis_client: Optional[redis.Redis] = None
+        # RESP3, raw bytes responses (payloads are msgpack, not text)
+        self._pool = redis.ConnectionPool.from_url(
+            redis_url,
+            max_connections=self.MAX_CONNECTIONS,
+            protocol=3,
+            health_check_interval=self.HEALTH_CHECK_INTERVAL,
+            socket_keepalive=True
+        )
+        self.redis_client: redis.Redis = redis.Redis(connection_pool=self._pool)
+        self._groups_ready = False
+        
+        # Consumer name within the group (stable for this process)
+        self.consumer_name = f"{socket.gethostname()}:{os.getpid()}"
         
         # Redis keys
-        self.TASK_QUEUE_KEY = "ai:tasks:queue"
-        self.TASK_DATA_PREFIX = "ai:tasks:data:"
+        self.TASK_STREAM_PREFIX = "ai:tasks:stream:p"
         self.TASK_RESULT_PREFIX = "ai:tasks:result:"
         self.TASK_STATUS_PREFIX = "ai:tasks:status:"
+        self.TASK_NOTIFY_PREFIX = "ai:tasks:notify:"
+        self.TASK_ENTRY_PREFIX = "ai:tasks:entry:"
+        
+        # Streams in read order (highest priority first)
+        self.task_streams = [f"{self.TASK_STREAM_PREFIX}{p}" for p in self.PRIORITIES]
+        
+        # Entry delivered to this consumer but not yet returned (at most one,
+        # see _take_first), and task_id -> (stream, message id) for tasks
+        # dequeued here and awaiting XACK; the location is also stored under
+        # TASK_ENTRY_PREFIX so any instance can acknowledge
+        self._claimed: deque = deque()
+        self._inflight: Dict[str, Tuple[str, bytes]] = {}
+        self._last_reclaim = 0.0
+        
+        # Fire-and-forget status writes still in flight
+        self._pending_writes: Set[asyncio.Task] = set()
+        
+        # Pre-encoded key prefixes (keys are built as bytes, no f-strings)
+        self._result_prefix_b = self.TASK_RESULT_PREFIX.encode()
+        self._status_prefix_b = self.TASK_STATUS_PREFIX.encode()
+        self._notify_prefix_b = self.TASK_NOTIFY_PREFIX.encode()
+        self._entry_prefix_b = self.TASK_ENTRY_PREFIX.encode()
         
         # Configuration
-        self.TASK_TIMEOUT = 300  # 5 minutes
+        self.TASK_TIMEOUT = 300  # 5 minutes, also the XAUTOCLAIM idle time
         self.RESULT_TTL = 3600  # 1 hour
     
     async def connect(self):
-        """Connect to Redis"""
-        if not self.redis_client:
-            self.redis_client = await redis.from_url(
-                self.redis_url,
-                encoding="utf-8",
-                decode_responses=True
-            )
-            logger.info(f"✅ Connected to Redis at {self.redis_url}")
+        """Verify Redis connection and create the consumer group"""
+        await self.redis_client.ping()
+        await self._ensure_groups()
+        logger.info(f"✅ Connected to Redis at {self.redis_url}")
+        
+        # redis-py picks the C RESP parser automatically when hiredis is
+        # installed; the pure-Python fallback is much slower on payload reads
+        if not HIREDIS_AVAILABLE:
+            logger.warning("hiredis not installed - using pure-Python Redis parser")
     
     async def disconnect(self):
         """Disconnect from Redis"""
-        if self.redis_client:
-            await self.redis_client.close()
-            logger.info("Redis connection closed")
+        # Let queued status writes finish before the pool goes away
+        if self._pending_writes:
+            await asyncio.gather(*self._pending_writes, return_exceptions=True)
+        await self.redis_client.close()
+        await self._pool.disconnect()
+        logger.info("Redis connection closed")
+    
+    async def _ensure_groups(self):
+        """Create the consumer group on every priority stream (idempotent)"""
+        for stream in self.task_streams:
+            try:
+                # Start at 0 so tasks enqueued before the first worker are delivered
+                await self.redis_client.xgroup_create(
+                    stream, self.CONSUMER_GROUP, id="0", mkstream=True
+                )
+            except ResponseError as e:
+                if "BUSYGROUP" not in str(e):
+                    raise
+        self._groups_ready = True
+    
+    def _stream_for(self, priority: int) -> str:
+        """Get the stream for a priority (clamped to the supported range)"""
+        priority = min(max(priority, self.PRIORITIES[0]), self.PRIORITIES[-1])
+        return self.task_streams[priority - 1]
     
     async def enqueue_task(
         self,
@@ -89,76 +179,178 @@ class AITaskQueue:
         Returns:
             task_id: Unique task ID
         """
-        await self.connect()
-        
         # Generate task ID
         task_id = f"{task_type}:{uuid.uuid4().hex[:12]}"
         
-        # Prepare task data
-        task_data = {
-            "task_id": task_id,
-            "task_type": task_type,
-            "data": data,
-            "user_id": user_id,
-            "created_at": datetime.utcnow().isoformat(),
-            "priority": priority
-        }
-        
-        # Store task data
-        task_data_key = f"{self.TASK_DATA_PREFIX}{task_id}"
-        await self.redis_client.setex(
-            task_data_key,
-            self.TASK_TIMEOUT,
-            json.dumps(task_data)
-        )
-        
-        # Add to priority queue (sorted set)
-        # Score = priority * 1000000 + timestamp (lower score = higher priority)
-        score = priority * 1000000 + int(time.time())
-        await self.redis_client.zadd(self.TASK_QUEUE_KEY, {task_id: score})
+        # Prepare task data (order matches _TASK_FIELDS)
+        now = time.time()
+        task_data = _pack((task_id, task_type, data, user_id, now, priority))
         
-        # Set initial status
-        await self._set_task_status(task_id, TaskStatus.PENDING)
+        # Append to the priority stream and set initial status in a single
+        # MULTI/EXEC round trip
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            pipe.xadd(self._stream_for(priority), {"payload": task_data})
+            self._status_setex(pipe, task_id.encode(), TaskStatus.PENDING)
+            await pipe.execute()
         
         logger.info(f"📥 Enqueued task: {task_id} (priority={priority})")
         return task_id
     
-    async def dequeue_task(self) -> Optional[Dict[str, Any]]:
+    async def dequeue_task(self, block_ms: Optional[int] = None) -> Optional[Dict[str, Any]]:
         """
         Dequeue the highest priority task.
         
+        The task stays in the consumer group's pending entries until
+        store_result() acknowledges it; tasks left pending longer than
+        TASK_TIMEOUT (e.g. a crashed worker) are reclaimed by XAUTOCLAIM.
+        
+        Args:
+            block_ms: Max time to block waiting for a task (default DEQUEUE_BLOCK_MS)
+        
         Returns:
             Task data or None if queue is empty
         """
-        await self.connect()
-        
-        # Get highest priority task (lowest score)
-        tasks = await self.redis_client.zrange(self.TASK_QUEUE_KEY, 0, 0)
-        
-        if not tasks:
-            return None
-        
-        task_id = tasks[0]
-        
-        # Remove from queue
-        await self.redis_client.zrem(self.TASK_QUEUE_KEY, task_id)
-        
-        # Get task data
-        task_data_key = f"{self.TASK_DATA_PREFIX}{task_id}"
-        task_data_json = await self.redis_client.get(task_data_key)
-        
-        if not task_data_json:
-            logger.warning(f"Task data not found for {task_id}")
+        if not self._groups_ready:
+            await self._ensure_groups()
+        
+        if time.monotonic() - self._last_reclaim >= self.TASK_TIMEOUT:
+            await self._reclaim_stuck()
+        
+        if not self._claimed:
+            try:
+                await self._read_group(block_ms)
+            except ResponseError as e:
+                # Streams were deleted (e.g. clear_queue) - recreate groups once
+                if "NOGROUP" not in str(e):
+                    raise
+                await self._ensure_groups()
+                await self._read_group(block_ms)
+        
+        if not self._claimed:
             return None
         
-        task_data = json.loads(task_data_json)
+        _, stream, message_id, task_data_raw = self._claimed.popleft()
+        task_data = _unpack(_TASK_FIELDS, task_data_raw)
+        task_id = task_data["task_id"]
         
-        # Update status
-        await self._set_task_status(task_id, TaskStatus.PROCESSING)
+        self._inflight[task_id] = (stream, message_id)
+        self._set_status_in_background(
+            task_id.encode(), TaskStatus.PROCESSING, entry=(stream, message_id)
+        )
         
         logger.info(f"📤 Dequeued task: {task_id}")
         return task_data
     
+    async def _read_group(self, block_ms: Optional[int]):
+        """
+        Read at most one new entry for this consumer, highest priority first.
+        
+        Entries buffered in this process cannot be served by other workers,
+        so the streams are polled without blocking in priority order and
+        only when all are empty does the read block on every stream.
+        """
+        for stream in self.task_streams:
+            reply = await self.redis_client.xreadgroup(
+                self.CONSUMER_GROUP,
+                self.consumer_name,
+                {stream: ">"},
+                count=1
+            )
+            if reply:
+                await self._take_first(self._reply_entries(reply))
+                return
+        
+        # COUNT applies per stream, so entries arriving on several streams
+        # during the block come back together; _take_first requeues extras
+        reply = await self.redis_client.xreadgroup(
+            self.CONSUMER_GROUP,
+            self.consumer_name,
+            {stream: ">" for stream in self.task_streams},
+            count=1,
+            block=self.DEQUEUE_BLOCK_MS if block_ms is None else block_ms
+        )
+        await self._take_first(self._reply_entries(reply))
+    
+    @staticmethod
+    def _reply_entries(reply) -> List[Tuple[Any, bytes, Dict[bytes, bytes]]]:
+        """Flatten an XREADGROUP reply into (stream, message id, fields)"""
+        return [
+            (stream, message_id, fields)
+            for stream, batches in (reply or {}).items()
+            for entries in batches
+            for message_id, fields in entries
+        ]
+    
+    async def _reclaim_stuck(self):
+        """Take over tasks another consumer left pending past TASK_TIMEOUT"""
+        self._last_reclaim = time.monotonic()
+        
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            for stream in self.task_streams:
+                pipe.xautoclaim(
+                    stream,
+                    self.CONSUMER_GROUP,
+                    self.consumer_name,
+                    min_idle_time=self.TASK_TIMEOUT * 1000,
+                    count=10
+                )
+            replies = await pipe.execute(raise_on_error=False)
+        
+        reclaimed = []
+        for stream, reply in zip(self.task_streams, replies):
+            if isinstance(reply, Exception):
+                continue
+            for entry in reply[1]:
+                # Entries deleted while pending come back empty
+                if entry and entry[1]:
+                    reclaimed.append((stream, entry[0], entry[1]))
+                    logger.warning(f"♻️ Reclaimed stuck task {entry[0]!r} from {stream}")
+        
+        await self._take_first(reclaimed)
+    
+    async def _take_first(self, entries: List[Tuple[Any, bytes, Dict[bytes, bytes]]]):
+        """
+        Keep the highest priority delivered entry and requeue the rest.
+        
+        Surplus entries are re-added to the tail of their stream (and the
+        delivered copies acked and deleted) so other workers can take them
+        instead of waiting behind this one, or being reclaimed twice.
+        """
+        if not entries:
+            return
+        
+        entries = [
+            (stream.decode() if isinstance(stream, bytes) else stream, message_id, fields)
+            for stream, message_id, fields in entries
+        ]
+        entries.sort(key=lambda entry: self.task_streams.index(entry[0]))
+        
+        self._claim(*entries[0])
+        
+        surplus = entries[1:]
+        if not surplus:
+            return
+        
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            for stream, message_id, fields in surplus:
+                pipe.xadd(stream, fields)
+                pipe.xack(stream, self.CONSUMER_GROUP, message_id)
+                pipe.xdel(stream, message_id)
+            await pipe.execute()
+        logger.debug(f"Requeued {len(surplus)} surplus task entries")
+    
+    def _claim(self, stream, message_id: bytes, fields: Dict[bytes, bytes]):
+        """Buffer a delivered entry, keeping higher priorities first"""
+        if isinstance(stream, bytes):
+            stream = stream.decode()
+        payload = fields.get(b"payload")
+        if payload is None:
+            logger.warning(f"Task payload not found in {stream} entry {message_id!r}")
+            return
+        
+        entry = (self.task_streams.index(stream), stream, message_id, payload)
+        self._claimed = deque(sorted([*self._claimed, entry], key=lambda e: e[0]))
+    
     async def store_result(
         self,
         task_id: str,
@@ -173,25 +365,39 @@ class AITaskQueue:
             result: Task result
             status: Task status
         """
-        await self.connect()
-        
-        # Store result
-        result_key = f"{self.TASK_RESULT_PREFIX}{task_id}"
-        result_data = {
-            "task_id": task_id,
-            "result": result,
-            "status": status,
-            "completed_at": datetime.utcnow().isoformat()
-        }
-        
-        await self.redis_client.setex(
-            result_key,
-            self.RESULT_TTL,
-            json.dumps(result_data)
-        )
-        
-        # Update status
-        await self._set_task_status(task_id, status)
+        # Store result (order matches _RESULT_FIELDS)
+        task_id_b = task_id.encode()
+        result_key = self._result_prefix_b + task_id_b
+        result_data = _pack((task_id, result, status, time.time()))
+        
+        # Store result, update status, wake up any get_result() waiter and
+        # acknowledge the stream entry in one round trip
+        notify_key = self._notify_prefix_b + task_id_b
+        entry_key = self._entry_prefix_b + task_id_b
+        
+        # A late background PROCESSING write must not overwrite the final status
+        if self._pending_writes:
+            await asyncio.gather(*self._pending_writes, return_exceptions=True)
+        
+        # Dequeued by another instance (or before a restart): the entry
+        # location was stored alongside the PROCESSING status
+        inflight = self._inflight.pop(task_id, None)
+        if inflight is None:
+            entry_raw = await self.redis_client.get(entry_key)
+            if entry_raw:
+                inflight = tuple(msgpack.unpackb(entry_raw, raw=False))
+        
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            pipe.setex(result_key, self.RESULT_TTL, result_data)
+            self._status_setex(pipe, task_id_b, status)
+            pipe.lpush(notify_key, "1")
+            pipe.expire(notify_key, self.RESULT_TTL)
+            if inflight:
+                stream, message_id = inflight
+                pipe.xack(stream, self.CONSUMER_GROUP, message_id)
+                pipe.xdel(stream, message_id)
+                pipe.delete(entry_key)
+            await pipe.execute()
         
         logger.info(f"✅ Stored result for task: {task_id} (status={status})")
     
@@ -206,26 +412,24 @@ class AITaskQueue:
         Returns:
             Result data or None if timeout
         """
-        await self.connect()
+        task_id_b = task_id.encode()
+        result_key = self._result_prefix_b + task_id_b
+        notify_key = self._notify_prefix_b + task_id_b
         
-        start_time = time.time()
-        result_key = f"{self.TASK_RESULT_PREFIX}{task_id}"
+        # Block server-side until store_result() pushes the notification
+        popped = await self.redis_client.blpop(notify_key, timeout=timeout)
         
-        while time.time() - start_time < timeout:
-            # Check if result exists
-            result_json = await self.redis_client.get(result_key)
+        if popped:
+            result_raw = await self.redis_client.get(result_key)
             
-            if result_json:
-                result_data = json.loads(result_json)
+            if result_raw:
+                result_data = _unpack(_RESULT_FIELDS, result_raw)
                 logger.info(f"📨 Retrieved result for task: {task_id}")
                 return result_data
-            
-            # Wait a bit before checking again
-            await asyncio.sleep(0.5)
         
         # Timeout
         logger.warning(f"⏱️ Timeout waiting for result: {task_id}")
-        await self._set_task_status(task_id, TaskStatus.TIMEOUT)
+        self._set_status_in_background(task_id_b, TaskStatus.TIMEOUT)
         return None
     
     async def get_task_status(self, task_id: str) -> Optional[str]:
@@ -238,28 +442,67 @@ class AITaskQueue:
         Returns:
             Task status or None
         """
-        await self.connect()
+        status = await self.redis_client.get(self._status_prefix_b + task_id.encode())
+        return status.decode() if isinstance(status, bytes) else status
+    
+    def _status_setex(self, pipe, task_id_b: bytes, status: str):
+        """
+        Queue a task status write on a pipeline (not awaited here).
         
-        status_key = f"{self.TASK_STATUS_PREFIX}{task_id}"
-        status = await self.redis_client.get(status_key)
-        return status
+        Status changes ride along with the command that triggers them
+        instead of costing a round trip of their own. Passing the client
+        itself returns the awaitable SETEX for standalone writes.
+        """
+        return pipe.setex(self._status_prefix_b + task_id_b, self.TASK_TIMEOUT, status)
     
-    async def _set_task_status(self, task_id: str, status: str):
-        """Set task status"""
-        status_key = f"{self.TASK_STATUS_PREFIX}{task_id}"
-        await self.redis_client.setex(status_key, self.TASK_TIMEOUT, status)
+    def _set_status_in_background(
+        self,
+        task_id_b: bytes,
+        status: str,
+        entry: Optional[Tuple[str, bytes]] = None
+    ):
+        """
+        Write a standalone status without making the caller wait for the reply.
+        
+        Nothing on the dequeue/timeout path depends on the OK, so the
+        worker starts processing right away. (CLIENT REPLY OFF is not an
+        option: pooled redis-py connections expect a reply per command.)
+        A dequeued task's stream entry location rides along, for store_result.
+        """
+        if entry is None:
+            write = self._status_setex(self.redis_client, task_id_b, status)
+        else:
+            write = self._write_processing(task_id_b, status, entry)
+        
+        task = asyncio.create_task(write)
+        self._pending_writes.add(task)
+        task.add_done_callback(self._on_status_written)
+    
+    async def _write_processing(self, task_id_b: bytes, status: str, entry: Tuple[str, bytes]):
+        """Write a status and the task's stream entry location in one round trip"""
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            self._status_setex(pipe, task_id_b, status)
+            pipe.setex(self._entry_prefix_b + task_id_b, self.RESULT_TTL, _pack(entry))
+            await pipe.execute()
+    
+    def _on_status_written(self, task: asyncio.Task):
+        """Drop a finished background write and log its failure, if any"""
+        self._pending_writes.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Failed to write task status: {task.exception()}")
     
     async def get_queue_size(self) -> int:
-        """Get number of pending tasks in queue"""
-        await self.connect()
-        return await self.redis_client.zcard(self.TASK_QUEUE_KEY)
+        """Get number of queued or in-flight (not yet acknowledged) tasks"""
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            for stream in self.task_streams:
+                pipe.xlen(stream)
+            lengths = await pipe.execute()
+        return sum(lengths)
     
     async def clear_queue(self):
         """Clear all tasks from queue (for testing)"""
-        await self.connect()
-        await self.redis_client.delete(self.TASK_QUEUE_KEY)
+        await self.redis_client.delete(*self.task_streams)
+        self._groups_ready = False
+        self._claimed.clear()
+        self._inflight.clear()
         logger.info("🗑️ Cleared task queue")
-
-
-# Import asyncio at the end to avoid circular import
-import asyncio
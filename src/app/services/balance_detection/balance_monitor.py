@@ -11,11 +11,15 @@ Balance Monitoring Service.
 
 import asyncio
 import logging
-from typing import List, Optional, Dict, Any
+import time
+from dataclasses import replace
+from typing import List, Optional, Dict, Any, Tuple, Union
 from datetime import datetime, timedelta
 from decimal import Decimal
 
-from src.domain.balance.balance_snapshot import BalanceSnapshot, BalanceDelta
+import numpy as np
+
+from src.domain.balance.balance_snapshot import BalanceSnapshot, BalanceDelta, to_micro
 from src.infrastructure.repositories.balance_snapshot_repository import BalanceSnapshotRepository
 from src.infrastructure.repositories.wallet_repository import WalletRepository
 from src.infrastructure.error_handling import with_retry, AGGRESSIVE_RETRY_CONFIG
@@ -34,6 +38,14 @@ class BalanceMonitor:
     - Pattern matching
     """
     
+    # Максимум одновременных запросов баланса к blockchain API
+    max_concurrent_fetches = 32
+    
+    # Кошельки с изменениями за последние 24ч проверяются каждый цикл,
+    # остальные - только при полном проходе раз в full_scan_every циклов
+    hot_wallet_ttl = 86400  # seconds
+    full_scan_every = 24
+    
     def __init__(
         self,
         balance_repo: BalanceSnapshotRepository,
@@ -56,9 +68,138 @@ class BalanceMonitor:
         self.min_change_threshold = Decimal("0.01")  # Минимальное изменение для детекции
         self.snapshot_interval = 3600  # 1 hour in seconds
         
+        # Последний сохраненный snapshot по (wallet_id, currency): позволяет
+        # считать одну дельту за цикл без чтения окна snapshots из БД
+        self._last_snapshot: Dict[Tuple[str, str], BalanceSnapshot] = {}
+        
+        # Дельты, еще не отданные detect_incremental_changes()
+        self._pending_deltas: List[BalanceDelta] = []
+        
+        # wallet_id -> time.monotonic() until which the wallet stays "hot"
+        self._hot_until: Dict[str, float] = {}
+        
         logger.info("BalanceMonitor initialized")
     
+    @property
+    def min_change_threshold_micro(self) -> int:
+        """Порог изменения в micro-units (0.01 -> 10000)."""
+        return to_micro(self.min_change_threshold)
+    
     @with_retry(config=AGGRESSIVE_RETRY_CONFIG)
+    async def _fetch_balance(
+        self,
+        wallet_id: str,
+        currency: str
+    ) -> Optional[Decimal]:
+        """
+        Получает текущий баланс кошелька из blockchain (без записи в БД).
+        
+        Args:
+            wallet_id: ID кошелька
+            currency: Валюта
+        
+        Returns:
+            Balance или None
+        """
+        balance = await self.blockchain_service.get_balance(wallet_id, currency)
+        
+        if balance is None:
+            logger.warning(f"Failed to get balance for wallet {wallet_id}, currency {currency}")
+            return None
+        
+        return Decimal(str(balance))
+    
+    async def _fetch_balances(
+        self,
+        pairs: List[Tuple[str, str]]
+    ) -> List[Union[Optional[Decimal], Exception]]:
+        """
+        Получает балансы для всех пар (по одному запросу на пару,
+        не больше max_concurrent_fetches одновременно).
+        
+        Args:
+            pairs: Список (wallet_id, currency)
+        
+        Returns:
+            Балансы (или Exception) в порядке pairs
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrent_fetches)
+        
+        async def fetch_bounded(wallet_id: str, currency: str) -> Optional[Decimal]:
+            async with semaphore:
+                return await self._fetch_balance(wallet_id, currency)
+        
+        return await asyncio.gather(
+            *(fetch_bounded(wallet_id, currency) for wallet_id, currency in pairs),
+            return_exceptions=True
+        )
+    
+    def _build_snapshot(
+        self,
+        wallet_id: str,
+        currency: str,
+        balance: Decimal
+    ) -> BalanceSnapshot:
+        """Создает (несохраненный) BalanceSnapshot для полученного баланса."""
+        return BalanceSnapshot(
+            id=None,
+            wallet_id=wallet_id,
+            currency=currency,
+            balance=balance,
+            timestamp=datetime.utcnow(),
+            source="blockchain"
+        )
+    
+    def _unchanged_snapshot(
+        self,
+        wallet_id: str,
+        currency: str,
+        balance: Decimal
+    ) -> Optional[BalanceSnapshot]:
+        """
+        Возвращает последний snapshot, если баланс не изменился.
+        
+        Неизменный баланс не записывается в БД повторно; в кэше обновляется
+        только timestamp (время последней проверки), чтобы следующая дельта
+        считалась от момента, когда баланс был подтвержден.
+        
+        Args:
+            wallet_id: ID кошелька
+            currency: Валюта
+            balance: Только что полученный баланс
+        
+        Returns:
+            Кэшированный BalanceSnapshot или None (баланс изменился / нет кэша)
+        """
+        key = (wallet_id, currency)
+        previous = self._last_snapshot.get(key)
+        
+        if previous is None or previous.balance != balance:
+            return None
+        
+        previous = replace(previous, timestamp=datetime.utcnow())
+        self._last_snapshot[key] = previous
+        return previous
+    
+    async def _seed_last_snapshots(self, pairs: List[Tuple[str, str]]):
+        """
+        Заполняет кэш последних snapshots из БД для пар, которых в нем нет.
+        
+        Неизменный баланс не записывается повторно, поэтому последняя строка
+        в БД может быть сколь угодно старой; после рестарта первая дельта
+        считается от нее, а не только в пределах окна последнего часа.
+        
+        Args:
+            pairs: Список (wallet_id, currency)
+        """
+        missing = [pair for pair in pairs if pair not in self._last_snapshot]
+        if not missing:
+            return
+        
+        latest = await self.balance_repo.get_latest_bulk(missing)
+        self._last_snapshot.update(latest)
+        logger.debug(f"Seeded {len(latest)} last snapshots from DB ({len(missing)} requested)")
+    
     async def capture_snapshot(
         self,
         wallet_id: str,
@@ -76,26 +217,30 @@ class BalanceMonitor:
         """
         try:
             # Get current balance from blockchain
-            balance = await self.blockchain_service.get_balance(wallet_id, currency)
+            balance = await self._fetch_balance(wallet_id, currency)
             
             if balance is None:
-                logger.warning(f"Failed to get balance for wallet {wallet_id}, currency {currency}")
                 return None
             
+            await self._seed_last_snapshots([(wallet_id, currency)])
+            
+            # Skip the INSERT when nothing changed since the last snapshot
+            unchanged = self._unchanged_snapshot(wallet_id, currency, balance)
+            if unchanged is not None:
+                logger.debug(f"Balance unchanged: wallet={wallet_id}, currency={currency}")
+                return unchanged
+            
             # Create snapshot
-            snapshot = BalanceSnapshot(
-                id=None,
-                wallet_id=wallet_id,
-                currency=currency,
-                balance=Decimal(str(balance)),
-                timestamp=datetime.utcnow(),
-                source="blockchain"
-            )
+            snapshot = self._build_snapshot(wallet_id, currency, balance)
             
             # Save to database
             snapshot_id = await self.balance_repo.create(snapshot)
             snapshot.id = snapshot_id
             
+            delta = self._delta_from_last(snapshot)
+            if delta is not None:
+                self._pending_deltas.append(delta)
+            
             logger.info(
                 f"Captured balance snapshot: wallet={wallet_id}, "
                 f"currency={currency}, balance={balance}"
@@ -107,10 +252,32 @@ class BalanceMonitor:
             logger.error(f"Failed to capture snapshot: {e}")
             return None
     
-    async def capture_all_snapshots(self) -> Dict[str, int]:
+    def _mark_hot(self, deltas: List[BalanceDelta]):
+        """Помечает кошельки с найденными изменениями как hot на hot_wallet_ttl."""
+        if not deltas:
+            return
+        
+        hot_until = time.monotonic() + self.hot_wallet_ttl
+        for delta in deltas:
+            self._hot_until[delta.wallet_id] = hot_until
+    
+    def _is_hot(self, wallet_id: str) -> bool:
+        """Проверяет, были ли у кошелька изменения за последние hot_wallet_ttl."""
+        hot_until = self._hot_until.get(wallet_id)
+        if hot_until is None:
+            return False
+        if hot_until < time.monotonic():
+            del self._hot_until[wallet_id]
+            return False
+        return True
+    
+    async def capture_all_snapshots(self, hot_only: bool = False) -> Dict[str, int]:
         """
         Создает snapshots для всех активных кошельков.
         
+        Args:
+            hot_only: Только кошельки с изменениями за последние hot_wallet_ttl
+        
         Returns:
             Dict со статистикой: {"success": N, "failed": M}
         """
@@ -120,33 +287,61 @@ class BalanceMonitor:
             # Get all active wallets
             wallets = await self.wallet_repo.get_all_active()
             
+            if hot_only:
+                wallets = [wallet for wallet in wallets if self._is_hot(wallet["id"])]
+                
+                if not wallets:
+                    logger.info("No hot wallets, skipping snapshot capture")
+                    return stats
+            
             logger.info(f"Capturing snapshots for {len(wallets)} wallets")
             
-            # Capture snapshots for each wallet
-            tasks = []
+            # Collect (wallet, currency) pairs to capture
+            pairs = []
             for wallet in wallets:
-                # Get currencies for wallet
-                currencies = await self._get_wallet_currencies(wallet["id"])
+                currencies = await self._get_wallet_currencies(wallet)
                 
                 for currency in currencies:
-                    task = self.capture_snapshot(wallet["id"], currency)
-                    tasks.append(task)
+                    pairs.append((wallet["id"], currency))
             
-            # Execute all tasks concurrently
-            results = await asyncio.gather(*tasks, return_exceptions=True)
+            # Fetch all balances (batched when the provider supports it);
+            # pairs not cached yet (restart, new wallets) diff against their
+            # latest stored snapshot
+            balances, _ = await asyncio.gather(
+                self._fetch_balances(pairs),
+                self._seed_last_snapshots(pairs)
+            )
             
-            # Count successes and failures
-            for result in results:
-                if isinstance(result, Exception):
+            # Build snapshots for changed balances only
+            snapshots = []
+            unchanged = 0
+            for (wallet_id, currency), balance in zip(pairs, balances):
+                if isinstance(balance, Exception):
+                    logger.error(f"Failed to fetch balance for wallet {wallet_id}: {balance}")
                     stats["failed"] += 1
-                elif result is not None:
-                    stats["success"] += 1
-                else:
+                elif balance is None:
                     stats["failed"] += 1
+                elif self._unchanged_snapshot(wallet_id, currency, balance) is not None:
+                    unchanged += 1
+                else:
+                    snapshots.append(self._build_snapshot(wallet_id, currency, balance))
+            
+            # Save all snapshots with a single bulk insert
+            snapshot_ids = await self.balance_repo.create_many(snapshots)
+            for snapshot, snapshot_id in zip(snapshots, snapshot_ids):
+                snapshot.id = snapshot_id
+                
+                delta = self._delta_from_last(snapshot)
+                if delta is not None:
+                    self._pending_deltas.append(delta)
+            
+            stats["success"] += len(snapshot_ids) + unchanged
+            stats["failed"] += len(snapshots) - len(snapshot_ids)
             
             logger.info(
                 f"Snapshot capture completed: "
-                f"{stats['success']} success, {stats['failed']} failed"
+                f"{stats['success']} success ({unchanged} unchanged), "
+                f"{stats['failed']} failed"
             )
             
             return stats
@@ -177,33 +372,18 @@ class BalanceMonitor:
             to_time = datetime.utcnow()
             from_time = to_time - timedelta(hours=hours)
             
-            snapshots = await self.balance_repo.get_by_timerange(
-                wallet_id, currency, from_time, to_time
+            snapshots, baseline = await asyncio.gather(
+                self.balance_repo.get_by_timerange(wallet_id, currency, from_time, to_time),
+                self.balance_repo.get_latest_bulk([(wallet_id, currency)], before=from_time)
             )
             
-            if len(snapshots) < 2:
-                logger.debug(f"Not enough snapshots for change detection: {len(snapshots)}")
-                return []
+            # Unchanged balances are not re-inserted: the balance at the start
+            # of the window is the latest snapshot before it
+            previous = baseline.get((wallet_id, currency))
+            if previous is not None:
+                snapshots = [previous, *snapshots]
             
-            # Calculate deltas between consecutive snapshots
-            deltas = []
-            for i in range(len(snapshots) - 1):
-                from_snapshot = snapshots[i]
-                to_snapshot = snapshots[i + 1]
-                
-                delta = BalanceDelta(
-                    wallet_id=wallet_id,
-                    currency=currency,
-                    from_snapshot=from_snapshot,
-                    to_snapshot=to_snapshot,
-                    amount=Decimal(0),  # Calculated in __post_init__
-                    time_diff=0.0,  # Calculated in __post_init__
-                    confidence=0.0  # Calculated in __post_init__
-                )
-                
-                # Only include significant changes
-                if abs(delta.amount) >= self.min_change_threshold:
-                    deltas.append(delta)
+            deltas = self._compute_deltas(wallet_id, currency, snapshots)
             
             logger.info(
                 f"Detected {len(deltas)} balance changes for wallet {wallet_id}, "
@@ -216,6 +396,96 @@ class BalanceMonitor:
             logger.error(f"Failed to detect changes: {e}")
             return []
     
+    def _compute_deltas(
+        self,
+        wallet_id: str,
+        currency: str,
+        snapshots: List[BalanceSnapshot]
+    ) -> List[BalanceDelta]:
+        """
+        Вычисляет значимые изменения между последовательными snapshots.
+        
+        Args:
+            wallet_id: ID кошелька
+            currency: Валюта
+            snapshots: Snapshots, отсортированные по времени
+        
+        Returns:
+            List of BalanceDelta
+        """
+        if len(snapshots) < 2:
+            logger.debug(f"Not enough snapshots for change detection: {len(snapshots)}")
+            return []
+        
+        # Diff consecutive micro-unit balances in one vectorized pass (exact
+        # int64 math) and only materialize BalanceDelta for significant changes
+        balances = np.fromiter(
+            (snapshot.balance_micro for snapshot in snapshots),
+            dtype=np.int64,
+            count=len(snapshots)
+        )
+        diffs = np.abs(np.diff(balances))
+        significant = np.nonzero(diffs >= self.min_change_threshold_micro)[0]
+        
+        return [
+            BalanceDelta(
+                wallet_id=wallet_id,
+                currency=currency,
+                from_snapshot=snapshots[i],
+                to_snapshot=snapshots[i + 1],
+                amount=Decimal(0),  # Calculated in __post_init__
+                time_diff=0.0,  # Calculated in __post_init__
+                confidence=0.0  # Calculated in __post_init__
+            )
+            for i in significant
+        ]
+    
+    def _delta_from_last(self, snapshot: BalanceSnapshot) -> Optional[BalanceDelta]:
+        """
+        Вычисляет дельту между последним известным snapshot и новым,
+        затем запоминает новый snapshot как последний.
+        
+        Args:
+            snapshot: Только что сохраненный snapshot
+        
+        Returns:
+            BalanceDelta или None (нет предыдущего snapshot или изменение незначительно)
+        """
+        key = (snapshot.wallet_id, snapshot.currency)
+        previous = self._last_snapshot.get(key)
+        self._last_snapshot[key] = snapshot
+        
+        if previous is None:
+            return None
+        
+        if abs(snapshot.balance_micro - previous.balance_micro) < self.min_change_threshold_micro:
+            return None
+        
+        return BalanceDelta(
+            wallet_id=snapshot.wallet_id,
+            currency=snapshot.currency,
+            from_snapshot=previous,
+            to_snapshot=snapshot,
+            amount=Decimal(0),  # Calculated in __post_init__
+            time_diff=0.0,  # Calculated in __post_init__
+            confidence=0.0  # Calculated in __post_init__
+        )
+    
+    def detect_incremental_changes(self) -> List[BalanceDelta]:
+        """
+        Возвращает изменения, найденные capture_snapshot() /
+        capture_all_snapshots() с прошлого вызова.
+        
+        Каждая дельта посчитана относительно предыдущего snapshot из памяти,
+        поэтому окно snapshots из БД не читается. Каждая дельта отдается
+        ровно один раз, даже если цикл capture упал на полпути.
+        
+        Returns:
+            List of BalanceDelta
+        """
+        deltas, self._pending_deltas = self._pending_deltas, []
+        return deltas
+    
     async def detect_all_changes(self, hours: int = 1) -> List[BalanceDelta]:
         """
         Детектирует изменения балансов для всех кошельков.
@@ -234,13 +504,29 @@ class BalanceMonitor:
             
             logger.info(f"Detecting changes for {len(wallets)} wallets")
             
-            # Detect changes for each wallet
+            # Collect (wallet, currency) pairs
+            pairs = []
             for wallet in wallets:
-                currencies = await self._get_wallet_currencies(wallet["id"])
+                currencies = await self._get_wallet_currencies(wallet)
                 
                 for currency in currencies:
-                    deltas = await self.detect_changes(wallet["id"], currency, hours)
-                    all_deltas.extend(deltas)
+                    pairs.append((wallet["id"], currency))
+            
+            # Fetch snapshots for all pairs with a single query
+            to_time = datetime.utcnow()
+            from_time = to_time - timedelta(hours=hours)
+            snapshots_by_pair, baselines = await asyncio.gather(
+                self.balance_repo.get_by_timerange_bulk(pairs, from_time, to_time),
+                self.balance_repo.get_latest_bulk(pairs, before=from_time)
+            )
+            
+            # Detect changes for each wallet (from the balance at window start)
+            for wallet_id, currency in pairs:
+                snapshots = snapshots_by_pair.get((wallet_id, currency), [])
+                previous = baselines.get((wallet_id, currency))
+                if previous is not None:
+                    snapshots = [previous, *snapshots]
+                all_deltas.extend(self._compute_deltas(wallet_id, currency, snapshots))
             
             logger.info(f"Total balance changes detected: {len(all_deltas)}")
             
@@ -278,19 +564,24 @@ class BalanceMonitor:
             logger.error(f"Failed to get balance history: {e}")
             return []
     
-    async def _get_wallet_currencies(self, wallet_id: str) -> List[str]:
+    async def _get_wallet_currencies(self, wallet: Dict[str, Any]) -> List[str]:
         """
         Получает список валют для кошелька.
         
+        Использует currency из строки get_all_active(), чтобы не делать
+        отдельный SELECT на каждый кошелек; запрашивает кошелек из БД только
+        если currency в строке нет.
+        
         Args:
-            wallet_id: ID кошелька
+            wallet: Wallet row из get_all_active()
         
         Returns:
             List of currency codes
         """
         try:
-            # Get wallet info
-            wallet = await self.wallet_repo.get_by_id(wallet_id)
+            if "currency" not in wallet:
+                # Get wallet info
+                wallet = await self.wallet_repo.get_by_id(wallet["id"])
             
             if not wallet:
                 return []
@@ -311,26 +602,46 @@ class BalanceMonitor:
         """
         logger.info("Starting balance monitoring...")
         
+        # Schedule cycles against a fixed clock so the time spent capturing
+        # and detecting does not push every following snapshot later
+        next_tick = time.monotonic()
+        cycle = 0
+        
         while True:
+            next_tick += self.snapshot_interval
+            
             try:
-                # Capture snapshots
-                stats = await self.capture_all_snapshots()
+                # Capture snapshots: hot wallets every cycle, all wallets
+                # on the first cycle and every full_scan_every cycles
+                full_scan = cycle % self.full_scan_every == 0
+                cycle += 1
+                stats = await self.capture_all_snapshots(hot_only=not full_scan)
+                
+                # Detect changes (after a restart the cache is seeded from the
+                # latest stored snapshots, so the first cycle is incremental too)
+                deltas = self.detect_incremental_changes()
                 
-                # Detect changes
-                deltas = await self.detect_all_changes(hours=1)
+                self._mark_hot(deltas)
                 
                 logger.info(
                     f"Monitoring cycle completed: "
                     f"{stats['success']} snapshots, {len(deltas)} changes detected"
                 )
                 
-                # Wait for next cycle (1 hour)
-                await asyncio.sleep(self.snapshot_interval)
-                
             except Exception as e:
                 logger.error(f"Error in monitoring cycle: {e}")
                 # Wait a bit before retry
-                await asyncio.sleep(60)
+                next_tick = time.monotonic() + 60
+            
+            # Wait for next cycle (1 hour)
+            delay = next_tick - time.monotonic()
+            if delay < 0:
+                logger.warning(
+                    f"Monitoring cycle overran interval by {-delay:.1f}s"
+                )
+                next_tick = time.monotonic()
+            
+            await asyncio.sleep(max(0.0, delay))
 
 
 # Example usage:
@@ -8,15 +8,118 @@ Pattern Detector для специфичных transaction patterns.
 """
 
 import logging
-from typing import List, Optional, Dict, Any, Tuple
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
 from datetime import datetime, timedelta
 from decimal import Decimal
 
-from src.domain.balance.balance_snapshot import BalanceDelta
+import numpy as np
+from cachetools import TTLCache
+
+from src.domain.balance.balance_snapshot import BalanceDelta, to_micro
 from src.infrastructure.repositories.transaction_repository import TransactionRepository
 
 logger = logging.getLogger(__name__)
 
+_MICROSECOND = timedelta(microseconds=1)
+
+
+@dataclass
+class DeltaArrays:
+    """
+    Struct-of-Arrays представление списка BalanceDelta для matching.
+    
+    Deltas отсортированы по времени; i-й элемент массивов соответствует
+    deltas[i] (back-map для построения pattern dict).
+    """
+    
+    deltas: List[BalanceDelta]
+    ts: np.ndarray  # int64, микросекунды от base
+    amount: np.ndarray  # int64, abs(amount) в micro-units
+    wallet: np.ndarray  # int32, индекс кошелька
+    
+    @classmethod
+    def from_deltas(
+        cls,
+        deltas: List[BalanceDelta],
+        base: datetime,
+        wallet_ids: Dict[str, int]
+    ) -> "DeltaArrays":
+        """
+        Строит массивы один раз для bucket.
+        
+        Args:
+            deltas: Deltas одной стороны (expenses или incomes)
+            base: Точка отсчёта времени (общая для обеих сторон)
+            wallet_ids: wallet_id -> int, дополняется новыми кошельками
+        
+        Returns:
+            DeltaArrays, отсортированный по времени
+        """
+        deltas = sorted(deltas, key=lambda d: d.to_snapshot.timestamp)
+        return cls(
+            deltas=deltas,
+            ts=np.fromiter(
+                ((d.to_snapshot.timestamp - base) // _MICROSECOND for d in deltas),
+                dtype=np.int64, count=len(deltas)
+            ),
+            amount=np.fromiter(
+                (abs(d.amount_micro) for d in deltas), dtype=np.int64, count=len(deltas)
+            ),
+            wallet=np.fromiter(
+                (wallet_ids.setdefault(d.wallet_id, len(wallet_ids)) for d in deltas),
+                dtype=np.int32, count=len(deltas)
+            ),
+        )
+
+
+def _match_pairs(
+    lo: Sequence[int],
+    hi: Sequence[int],
+    amt_a: Sequence[int],
+    amt_b: Sequence[int],
+    tol_num: int,
+    tol_den: int,
+    key_a: Optional[Sequence[int]] = None,
+    key_b: Optional[Sequence[int]] = None
+) -> List[Tuple[int, int]]:
+    """
+    Жадное one-to-one сопоставление на int-массивах (kernel без объектов).
+    
+    Кандидаты для a[i] - b[lo[i]:hi[i]] (окно по времени, стороны
+    отсортированы). Каждый a (от ранних к поздним) забирает самый ранний
+    свободный b с |amt_a - amt_b| * tol_den <= amt_a * tol_num; при
+    заданных key_a/key_b пары с одинаковым ключом пропускаются.
+    
+    Args:
+        lo, hi: Границы окна кандидатов в B для каждого a
+        amt_a, amt_b: Суммы (int) сторон A и B
+        tol_num, tol_den: Tolerance как дробь
+        key_a, key_b: Ключи (например индекс кошелька), совпадение запрещено
+    
+    Returns:
+        List of (index in A, index in B)
+    """
+    used = [False] * len(amt_b)
+    pairs = []
+    
+    for i in range(len(amt_a)):
+        amount = amt_a[i]
+        if amount <= 0:
+            continue
+        
+        for j in range(lo[i], hi[i]):
+            if used[j] or (key_a is not None and key_a[i] == key_b[j]):
+                continue
+            
+            if abs(amount - amt_b[j]) * tol_den <= amount * tol_num:
+                used[j] = True
+                pairs.append((i, j))
+                break
+    
+    return pairs
+
 
 class PatternDetector:
     """
@@ -57,6 +160,13 @@ class PatternDetector:
         self.swap_time_window = 30 * 60  # 30 minutes in seconds
         self.transfer_time_window = 30 * 60  # 30 minutes
         self.amount_tolerance = Decimal("0.05")  # 5% tolerance for fees
+        # amount_tolerance как дробь num/den для сравнения в int micro-units
+        self._tolerance_ratio = self.amount_tolerance.as_integer_ratio()
+        self.blockchain_tx_window = 5 * 60  # ±5 minutes around a card payment
+        
+        # (wallet_id, amount to cents, minute) -> has blockchain transaction;
+        # candidates recur across overlapping batches and retries
+        self._blockchain_tx_cache: TTLCache = TTLCache(maxsize=4096, ttl=600)
         
         logger.info("PatternDetector initialized")
     
@@ -76,70 +186,89 @@ class PatternDetector:
             Dict с деталями swap или None
         """
         try:
-            # Check if USDT decreased and USDC increased
-            if not usdt_delta.is_expense() or not usdc_delta.is_income():
-                return None
-            
-            # Check time window
-            time_diff = abs(
-                (usdc_delta.to_snapshot.timestamp - usdt_delta.to_snapshot.timestamp).total_seconds()
-            )
-            
-            if time_diff > self.swap_time_window:
-                logger.debug(f"Time window too large for swap: {time_diff}s")
-                return None
-            
-            # Check amount matching (with tolerance for fees)
-            usdt_amount = usdt_delta.abs_amount()
-            usdc_amount = usdc_delta.abs_amount()
-            
-            # USDT ≈ USDC (both stablecoins)
-            amount_diff = abs(usdt_amount - usdc_amount)
-            amount_diff_pct = amount_diff / usdt_amount if usdt_amount > 0 else Decimal(1)
-            
-            if amount_diff_pct > self.amount_tolerance:
-                logger.debug(
-                    f"Amount mismatch for swap: USDT={usdt_amount}, "
-                    f"USDC={usdc_amount}, diff={amount_diff_pct:.2%}"
-                )
-                return None
-            
-            # Swap detected!
-            confidence = 1.0 - float(amount_diff_pct)  # Higher confidence if amounts match better
-            
-            swap_info = {
-                "pattern": "usdt_usdc_swap",
-                "from_currency": "USDT",
-                "to_currency": "USDC",
-                "from_amount": float(usdt_amount),
-                "to_amount": float(usdc_amount),
-                "fee": float(amount_diff),
-                "time_diff_seconds": time_diff,
-                "confidence": confidence,
-                "usdt_delta": usdt_delta.to_dict(),
-                "usdc_delta": usdc_delta.to_dict(),
-            }
-            
-            logger.info(
-                f"USDT→USDC swap detected: {usdt_amount} USDT → {usdc_amount} USDC, "
-                f"confidence={confidence:.2f}"
-            )
-            
-            return swap_info
+            return self._match_swap(usdt_delta, usdc_delta)
             
         except Exception as e:
             logger.error(f"Failed to detect swap pattern: {e}")
             return None
     
-    async def detect_card_payment_pattern(
+    def _match_swap(
         self,
+        usdt_delta: BalanceDelta,
         usdc_delta: BalanceDelta
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Проверяет пару deltas на USDT→USDC swap (синхронно, без I/O).
+        
+        Args:
+            usdt_delta: USDT balance change
+            usdc_delta: USDC balance change
+        
+        Returns:
+            Dict с деталями swap или None
+        """
+        # Check if USDT decreased and USDC increased
+        if not usdt_delta.is_expense() or not usdc_delta.is_income():
+            return None
+        
+        # Check time window
+        time_diff = abs(
+            (usdc_delta.to_snapshot.timestamp - usdt_delta.to_snapshot.timestamp).total_seconds()
+        )
+        
+        if time_diff > self.swap_time_window:
+            logger.debug("Time window too large for swap: %ss", time_diff)
+            return None
+        
+        # Check amount matching (with tolerance for fees)
+        # USDT ≈ USDC (both stablecoins)
+        if not self._within_tolerance(abs(usdt_delta.amount_micro), abs(usdc_delta.amount_micro)):
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    "Amount mismatch for swap: USDT=%s, USDC=%s",
+                    usdt_delta.abs_amount(), usdc_delta.abs_amount()
+                )
+            return None
+        
+        # Swap detected!
+        usdt_amount = usdt_delta.abs_amount()
+        usdc_amount = usdc_delta.abs_amount()
+        amount_diff = abs(usdt_amount - usdc_amount)
+        amount_diff_pct = amount_diff / usdt_amount
+        confidence = 1.0 - float(amount_diff_pct)  # Higher confidence if amounts match better
+        
+        swap_info = {
+            "pattern": "usdt_usdc_swap",
+            "from_currency": "USDT",
+            "to_currency": "USDC",
+            "from_amount": float(usdt_amount),
+            "to_amount": float(usdc_amount),
+            "fee": float(amount_diff),
+            "time_diff_seconds": time_diff,
+            "confidence": confidence,
+            "usdt_delta": usdt_delta.to_dict_cached(),
+            "usdc_delta": usdc_delta.to_dict_cached(),
+        }
+        
+        logger.info(
+            "USDT→USDC swap detected: %s USDT → %s USDC, confidence=%.2f",
+            usdt_amount, usdc_amount, confidence
+        )
+        
+        return swap_info
+    
+    async def detect_card_payment_pattern(
+        self,
+        usdc_delta: BalanceDelta,
+        blockchain_txs: Optional[List[Tuple[datetime, int]]] = None
     ) -> Optional[Dict[str, Any]]:
         """
         Детектирует USDC→EUR card payment pattern.
         
         Args:
             usdc_delta: USDC balance change (decrease)
+            blockchain_txs: Транзакции кошелька из _prefetch_tx_window()
+                (если не переданы - запрашиваются из БД)
         
         Returns:
             Dict с деталями payment или None
@@ -151,11 +280,19 @@ class PatternDetector:
             
             # Check if there's no corresponding blockchain transaction
             # (card payments are internal Trustee operations)
-            has_blockchain_tx = await self._has_blockchain_transaction(
-                usdc_delta.wallet_id,
-                usdc_delta.abs_amount(),
-                usdc_delta.to_snapshot.timestamp
-            )
+            if blockchain_txs is None:
+                has_blockchain_tx = await self._has_blockchain_transaction(
+                    usdc_delta.wallet_id,
+                    usdc_delta.abs_amount(),
+                    usdc_delta.to_snapshot.timestamp
+                )
+            else:
+                has_blockchain_tx = self._match_blockchain_transaction_cached(
+                    usdc_delta.wallet_id,
+                    blockchain_txs,
+                    usdc_delta.abs_amount(),
+                    usdc_delta.to_snapshot.timestamp
+                )
             
             if has_blockchain_tx:
                 logger.debug("Blockchain transaction found, not a card payment")
@@ -167,13 +304,13 @@ class PatternDetector:
                 "currency": "USDC",
                 "amount": float(usdc_delta.abs_amount()),
                 "confidence": usdc_delta.confidence,
-                "usdc_delta": usdc_delta.to_dict(),
+                "usdc_delta": usdc_delta.to_dict_cached(),
                 "note": "Trustee Card payment (USDC→EUR)",
             }
             
             logger.info(
-                f"USDC card payment detected: {usdc_delta.abs_amount()} USDC, "
-                f"confidence={usdc_delta.confidence:.2f}"
+                "USDC card payment detected: %s USDC, confidence=%.2f",
+                usdc_delta.abs_amount(), usdc_delta.confidence
             )
             
             return payment_info
@@ -200,64 +337,189 @@ class PatternDetector:
             Dict с деталями transfer или None
         """
         try:
-            # Check if one decreased and other increased
-            if not (delta_a.is_expense() and delta_b.is_income()):
-                return None
-            
-            # Check if same currency
-            if delta_a.currency != delta_b.currency:
-                return None
-            
-            # Check time window
-            time_diff = abs(
-                (delta_b.to_snapshot.timestamp - delta_a.to_snapshot.timestamp).total_seconds()
-            )
-            
-            if time_diff > self.transfer_time_window:
-                logger.debug(f"Time window too large for transfer: {time_diff}s")
-                return None
-            
-            # Check amount matching (with tolerance for fees)
-            amount_a = delta_a.abs_amount()
-            amount_b = delta_b.abs_amount()
-            
-            amount_diff = abs(amount_a - amount_b)
-            amount_diff_pct = amount_diff / amount_a if amount_a > 0 else Decimal(1)
-            
-            if amount_diff_pct > self.amount_tolerance:
-                logger.debug(
-                    f"Amount mismatch for transfer: A={amount_a}, B={amount_b}, "
-                    f"diff={amount_diff_pct:.2%}"
-                )
-                return None
-            
-            # Transfer detected!
-            confidence = 1.0 - float(amount_diff_pct)
-            
-            transfer_info = {
-                "pattern": "inter_wallet_transfer",
-                "from_wallet_id": delta_a.wallet_id,
-                "to_wallet_id": delta_b.wallet_id,
-                "currency": delta_a.currency,
-                "amount": float(amount_a),
-                "fee": float(amount_diff),
-                "time_diff_seconds": time_diff,
-                "confidence": confidence,
-                "delta_a": delta_a.to_dict(),
-                "delta_b": delta_b.to_dict(),
-            }
-            
-            logger.info(
-                f"Inter-wallet transfer detected: {amount_a} {delta_a.currency}, "
-                f"confidence={confidence:.2f}"
-            )
-            
-            return transfer_info
+            return self._match_transfer(delta_a, delta_b)
             
         except Exception as e:
             logger.error(f"Failed to detect transfer pattern: {e}")
             return None
     
+    def _match_transfer(
+        self,
+        delta_a: BalanceDelta,
+        delta_b: BalanceDelta
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Проверяет пару deltas на inter-wallet transfer (синхронно, без I/O).
+        
+        Args:
+            delta_a: Balance change в wallet A (decrease)
+            delta_b: Balance change в wallet B (increase)
+        
+        Returns:
+            Dict с деталями transfer или None
+        """
+        # Check if one decreased and other increased
+        if not (delta_a.is_expense() and delta_b.is_income()):
+            return None
+        
+        # Check if same currency
+        if delta_a.currency != delta_b.currency:
+            return None
+        
+        # Check time window
+        time_diff = abs(
+            (delta_b.to_snapshot.timestamp - delta_a.to_snapshot.timestamp).total_seconds()
+        )
+        
+        if time_diff > self.transfer_time_window:
+            logger.debug("Time window too large for transfer: %ss", time_diff)
+            return None
+        
+        # Check amount matching (with tolerance for fees)
+        if not self._within_tolerance(abs(delta_a.amount_micro), abs(delta_b.amount_micro)):
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    "Amount mismatch for transfer: A=%s, B=%s",
+                    delta_a.abs_amount(), delta_b.abs_amount()
+                )
+            return None
+        
+        # Transfer detected!
+        amount_a = delta_a.abs_amount()
+        amount_b = delta_b.abs_amount()
+        amount_diff = abs(amount_a - amount_b)
+        amount_diff_pct = amount_diff / amount_a
+        confidence = 1.0 - float(amount_diff_pct)
+        
+        transfer_info = {
+            "pattern": "inter_wallet_transfer",
+            "from_wallet_id": delta_a.wallet_id,
+            "to_wallet_id": delta_b.wallet_id,
+            "currency": delta_a.currency,
+            "amount": float(amount_a),
+            "fee": float(amount_diff),
+            "time_diff_seconds": time_diff,
+            "confidence": confidence,
+            "delta_a": delta_a.to_dict_cached(),
+            "delta_b": delta_b.to_dict_cached(),
+        }
+        
+        logger.info(
+            "Inter-wallet transfer detected: %s %s, confidence=%.2f",
+            amount_a, delta_a.currency, confidence
+        )
+        
+        return transfer_info
+    
+    def _within_tolerance(self, expected_micro: int, actual_micro: int) -> bool:
+        """
+        Проверяет |expected - actual| / expected <= amount_tolerance в int.
+        
+        Args:
+            expected_micro: Ожидаемая сумма в micro-units (> 0)
+            actual_micro: Фактическая сумма в micro-units
+        
+        Returns:
+            True if amounts match within tolerance
+        """
+        if expected_micro <= 0:
+            return False
+        
+        num, den = self._tolerance_ratio
+        return abs(expected_micro - actual_micro) * den <= expected_micro * num
+    
+    def _match_one_to_one(
+        self,
+        expenses: List[BalanceDelta],
+        incomes: List[BalanceDelta],
+        time_window: int,
+        match: Callable[[BalanceDelta, BalanceDelta], Optional[Dict[str, Any]]],
+        distinct_wallets: bool = False
+    ) -> List[Tuple[BalanceDelta, Dict[str, Any]]]:
+        """
+        Жадное one-to-one сопоставление expenses и incomes по времени.
+        
+        Обе стороны переводятся в DeltaArrays, окно по времени считается
+        np.searchsorted для всех expenses сразу, пары подбирает int-kernel
+        _match_pairs(); match() вызывается только для найденных пар и
+        строит pattern dict.
+        
+        Args:
+            expenses: Deltas с уменьшением баланса
+            incomes: Deltas с увеличением баланса
+            time_window: Окно в секундах
+            match: Построение pattern dict для пары (expense, income)
+            distinct_wallets: Пары только между разными кошельками
+        
+        Returns:
+            List of (expense, pattern dict)
+        """
+        # Время в микросекундах от самого раннего delta (int без tz-арифметики)
+        base = min(d.to_snapshot.timestamp for d in (*expenses, *incomes))
+        wallet_ids: Dict[str, int] = {}
+        a = DeltaArrays.from_deltas(expenses, base, wallet_ids)
+        b = DeltaArrays.from_deltas(incomes, base, wallet_ids)
+        
+        # Окно ±time_window для всех expenses сразу
+        window = time_window * 1_000_000
+        lo = np.searchsorted(b.ts, a.ts - window, side="left")
+        hi = np.searchsorted(b.ts, a.ts + window, side="right")
+        
+        num, den = self._tolerance_ratio
+        pairs = _match_pairs(
+            lo.tolist(), hi.tolist(), a.amount.tolist(), b.amount.tolist(), num, den,
+            a.wallet.tolist() if distinct_wallets else None,
+            b.wallet.tolist() if distinct_wallets else None
+        )
+        
+        matches = []
+        for i, j in pairs:
+            result = match(a.deltas[i], b.deltas[j])
+            if result:
+                matches.append((a.deltas[i], result))
+        
+        return matches
+    
+    def _detect_transfers(
+        self,
+        deltas: List[BalanceDelta]
+    ) -> List[Tuple[BalanceDelta, Dict[str, Any]]]:
+        """
+        Находит transfers: one-to-one matching внутри каждой валюты.
+        
+        Args:
+            deltas: List of BalanceDelta
+        
+        Returns:
+            List of (expense, transfer dict)
+        """
+        expenses: Dict[str, List[BalanceDelta]] = {}
+        incomes: Dict[str, List[BalanceDelta]] = {}
+        wallets_per_currency: Dict[str, set] = {}
+        for delta in deltas:
+            if delta.is_expense():
+                expenses.setdefault(delta.currency, []).append(delta)
+            elif delta.is_income():
+                incomes.setdefault(delta.currency, []).append(delta)
+            else:
+                continue
+            wallets_per_currency.setdefault(delta.currency, set()).add(delta.wallet_id)
+        
+        transfers = []
+        for currency, currency_expenses in expenses.items():
+            currency_incomes = incomes.get(currency)
+            # Transfer нужен income в той же валюте и хотя бы два кошелька
+            if not currency_incomes or len(wallets_per_currency[currency]) < 2:
+                continue
+            
+            transfers.extend(self._match_one_to_one(
+                currency_expenses, currency_incomes,
+                self.transfer_time_window, self._match_transfer,
+                distinct_wallets=True
+            ))
+        
+        return transfers
+    
     async def detect_all_patterns(
         self,
         deltas: List[BalanceDelta],
@@ -280,41 +542,65 @@ class PatternDetector:
         }
         
         try:
-            # Group deltas by wallet and currency
-            deltas_by_wallet = {}
+            # Index expenses and incomes by (wallet_id, currency) in one pass
+            expense_idx: Dict[Tuple[str, str], List[BalanceDelta]] = {}
+            income_idx: Dict[Tuple[str, str], List[BalanceDelta]] = {}
+            # wallet_id -> {(currency, is_expense)} присутствующие в deltas
+            currencies_per_wallet: Dict[str, set] = {}
             for delta in deltas:
                 key = (delta.wallet_id, delta.currency)
-                if key not in deltas_by_wallet:
-                    deltas_by_wallet[key] = []
-                deltas_by_wallet[key].append(delta)
+                if delta.is_expense():
+                    expense_idx.setdefault(key, []).append(delta)
+                elif delta.is_income():
+                    income_idx.setdefault(key, []).append(delta)
+                else:
+                    continue
+                currencies_per_wallet.setdefault(delta.wallet_id, set()).add(
+                    (delta.currency, delta.is_expense())
+                )
             
-            # Detect swaps (USDT→USDC)
-            usdt_deltas = deltas_by_wallet.get((delta.wallet_id, "USDT"), [])
-            usdc_deltas = deltas_by_wallet.get((delta.wallet_id, "USDC"), [])
+            # Detect swaps (USDT→USDC): only wallets with both USDT out and USDC in
+            swap_legs = {("USDT", True), ("USDC", False)}
+            for wallet_id, currencies in currencies_per_wallet.items():
+                if not swap_legs <= currencies:
+                    continue
+                
+                for _, swap in self._match_one_to_one(
+                    expense_idx[(wallet_id, "USDT")],
+                    income_idx[(wallet_id, "USDC")],
+                    self.swap_time_window,
+                    self._match_swap
+                ):
+                    patterns["swaps"].append(swap)
             
-            for usdt_delta in usdt_deltas:
+            # Detect transfers (between wallets)
+            transfers = self._detect_transfers(deltas)
+            patterns["transfers"].extend(transfer for _, transfer in transfers)
+            transferred = {id(expense) for expense, _ in transfers}
+            
+            # Detect card payments (USDC→EUR) among expenses not matched as transfers
+            for (wallet_id, currency), usdc_deltas in expense_idx.items():
+                if currency != "USDC":
+                    continue
+                
+                usdc_deltas = [d for d in usdc_deltas if id(d) not in transferred]
+                if not usdc_deltas:
+                    continue
+                
+                # One transaction query per wallet covering all candidates
+                # that are not answered from the cache
+                uncached = [
+                    d.to_snapshot.timestamp for d in usdc_deltas
+                    if self._tx_cache_key(wallet_id, d.abs_amount(), d.to_snapshot.timestamp)
+                    not in self._blockchain_tx_cache
+                ]
+                blockchain_txs = await self._prefetch_tx_window(wallet_id, uncached)
+                
                 for usdc_delta in usdc_deltas:
-                    swap = await self.detect_swap_pattern(usdt_delta, usdc_delta)
-                    if swap:
-                        patterns["swaps"].append(swap)
-            
-            # Detect card payments (USDC→EUR)
-            for usdc_delta in usdc_deltas:
-                if usdc_delta.is_expense():
-                    payment = await self.detect_card_payment_pattern(usdc_delta)
+                    payment = await self.detect_card_payment_pattern(usdc_delta, blockchain_txs)
                     if payment:
                         patterns["card_payments"].append(payment)
             
-            # Detect transfers (between wallets)
-            all_deltas = [d for deltas_list in deltas_by_wallet.values() for d in deltas_list]
-            
-            for i, delta_a in enumerate(all_deltas):
-                for delta_b in all_deltas[i+1:]:
-                    if delta_a.wallet_id != delta_b.wallet_id:
-                        transfer = await self.detect_transfer_pattern(delta_a, delta_b, user_id)
-                        if transfer:
-                            patterns["transfers"].append(transfer)
-            
             logger.info(
                 f"Pattern detection completed: "
                 f"{len(patterns['swaps'])} swaps, "
@@ -345,26 +631,100 @@ class PatternDetector:
         Returns:
             True if blockchain transaction exists
         """
+        key = self._tx_cache_key(wallet_id, amount, timestamp)
+        if key in self._blockchain_tx_cache:
+            return self._blockchain_tx_cache[key]
+        
+        transactions = await self._prefetch_tx_window(wallet_id, [timestamp])
+        if transactions is None:
+            return False
+        
+        return self._match_blockchain_transaction_cached(wallet_id, transactions, amount, timestamp)
+    
+    @staticmethod
+    def _tx_cache_key(wallet_id: str, amount: Decimal, timestamp: datetime) -> Tuple:
+        """Ключ кэша: amount до центов, timestamp до минуты."""
+        return (
+            wallet_id,
+            amount.quantize(Decimal("0.01")),
+            timestamp.replace(second=0, microsecond=0)
+        )
+    
+    def _match_blockchain_transaction_cached(
+        self,
+        wallet_id: str,
+        transactions: List[Tuple[datetime, int]],
+        amount: Decimal,
+        timestamp: datetime
+    ) -> bool:
+        """_match_blockchain_transaction() с memoization по _tx_cache_key()."""
+        key = self._tx_cache_key(wallet_id, amount, timestamp)
+        if key not in self._blockchain_tx_cache:
+            self._blockchain_tx_cache[key] = self._match_blockchain_transaction(
+                transactions, amount, timestamp
+            )
+        return self._blockchain_tx_cache[key]
+    
+    async def _prefetch_tx_window(
+        self,
+        wallet_id: str,
+        timestamps: List[datetime]
+    ) -> Optional[List[Tuple[datetime, int]]]:
+        """
+        Загружает транзакции кошелька одним запросом для всех timestamps.
+        
+        Args:
+            wallet_id: ID кошелька
+            timestamps: Timestamps проверяемых изменений баланса
+        
+        Returns:
+            List of (timestamp, amount в micro-units), отсортированный по времени,
+            или None если запрос не удался (результат не кэшируется)
+        """
+        if not timestamps:
+            return []
+        
         try:
-            # Search for transaction in ±5 minutes window
-            from_time = timestamp - timedelta(minutes=5)
-            to_time = timestamp + timedelta(minutes=5)
-            
+            window = timedelta(seconds=self.blockchain_tx_window)
             transactions = await self.transaction_repo.get_by_timerange(
-                wallet_id, from_time, to_time
+                wallet_id, min(timestamps) - window, max(timestamps) + window
             )
             
-            # Check if any transaction matches amount
-            for tx in transactions:
-                tx_amount = Decimal(str(tx.get("amount", 0)))
-                amount_diff = abs(tx_amount - amount)
-                amount_diff_pct = amount_diff / amount if amount > 0 else Decimal(1)
-                
-                if amount_diff_pct <= self.amount_tolerance:
-                    return True
-            
-            return False
+            return sorted(
+                (tx["timestamp"], to_micro(Decimal(str(tx.get("amount", 0)))))
+                for tx in transactions
+            )
             
         except Exception as e:
             logger.error(f"Failed to check blockchain transaction: {e}")
-            return False
+            return None
+    
+    def _match_blockchain_transaction(
+        self,
+        transactions: List[Tuple[datetime, int]],
+        amount: Decimal,
+        timestamp: datetime
+    ) -> bool:
+        """
+        Ищет транзакцию с подходящим amount в окне ±blockchain_tx_window.
+        
+        Args:
+            transactions: Результат _prefetch_tx_window()
+            amount: Amount
+            timestamp: Timestamp
+        
+        Returns:
+            True if blockchain transaction exists
+        """
+        window = timedelta(seconds=self.blockchain_tx_window)
+        lo = bisect_left(transactions, (timestamp - window,))
+        amount_micro = to_micro(amount)
+        
+        for tx_time, tx_amount_micro in transactions[lo:]:
+            if tx_time > timestamp + window:
+                break
+            
+            if self._within_tolerance(amount_micro, tx_amount_micro):
+                return True
+        
+        return False
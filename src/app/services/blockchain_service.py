@@ -3,27 +3,145 @@ Blockchain service for crypto wallet integration.
 Supports Ethereum, TRON, BSC via Moralis and TronGrid APIs.
 """
 import os
-import requests
-from typing import List, Dict, Optional
-from datetime import datetime
+import asyncio
+import functools
+import heapq
+import httpx
+import orjson
+from operator import itemgetter
+from types import MappingProxyType
+from typing import Any, Awaitable, Callable, Iterator, List, Dict, Mapping, Optional, Tuple
+from datetime import datetime, timezone
 from decimal import Decimal
+from cachetools import TTLCache
 from infrastructure.logging_config import get_logger
+from infrastructure.error_handling import (
+    BlockchainAPIError,
+    CircuitBreaker,
+    RateLimitExceededError,
+    RetryConfig,
+    retry_async,
+)
 
 logger = get_logger(__name__)
 
+# Token unit divisors, built once instead of per token/transaction.
+# Decimal(10**d) keeps exponent 0 so quotients print as before.
+_DIV = {d: Decimal(10**d) for d in range(31)}
+_ETH_DIV = _DIV[18]
+_TRX_DIV = _DIV[6]
+
+# Common TRC20 tokens: contract -> (symbol, name, decimals)
+_TRC20_TOKENS: Mapping[str, Tuple[str, str, int]] = MappingProxyType({
+    "TR7NHqjeKQxGTCi8q8ZY4pL8otSzgjLj6t": ("USDT", "Tether USD", 6),
+    "TEkxiTehnzSmSe2XqrBj4w32RUN966rdz8": ("USDC", "USD Coin", 6),
+})
+# Token details lookup from the API is not implemented yet
+_UNKNOWN_TRC20 = ("UNKNOWN", "Unknown Token", 6)
+
+
+def _divisor(decimals: int) -> Decimal:
+    """Return 10**decimals as Decimal (cached for common token decimals)"""
+    div = _DIV.get(decimals)
+    return div if div is not None else Decimal(10**decimals)
+
+
+def _retry_after(response: httpx.Response) -> Optional[int]:
+    """Parse Retry-After header given in seconds"""
+    value = response.headers.get("Retry-After", "")
+    return int(value) if value.isdigit() else None
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_moralis_timestamp(value: str) -> datetime:
+    """UTC datetime from a Moralis block_timestamp (ISO-8601 or epoch seconds)"""
+    if value.isdigit():
+        return datetime.fromtimestamp(int(value), tz=timezone.utc)
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+@functools.lru_cache(maxsize=4096)
+def _from_millis(value: int) -> datetime:
+    """UTC datetime from a TronGrid block_timestamp in milliseconds"""
+    return datetime.fromtimestamp(value / 1000, tz=timezone.utc)
+
+
+@functools.lru_cache(maxsize=10_000)
+def _detect_network(address: str) -> str:
+    """Detect network by the first address character (memoized per address)"""
+    first = address[:1]
+    if first == "0" and address.startswith("0x") and len(address) >= 40:  # Allow 40-42 chars
+        return "ethereum"  # Also works for BSC
+    if first == "T" and len(address) == 34:
+        return "tron"
+    return "unknown"
+
 
 class BlockchainService:
     """Service for blockchain wallet integration"""
     
+    # Cache freshness: balances change with every block, transaction lists
+    # are only appended to
+    BALANCE_CACHE_TTL = 30
+    TRANSACTIONS_CACHE_TTL = 60
+    CACHE_MAX_SIZE = 10_000
+    
+    # Concurrent wallet fetches in bulk lookups (Moralis/TronGrid rate limits)
+    MAX_CONCURRENT_REQUESTS = 10
+    
+    # Wallets per Moralis multi-wallet native balance request
+    MORALIS_BATCH_SIZE = 25
+    
+    # Transient API errors (timeouts, 429, 5xx) are retried with backoff;
+    # after repeated failures a provider is skipped for a while
+    REQUEST_RETRY_CONFIG = RetryConfig(
+        max_attempts=4,
+        initial_delay=0.2,
+        max_delay=10.0,
+        retryable_exceptions=(httpx.TransportError, RateLimitExceededError, BlockchainAPIError)
+    )
+    BREAKER_FAILURE_THRESHOLD = 5
+    BREAKER_RECOVERY_TIMEOUT = 30.0
+    
+    # Upper bound on pages followed per transaction listing
+    MAX_PAGES = 10
+    
     def __init__(self):
         self.moralis_api_key = os.getenv("MORALIS_API_KEY")
         self.moralis_base_url = "https://deep-index.moralis.io/api/v2.2"
         self.trongrid_base_url = "https://api.trongrid.io"
         
+        # One pooled HTTP/2 client for all API calls (keep-alive, no TLS
+        # handshake per request)
+        self._client = httpx.AsyncClient(
+            http2=True,
+            timeout=10,
+            limits=httpx.Limits(max_keepalive_connections=20)
+        )
+        
+        # Per-process cache-aside for wallet endpoints; one in-flight fetch
+        # per key serves all concurrent callers
+        self._balance_cache = TTLCache(maxsize=self.CACHE_MAX_SIZE, ttl=self.BALANCE_CACHE_TTL)
+        self._transactions_cache = TTLCache(maxsize=self.CACHE_MAX_SIZE, ttl=self.TRANSACTIONS_CACHE_TTL)
+        self._fetch_locks: Dict[tuple, asyncio.Lock] = {}
+        
+        self._breakers = {
+            provider: CircuitBreaker(
+                failure_threshold=self.BREAKER_FAILURE_THRESHOLD,
+                recovery_timeout=self.BREAKER_RECOVERY_TIMEOUT,
+                expected_exception=self.REQUEST_RETRY_CONFIG.retryable_exceptions
+            )
+            for provider in ("Moralis", "TronGrid")
+        }
+        
         if not self.moralis_api_key:
             logger.warning("MORALIS_API_KEY not set - blockchain features will be limited")
     
-    def _moralis_request(self, endpoint: str, params: dict = None) -> Optional[dict]:
+    async def close(self):
+        """Close the pooled HTTP client"""
+        await self._client.aclose()
+    
+    async def _moralis_request(self, endpoint: str, params: dict = None) -> Optional[dict]:
         """Make request to Moralis API"""
         if not self.moralis_api_key:
             logger.error("Moralis API key not configured")
@@ -35,43 +153,108 @@ class BlockchainService:
             "accept": "application/json"
         }
         
-        try:
-            response = requests.get(url, headers=headers, params=params, timeout=10)
-            response.raise_for_status()
-            return response.json()
-        except Exception as e:
-            logger.error(f"Moralis API request failed: {e}")
-            return None
+        return await self._request("Moralis", url, headers, params)
     
-    def _trongrid_request(self, endpoint: str, params: dict = None) -> Optional[dict]:
+    async def _trongrid_request(self, endpoint: str, params: dict = None) -> Optional[dict]:
         """Make request to TronGrid API"""
         url = f"{self.trongrid_base_url}/{endpoint}"
         
+        return await self._request("TronGrid", url, None, params)
+    
+    async def _request(
+        self,
+        provider: str,
+        url: str,
+        headers: Optional[dict],
+        params: Optional[dict]
+    ) -> Optional[dict]:
+        """GET through the provider's circuit breaker, retrying transient errors"""
         try:
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            return response.json()
+            return await self._breakers[provider].call(
+                retry_async, self._get_json, provider, url, headers, params,
+                config=self.REQUEST_RETRY_CONFIG
+            )
         except Exception as e:
-            logger.error(f"TronGrid API request failed: {e}")
+            logger.error(f"{provider} API request failed: {e}")
             return None
     
-    def get_eth_balance(self, address: str) -> Optional[Dict]:
+    async def _get_json(
+        self,
+        provider: str,
+        url: str,
+        headers: Optional[dict],
+        params: Optional[dict]
+    ) -> Optional[dict]:
+        """Single GET; raises retryable errors for 429 and 5xx responses"""
+        response = await self._client.get(url, headers=headers, params=params)
+        
+        if response.status_code in (429, 503):
+            raise RateLimitExceededError(provider, retry_after=_retry_after(response))
+        if response.status_code >= 500:
+            raise BlockchainAPIError(provider, f"HTTP {response.status_code}")
+        
+        response.raise_for_status()
+        return orjson.loads(response.content) if response.content else None
+    
+    async def _moralis_request_all(self, endpoint: str, params: dict) -> Optional[dict]:
+        """Moralis request following cursor pagination (pages merged into one result)"""
+        params = dict(params)
+        results = []
+        
+        for _ in range(self.MAX_PAGES):
+            page = await self._moralis_request(endpoint, params)
+            if page is None:
+                return None
+            
+            results.extend(page.get("result", []))
+            if not page.get("cursor"):
+                break
+            params["cursor"] = page["cursor"]
+        
+        return {"result": results}
+    
+    async def _trongrid_request_all(self, endpoint: str, params: dict) -> Optional[dict]:
+        """TronGrid request following fingerprint pagination (pages merged into one result)"""
+        params = dict(params)
+        data = []
+        
+        for _ in range(self.MAX_PAGES):
+            page = await self._trongrid_request(endpoint, params)
+            if page is None:
+                return None
+            
+            data.extend(page.get("data", []))
+            fingerprint = page.get("meta", {}).get("fingerprint")
+            if not fingerprint:
+                break
+            params["fingerprint"] = fingerprint
+        
+        return {"data": data}
+    
+    async def get_eth_balance(self, address: str) -> Optional[Dict]:
         """Get Ethereum wallet balance and tokens"""
         logger.info(f"Fetching ETH balance for {address}")
         
-        # Get native ETH balance
-        native_balance = self._moralis_request(f"{address}/balance", {"chain": "eth"})
+        # Get native ETH balance and ERC20 token balances concurrently
+        native_balance, tokens = await asyncio.gather(
+            self._moralis_request(f"{address}/balance", {"chain": "eth"}),
+            self._moralis_request(f"{address}/erc20", {"chain": "eth"})
+        )
         
-        # Get ERC20 token balances
-        tokens = self._moralis_request(f"{address}/erc20", {"chain": "eth"})
-        
-        if not native_balance:
+        # A missing token list is a failed request (no tokens is []); report
+        # the balance as unavailable rather than with every token at zero
+        if not native_balance or tokens is None:
             return None
         
+        return self._eth_balance_result(address, native_balance.get("balance", "0"), tokens)
+    
+    @staticmethod
+    def _eth_balance_result(address: str, native_wei: str, tokens: Optional[list]) -> Dict:
+        """Build ETH balance dict from native balance (wei) and Moralis ERC20 list"""
         result = {
             "address": address,
             "network": "ethereum",
-            "native_balance": Decimal(native_balance.get("balance", "0")) / Decimal(10**18),
+            "native_balance": Decimal(native_wei) / _ETH_DIV,
             "native_currency": "ETH",
             "tokens": []
         }
@@ -79,7 +262,7 @@ class BlockchainService:
         if tokens:
             for token in tokens:
                 decimals = int(token.get("decimals", 18))
-                balance = Decimal(token.get("balance", "0")) / Decimal(10**decimals)
+                balance = Decimal(token.get("balance", "0")) / _divisor(decimals)
                 result["tokens"].append({
                     "symbol": token.get("symbol"),
                     "name": token.get("name"),
@@ -89,12 +272,12 @@ class BlockchainService:
         
         return result
     
-    def get_tron_balance(self, address: str) -> Optional[Dict]:
+    async def get_tron_balance(self, address: str) -> Optional[Dict]:
         """Get TRON wallet balance and TRC20 tokens"""
         logger.info(f"Fetching TRON balance for {address}")
         
         # Get account info
-        account_info = self._trongrid_request(f"/v1/accounts/{address}")
+        account_info = await self._trongrid_request(f"/v1/accounts/{address}")
         
         if not account_info or "data" not in account_info:
             return None
@@ -102,7 +285,7 @@ class BlockchainService:
         account_data = account_info["data"][0] if account_info["data"] else {}
         
         # Native TRX balance (in SUN, 1 TRX = 1,000,000 SUN)
-        trx_balance = Decimal(account_data.get("balance", 0)) / Decimal(1_000_000)
+        trx_balance = Decimal(account_data.get("balance", 0)) / _TRX_DIV
         
         result = {
             "address": address,
@@ -116,172 +299,303 @@ class BlockchainService:
         trc20_data = account_data.get("trc20", {})
         if isinstance(trc20_data, dict):
             for token_address, token_info in trc20_data.items():
-                # Get token details
-                token_details = self._get_trc20_token_info(token_address)
-                if token_details:
-                    decimals = int(token_details.get("decimals", 6))
-                    balance = Decimal(token_info) / Decimal(10**decimals)
-                    result["tokens"].append({
-                        "symbol": token_details.get("symbol"),
-                        "name": token_details.get("name"),
-                        "balance": balance,
-                        "contract": token_address
-                    })
+                symbol, name, decimals = _TRC20_TOKENS.get(token_address, _UNKNOWN_TRC20)
+                result["tokens"].append({
+                    "symbol": symbol,
+                    "name": name,
+                    "balance": Decimal(token_info) / _divisor(decimals),
+                    "contract": token_address
+                })
         
         return result
     
-    def _get_trc20_token_info(self, contract_address: str) -> Optional[Dict]:
-        """Get TRC20 token information"""
-        # Common TRC20 tokens
-        known_tokens = {
-            "TR7NHqjeKQxGTCi8q8ZY4pL8otSzgjLj6t": {"symbol": "USDT", "name": "Tether USD", "decimals": 6},
-            "TEkxiTehnzSmSe2XqrBj4w32RUN966rdz8": {"symbol": "USDC", "name": "USD Coin", "decimals": 6},
-        }
-        
-        if contract_address in known_tokens:
-            return known_tokens[contract_address]
-        
-        # Try to fetch from API (implement if needed)
-        return {"symbol": "UNKNOWN", "name": "Unknown Token", "decimals": 6}
-    
-    def get_eth_transactions(self, address: str, from_timestamp: Optional[int] = None) -> List[Dict]:
-        """Get Ethereum transactions"""
+    async def get_eth_transactions(self, address: str, from_timestamp: Optional[int] = None) -> Optional[List[Dict]]:
+        """Get Ethereum transactions (None if either section failed)"""
         logger.info(f"Fetching ETH transactions for {address}")
         
-        params = {"chain": "eth"}
+        # Both sections come newest first so they can be merged without a sort
+        params = {"chain": "eth", "order": "DESC"}
         if from_timestamp:
             params["from_date"] = from_timestamp
         
-        # Get native transactions
-        native_txs = self._moralis_request(f"{address}", params)
-        
-        # Get ERC20 token transfers
-        token_txs = self._moralis_request(f"{address}/erc20/transfers", params)
-        
-        transactions = []
-        
-        # Process native transactions
-        if native_txs and "result" in native_txs:
-            for tx in native_txs["result"]:
-                transactions.append({
-                    "hash": tx.get("hash"),
-                    "from": tx.get("from_address"),
-                    "to": tx.get("to_address"),
-                    "value": Decimal(tx.get("value", "0")) / Decimal(10**18),
-                    "currency": "ETH",
-                    "timestamp": datetime.fromtimestamp(int(tx.get("block_timestamp", 0))),
-                    "block": tx.get("block_number"),
-                    "gas_used": tx.get("receipt_gas_used"),
-                    "status": tx.get("receipt_status") == "1"
-                })
-        
-        # Process token transfers
-        if token_txs and "result" in token_txs:
-            for tx in token_txs["result"]:
-                decimals = int(tx.get("token_decimals", 18))
-                transactions.append({
-                    "hash": tx.get("transaction_hash"),
-                    "from": tx.get("from_address"),
-                    "to": tx.get("to_address"),
-                    "value": Decimal(tx.get("value", "0")) / Decimal(10**decimals),
-                    "currency": tx.get("token_symbol"),
-                    "timestamp": datetime.fromisoformat(tx.get("block_timestamp").replace("Z", "+00:00")),
-                    "block": tx.get("block_number"),
-                    "token_address": tx.get("address"),
-                    "status": True
-                })
+        # Get native transactions and ERC20 token transfers concurrently
+        native_txs, token_txs = await asyncio.gather(
+            self._moralis_request_all(f"{address}", params),
+            self._moralis_request_all(f"{address}/erc20/transfers", params)
+        )
+        if native_txs is None or token_txs is None:
+            return None
         
-        return sorted(transactions, key=lambda x: x["timestamp"], reverse=True)
+        return list(heapq.merge(
+            self._iter_eth_native(native_txs),
+            self._iter_eth_tokens(token_txs),
+            key=itemgetter("timestamp"),
+            reverse=True
+        ))
+    
+    @staticmethod
+    def _iter_eth_native(native_txs: Optional[dict]) -> Iterator[Dict]:
+        """Yield native ETH transactions from a Moralis page"""
+        if not native_txs or "result" not in native_txs:
+            return
+        
+        for tx in native_txs["result"]:
+            yield {
+                "hash": tx.get("hash"),
+                "from": tx.get("from_address"),
+                "to": tx.get("to_address"),
+                "value": Decimal(tx.get("value", "0")) / _ETH_DIV,
+                "currency": "ETH",
+                "timestamp": _parse_moralis_timestamp(str(tx.get("block_timestamp", 0))),
+                "block": tx.get("block_number"),
+                "gas_used": tx.get("receipt_gas_used"),
+                "status": tx.get("receipt_status") == "1"
+            }
+    
+    @staticmethod
+    def _iter_eth_tokens(token_txs: Optional[dict]) -> Iterator[Dict]:
+        """Yield ERC20 token transfers from a Moralis page"""
+        if not token_txs or "result" not in token_txs:
+            return
+        
+        for tx in token_txs["result"]:
+            decimals = int(tx.get("token_decimals", 18))
+            yield {
+                "hash": tx.get("transaction_hash"),
+                "from": tx.get("from_address"),
+                "to": tx.get("to_address"),
+                "value": Decimal(tx.get("value", "0")) / _divisor(decimals),
+                "currency": tx.get("token_symbol"),
+                "timestamp": _parse_moralis_timestamp(tx.get("block_timestamp")),
+                "block": tx.get("block_number"),
+                "token_address": tx.get("address"),
+                "status": True
+            }
     
-    def get_tron_transactions(self, address: str, from_timestamp: Optional[int] = None) -> List[Dict]:
-        """Get TRON transactions"""
+    async def get_tron_transactions(self, address: str, from_timestamp: Optional[int] = None) -> Optional[List[Dict]]:
+        """Get TRON transactions (None if either section failed)"""
         logger.info(f"Fetching TRON transactions for {address}")
         
+        # Both sections come newest first so they can be merged without a sort
         params = {
             "limit": 200,
-            "only_confirmed": True
+            "only_confirmed": True,
+            "order_by": "block_timestamp,desc"
         }
         if from_timestamp:
             params["min_timestamp"] = from_timestamp * 1000  # TronGrid uses milliseconds
         
-        # Get TRX transactions
-        trx_txs = self._trongrid_request(f"/v1/accounts/{address}/transactions", params)
-        
-        # Get TRC20 token transfers
-        trc20_txs = self._trongrid_request(f"/v1/accounts/{address}/transactions/trc20", params)
-        
-        transactions = []
-        
-        # Process TRX transactions
-        if trx_txs and "data" in trx_txs:
-            for tx in trx_txs["data"]:
-                raw_data = tx.get("raw_data", {})
-                contract = raw_data.get("contract", [{}])[0]
-                value = contract.get("parameter", {}).get("value", {})
-                
-                amount = Decimal(value.get("amount", 0)) / Decimal(1_000_000)
-                
-                transactions.append({
-                    "hash": tx.get("txID"),
-                    "from": value.get("owner_address"),
-                    "to": value.get("to_address"),
-                    "value": amount,
-                    "currency": "TRX",
-                    "timestamp": datetime.fromtimestamp(tx.get("block_timestamp", 0) / 1000),
-                    "block": tx.get("blockNumber"),
-                    "status": tx.get("ret", [{}])[0].get("contractRet") == "SUCCESS"
-                })
-        
-        # Process TRC20 transfers
-        if trc20_txs and "data" in trc20_txs:
-            for tx in trc20_txs["data"]:
-                token_info = tx.get("token_info", {})
-                decimals = int(token_info.get("decimals", 6))
-                amount = Decimal(tx.get("value", "0")) / Decimal(10**decimals)
-                
-                transactions.append({
-                    "hash": tx.get("transaction_id"),
-                    "from": tx.get("from"),
-                    "to": tx.get("to"),
-                    "value": amount,
-                    "currency": token_info.get("symbol"),
-                    "timestamp": datetime.fromtimestamp(tx.get("block_timestamp", 0) / 1000),
-                    "block": tx.get("block"),
-                    "token_address": tx.get("token_info", {}).get("address"),
-                    "status": True
-                })
+        # Get TRX transactions and TRC20 token transfers concurrently
+        trx_txs, trc20_txs = await asyncio.gather(
+            self._trongrid_request_all(f"/v1/accounts/{address}/transactions", params),
+            self._trongrid_request_all(f"/v1/accounts/{address}/transactions/trc20", params)
+        )
+        if trx_txs is None or trc20_txs is None:
+            return None
         
-        return sorted(transactions, key=lambda x: x["timestamp"], reverse=True)
+        return list(heapq.merge(
+            self._iter_trx(trx_txs),
+            self._iter_trc20(trc20_txs),
+            key=itemgetter("timestamp"),
+            reverse=True
+        ))
+    
+    @staticmethod
+    def _iter_trx(trx_txs: Optional[dict]) -> Iterator[Dict]:
+        """Yield TRX transactions from a TronGrid page"""
+        if not trx_txs or "data" not in trx_txs:
+            return
+        
+        for tx in trx_txs["data"]:
+            raw_data = tx.get("raw_data", {})
+            contract = raw_data.get("contract", [{}])[0]
+            value = contract.get("parameter", {}).get("value", {})
+            
+            amount = Decimal(value.get("amount", 0)) / _TRX_DIV
+            
+            yield {
+                "hash": tx.get("txID"),
+                "from": value.get("owner_address"),
+                "to": value.get("to_address"),
+                "value": amount,
+                "currency": "TRX",
+                "timestamp": _from_millis(tx.get("block_timestamp", 0)),
+                "block": tx.get("blockNumber"),
+                "status": tx.get("ret", [{}])[0].get("contractRet") == "SUCCESS"
+            }
+    
+    @staticmethod
+    def _iter_trc20(trc20_txs: Optional[dict]) -> Iterator[Dict]:
+        """Yield TRC20 token transfers from a TronGrid page"""
+        if not trc20_txs or "data" not in trc20_txs:
+            return
+        
+        for tx in trc20_txs["data"]:
+            token_info = tx.get("token_info", {})
+            decimals = int(token_info.get("decimals", 6))
+            amount = Decimal(tx.get("value", "0")) / _divisor(decimals)
+            
+            yield {
+                "hash": tx.get("transaction_id"),
+                "from": tx.get("from"),
+                "to": tx.get("to"),
+                "value": amount,
+                "currency": token_info.get("symbol"),
+                "timestamp": _from_millis(tx.get("block_timestamp", 0)),
+                "block": tx.get("block"),
+                "token_address": tx.get("token_info", {}).get("address"),
+                "status": True
+            }
     
     def detect_network(self, address: str) -> str:
         """Detect blockchain network from address format"""
-        if address.startswith("0x") and len(address) >= 40:  # Allow 40-42 chars
-            return "ethereum"  # Also works for BSC
-        elif address.startswith("T") and len(address) == 34:
-            return "tron"
-        else:
-            return "unknown"
+        return _detect_network(address)
+    
+    async def _cached_fetch(
+        self,
+        cache: TTLCache,
+        key: tuple,
+        fetch: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """Return cached value for key or fetch it once for all concurrent callers"""
+        if key in cache:
+            return cache[key]
+        
+        lock = self._fetch_locks.setdefault(key, asyncio.Lock())
+        try:
+            async with lock:
+                # Another caller may have filled the cache while we waited
+                if key in cache:
+                    return cache[key]
+                
+                result = await fetch()
+                # Failed requests (None) are not cached
+                if result is not None:
+                    cache[key] = result
+                return result
+        finally:
+            if not lock.locked():
+                self._fetch_locks.pop(key, None)
     
-    def get_wallet_balance(self, address: str) -> Optional[Dict]:
+    async def get_wallet_balance(self, address: str) -> Optional[Dict]:
         """Get wallet balance (auto-detect network)"""
+        return await self._cached_fetch(
+            self._balance_cache,
+            (address,),
+            lambda: self._fetch_wallet_balance(address)
+        )
+    
+    async def _fetch_wallet_balance(self, address: str) -> Optional[Dict]:
         network = self.detect_network(address)
         
         if network == "ethereum":
-            return self.get_eth_balance(address)
+            return await self.get_eth_balance(address)
         elif network == "tron":
-            return self.get_tron_balance(address)
+            return await self.get_tron_balance(address)
         else:
             logger.error(f"Unknown network for address: {address}")
             return None
     
-    def get_wallet_transactions(self, address: str, from_timestamp: Optional[int] = None) -> List[Dict]:
+    async def get_wallet_transactions(self, address: str, from_timestamp: Optional[int] = None) -> List[Dict]:
         """Get wallet transactions (auto-detect network)"""
+        if from_timestamp:
+            # Round down to the minute so refreshes within a minute share one
+            # fetch; the result is a superset and callers dedupe by hash
+            from_timestamp -= from_timestamp % 60
+        
+        transactions = await self._cached_fetch(
+            self._transactions_cache,
+            (address, from_timestamp),
+            lambda: self._fetch_wallet_transactions(address, from_timestamp)
+        )
+        # Failed fetches are not cached and read as no new transactions
+        return transactions if transactions is not None else []
+    
+    async def _fetch_wallet_transactions(self, address: str, from_timestamp: Optional[int]) -> Optional[List[Dict]]:
         network = self.detect_network(address)
         
         if network == "ethereum":
-            return self.get_eth_transactions(address, from_timestamp)
+            return await self.get_eth_transactions(address, from_timestamp)
         elif network == "tron":
-            return self.get_tron_transactions(address, from_timestamp)
+            return await self.get_tron_transactions(address, from_timestamp)
         else:
             logger.error(f"Unknown network for address: {address}")
-            return []
+            return None
+    
+    async def _gather_bounded(
+        self,
+        fetch: Callable[[str], Awaitable[Any]],
+        addresses: List[str]
+    ) -> List[Any]:
+        """Run fetch for every address, at most MAX_CONCURRENT_REQUESTS at a time"""
+        semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_REQUESTS)
+        
+        async def fetch_bounded(address: str) -> Any:
+            async with semaphore:
+                return await fetch(address)
+        
+        return await asyncio.gather(*(fetch_bounded(address) for address in addresses))
+    
+    async def _batch_eth_balances(self, addresses: List[str]) -> Dict[str, str]:
+        """
+        Native ETH balances (wei) for many wallets via Moralis /wallets/balances,
+        one request per MORALIS_BATCH_SIZE addresses. Keys are lowercase addresses;
+        wallets missing from the answer are omitted.
+        """
+        chunks = [
+            addresses[i:i + self.MORALIS_BATCH_SIZE]
+            for i in range(0, len(addresses), self.MORALIS_BATCH_SIZE)
+        ]
+        pages = await asyncio.gather(*(
+            self._moralis_request("wallets/balances", {
+                "chain": "eth",
+                **{f"wallet_addresses[{i}]": address for i, address in enumerate(chunk)}
+            })
+            for chunk in chunks
+        ))
+        
+        balances = {}
+        for page in pages:
+            for chain in page or []:
+                for wallet in chain.get("wallet_balances", []):
+                    balances[wallet["address"].lower()] = wallet.get("balance", "0")
+        
+        return balances
+    
+    async def get_many_wallet_balances(self, addresses: List[str]) -> List[Optional[Dict]]:
+        """Get balances for several wallets concurrently (same order as addresses)"""
+        # Native ETH balances of uncached wallets in one batched call; ERC20
+        # lists have no multi-wallet endpoint and are fetched per wallet
+        eth_addresses = [
+            address for address in dict.fromkeys(addresses)
+            if self.detect_network(address) == "ethereum"
+            and (address,) not in self._balance_cache
+        ]
+        if len(eth_addresses) > 1:
+            native, tokens = await asyncio.gather(
+                self._batch_eth_balances(eth_addresses),
+                self._gather_bounded(
+                    lambda address: self._moralis_request(f"{address}/erc20", {"chain": "eth"}),
+                    eth_addresses
+                )
+            )
+            for address, address_tokens in zip(eth_addresses, tokens):
+                native_wei = native.get(address.lower())
+                if native_wei is not None and address_tokens is not None:
+                    self._balance_cache[(address,)] = self._eth_balance_result(
+                        address, native_wei, address_tokens
+                    )
+        
+        # Cached wallets are answered from the cache, the rest one by one
+        return await self._gather_bounded(self.get_wallet_balance, addresses)
+    
+    async def get_many_wallet_transactions(
+        self,
+        addresses: List[str],
+        from_timestamp: Optional[int] = None
+    ) -> List[List[Dict]]:
+        """Get transactions for several wallets concurrently (same order as addresses)"""
+        return await self._gather_bounded(
+            lambda address: self.get_wallet_transactions(address, from_timestamp),
+            addresses
+        )
@@ -0,0 +1,94 @@
+"""
+Chat History Store
+Persists per-user AI chat history in Redis
+"""
+from collections import deque
+from typing import Dict, Deque, Optional
+import orjson
+import redis.asyncio as redis
+from infrastructure.logging_config import get_logger
+from infrastructure.redis_client import get_redis_client
+
+logger = get_logger(__name__)
+
+
+class ChatHistoryStore:
+    """
+    Redis-backed chat history (system prompt excluded).
+
+    Each user's messages live in one Redis list, newest first: LPUSH + LTRIM
+    keep it bounded atomically, and each message is a single JSON entry.
+    Histories survive restarts and are shared between processes, so Redis is
+    the only copy: every read is one LRANGE, which keeps instances in sync.
+    """
+
+    KEY_PREFIX = "history:"
+    HISTORY_TTL = 30 * 86400  # 30 days since the last message
+
+    def __init__(self, max_messages: int, redis_client: Optional[redis.Redis] = None):
+        """
+        Initialize ChatHistoryStore.
+
+        Args:
+            max_messages: Messages kept per user
+            redis_client: Redis client (default: client on the shared pool)
+        """
+        self.max_messages = max_messages
+        self.redis = redis_client if redis_client is not None else get_redis_client()
+
+    def _key(self, user_id: str) -> str:
+        return f"{self.KEY_PREFIX}{user_id}"
+
+    async def get(self, user_id: str) -> Deque[Dict]:
+        """
+        Get a user's history.
+
+        Args:
+            user_id: User ID
+
+        Returns:
+            Messages, oldest first (bounded deque)
+        """
+        entries = await self.redis.lrange(self._key(user_id), 0, self.max_messages - 1)
+        return deque(
+            (orjson.loads(entry) for entry in reversed(entries)),
+            maxlen=self.max_messages
+        )
+
+    async def append(self, user_id: str, message: Dict):
+        """
+        Append a message, dropping the oldest beyond max_messages.
+
+        Args:
+            user_id: User ID
+            message: Chat message dict (role, content)
+        """
+        key = self._key(user_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.lpush(key, orjson.dumps(message))
+            pipe.ltrim(key, 0, self.max_messages - 1)
+            pipe.expire(key, self.HISTORY_TTL)
+            await pipe.execute()
+
+    async def replace_oldest(self, user_id: str, count: int, message: Dict):
+        """
+        Replace the oldest messages with one message (e.g. their summary).
+
+        Args:
+            user_id: User ID
+            count: Number of oldest messages to remove
+            message: Message stored in their place
+        """
+        key = self._key(user_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.rpop(key, count)
+            pipe.rpush(key, orjson.dumps(message))
+            await pipe.execute()
+
+    async def exists(self, user_id: str) -> bool:
+        """Check whether a user has any stored history"""
+        return bool(await self.redis.exists(self._key(user_id)))
+
+    async def clear(self, user_id: str):
+        """Delete a user's history"""
+        await self.redis.delete(self._key(user_id))
@@ -4,10 +4,18 @@ Handles user confirmation requests for low-confidence AI categorizations
 Now with Redis persistence for reliability and horizontal scaling
 """
 from typing import Dict, Any, Optional, List
-from datetime import datetime, timedelta
-import json
+from dataclasses import asdict
+from datetime import datetime
+import asyncio
+import random
+import secrets
+import time
+import zlib
+import orjson
 import redis.asyncio as redis
+from cachetools import TTLCache
 from infrastructure.logging_config import get_logger
+from infrastructure.redis_client import get_redis_client
 from infrastructure.repositories.transaction_repository import TransactionRepository
 from infrastructure.repositories.category_repository import CategoryRepository
 from infrastructure.repositories.merchant_repository import MerchantRepository
@@ -15,6 +23,58 @@ from infrastructure.repositories.merchant_repository import MerchantRepository
 logger = get_logger(__name__)
 
 
+# Claim a confirmation for its owner: KEYS = confirmation hash, pending set;
+# ARGV = user_id, confirmation_id. Returns nil if missing, 0 if owned by
+# another user, otherwise {pttl, field, value, ...} of the removed hash.
+_CLAIM_SCRIPT = """
+local owner = redis.call('HGET', KEYS[1], 'user_id')
+if not owner then return false end
+if owner ~= ARGV[1] then return 0 end
+local fields = redis.call('HGETALL', KEYS[1])
+table.insert(fields, 1, redis.call('PTTL', KEYS[1]))
+redis.call('DEL', KEYS[1])
+redis.call('SREM', KEYS[2], ARGV[2])
+return fields
+"""
+
+
+# Release a lock only if it is still held by this owner: KEYS = lock key;
+# ARGV = owner token. Returns 1 if released, 0 otherwise.
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+# Payloads above the threshold are stored zlib-compressed behind a marker
+# byte; JSON never starts with it, so small payloads stay plain JSON
+_COMPRESSION_THRESHOLD = 512  # bytes
+_COMPRESSION_LEVEL = 3
+_COMPRESSED_MARKER = b"\x01"
+
+
+def _pack_payload(value: Any) -> bytes:
+    """Serialize a payload, compressing it if it is large"""
+    raw = orjson.dumps(value)
+    if len(raw) <= _COMPRESSION_THRESHOLD:
+        return raw
+    return _COMPRESSED_MARKER + zlib.compress(raw, _COMPRESSION_LEVEL)
+
+
+def _unpack_payload(blob: bytes) -> Any:
+    """Inverse of _pack_payload"""
+    if blob[:1] == _COMPRESSED_MARKER:
+        blob = zlib.decompress(blob[1:])
+    return orjson.loads(blob)
+
+
+def _decode(value):
+    """Hash fields come back as bytes (the shared pool does not decode responses)"""
+    return value.decode() if isinstance(value, bytes) else value
+
+
 class ConfirmationService:
     """
     Service for managing user confirmation requests with Redis persistence.
@@ -32,17 +92,56 @@ class ConfirmationService:
         transaction_repo: TransactionRepository,
         category_repo: CategoryRepository,
         merchant_repo: MerchantRepository,
-        redis_client: redis.Redis
+        redis_client: Optional[redis.Redis] = None
     ):
         self.transaction_repo = transaction_repo
         self.category_repo = category_repo
         self.merchant_repo = merchant_repo
-        self.redis = redis_client
+        # Default: client on the process-wide pool (bytes responses)
+        self.redis = redis_client if redis_client is not None else get_redis_client()
         
-        # Redis key prefix for confirmations
-        self.CONFIRMATION_PREFIX = "confirmation:"
-        self.USER_PENDING_PREFIX = "user_pending:"
+        # Redis key prefixes for confirmations (short: sent with every command,
+        # but namespaced: the sweep scans CONFIRMATION_PREFIX on a shared DB)
+        self.CONFIRMATION_PREFIX = "cf:"
+        self.USER_PENDING_PREFIX = "cfu:"
         self.CONFIRMATION_TTL = 86400  # 24 hours
+        
+        # Per-user category list cache for confirmation buttons
+        self.USER_CATEGORIES_PREFIX = "uc:"
+        self.CATEGORIES_CACHE_TTL = 300  # 5 minutes
+        
+        # Pre-encoded key prefixes (keys are built as bytes, no f-strings)
+        self._confirmation_prefix_b = self.CONFIRMATION_PREFIX.encode()
+        self._user_pending_prefix_b = self.USER_PENDING_PREFIX.encode()
+        self._user_categories_prefix_b = self.USER_CATEGORIES_PREFIX.encode()
+        self.MAX_CATEGORY_BUTTONS = 8  # Telegram inline keyboard; only these are fetched
+        
+        # In-process tier in front of the Redis category cache (shorter TTL:
+        # other processes can only invalidate the Redis tier)
+        self.LOCAL_CATEGORIES_CACHE_TTL = 60
+        self._categories_cache = TTLCache(maxsize=10_000, ttl=self.LOCAL_CATEGORIES_CACHE_TTL)
+        
+        # Repository calls in flight at once (backpressure for callback bursts)
+        self.MAX_CONCURRENT_DB_OPS = 10
+        self._db_semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_DB_OPS)
+        
+        # Atomic owner check + removal for process_confirmation
+        self._claim_script = self.redis.register_script(_CLAIM_SCRIPT)
+        
+        # Backstop sweep for keys without TTL (see cleanup_expired); one
+        # instance at a time sweeps, guarded by a lock with its own TTL
+        self.CLEANUP_SCAN_COUNT = 1000
+        self.CLEANUP_BATCH_PAUSE = 0.05  # seconds, upper bound of jitter
+        self.CLEANUP_LOCK_KEY = "lock:confirmation_cleanup"
+        self.CLEANUP_LOCK_TTL = 60  # seconds
+        self._release_lock_script = self.redis.register_script(_RELEASE_LOCK_SCRIPT)
+        
+        # Fire-and-forget work off the user-facing path (prewarm, learning)
+        self._background_tasks = set()
+        
+        # Expired-key notification listener (see start_expiry_listener)
+        self._expiry_pubsub = None
+        self._expiry_task: Optional[asyncio.Task] = None
     
     async def create_confirmation_request(
         self,
@@ -61,30 +160,35 @@ class ConfirmationService:
         Returns:
             Confirmation request ID
         """
-        # Generate unique confirmation ID
-        confirmation_id = f"conf_{user_id}_{int(datetime.now().timestamp())}"
+        # Generate unique confirmation ID with a random 64-bit suffix
+        # (hex, so the "_" before it still separates the user ID)
+        now = int(time.time())
+        confirmation_id = f"conf_{user_id}_{secrets.token_hex(8)}"
         
-        # Prepare confirmation data
+        # Prepare confirmation fields (a hash, so readers fetch only what they need)
         confirmation_data = {
             "user_id": user_id,
-            "transaction_data": transaction_data,
-            "ai_suggestion": ai_suggestion,
-            "created_at": datetime.now().isoformat(),
-            "expires_at": (datetime.now() + timedelta(hours=24)).isoformat()
+            "tx": _pack_payload(transaction_data),
+            "sugg": orjson.dumps(ai_suggestion),
+            # Rendered once here so showing the message needs no formatting
+            "text": self._format_message(transaction_data, ai_suggestion),
+            "category": ai_suggestion.get("category") or "",
+            "created_at": now,  # epoch seconds
+            "expires_at": now + self.CONFIRMATION_TTL
         }
         
-        # Store in Redis with TTL
-        redis_key = f"{self.CONFIRMATION_PREFIX}{confirmation_id}"
-        await self.redis.setex(
-            redis_key,
-            self.CONFIRMATION_TTL,
-            json.dumps(confirmation_data)
-        )
+        # Store in Redis with TTL and add to user's pending set (one round-trip)
+        redis_key = self._confirmation_prefix_b + confirmation_id.encode()
+        user_pending_key = self._user_pending_prefix_b + user_id.encode()
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(redis_key, mapping=confirmation_data)
+            pipe.expire(redis_key, self.CONFIRMATION_TTL)
+            pipe.sadd(user_pending_key, confirmation_id)
+            pipe.expire(user_pending_key, self.CONFIRMATION_TTL)
+            await pipe.execute()
         
-        # Add to user's pending set
-        user_pending_key = f"{self.USER_PENDING_PREFIX}{user_id}"
-        await self.redis.sadd(user_pending_key, confirmation_id)
-        await self.redis.expire(user_pending_key, self.CONFIRMATION_TTL)
+        # Warm the category cache so showing the message needs no DB read
+        self._run_in_background(self._prewarm_categories(user_id))
         
         logger.info(f"📝 Created confirmation request in Redis: {confirmation_id}")
         return confirmation_id
@@ -102,31 +206,64 @@ class ConfirmationService:
         Returns:
             Message data with text and buttons
         """
-        # Get confirmation from Redis
-        redis_key = f"{self.CONFIRMATION_PREFIX}{confirmation_id}"
-        confirmation_json = await self.redis.get(redis_key)
-        
-        if not confirmation_json:
+        # Get confirmation and cached user categories in one round-trip
+        # (user_id is part of the confirmation ID); categories held in
+        # process memory skip Redis altogether
+        redis_key = self._confirmation_prefix_b + confirmation_id.encode()
+        id_user_id = self._user_id_from_confirmation_id(confirmation_id)
+        local_categories = self._categories_cache.get(id_user_id)
+        
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hmget(redis_key, "user_id", "text", "category", "expires_at")
+            if id_user_id is not None and local_categories is None:
+                pipe.get(self._user_categories_prefix_b + id_user_id.encode())
+            results = await pipe.execute()
+        
+        owner, message_text, suggested_category, expires_at = results[0]
+        categories_json = results[1] if len(results) > 1 else None
+        
+        if owner is None:
             logger.warning(f"Confirmation not found in Redis: {confirmation_id}")
             return None
         
-        try:
-            confirmation = json.loads(confirmation_json)
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse confirmation JSON: {e}")
-            return None
-        
         # Check if expired
-        expires_at = datetime.fromisoformat(confirmation["expires_at"])
-        if datetime.now() > expires_at:
+        if time.time() > int(expires_at):
             logger.warning(f"Confirmation expired: {confirmation_id}")
             await self.redis.delete(redis_key)
             return None
         
-        tx = confirmation["transaction_data"]
-        suggestion = confirmation["ai_suggestion"]
+        # Get user categories for buttons
+        user_id = _decode(owner)
+        if local_categories is not None and id_user_id == user_id:
+            categories = local_categories
+        elif categories_json and id_user_id == user_id:
+            categories = orjson.loads(categories_json)
+            self._categories_cache[user_id] = categories
+        else:
+            categories = await self._load_user_categories(user_id)
         
-        # Format message
+        return {
+            "text": _decode(message_text),
+            "confirmation_id": confirmation_id,
+            "suggested_category": _decode(suggested_category) or None,
+            "categories": categories
+        }
+    
+    @staticmethod
+    def _format_message(
+        tx: Dict[str, Any],
+        suggestion: Dict[str, Any]
+    ) -> str:
+        """
+        Format confirmation message text for Telegram.
+        
+        Args:
+            tx: Transaction data
+            suggestion: AI categorization suggestion
+        
+        Returns:
+            Message text
+        """
         message_text = (
             f"🤔 **Please confirm categorization:**\n\n"
             f"💰 Amount: {tx.get('amount', 0)} {tx.get('currency', 'USD')}\n"
@@ -140,16 +277,84 @@ class ConfirmationService:
         if suggestion.get("suggest_manual_review"):
             message_text += "⚠️ **Low confidence** - please review carefully"
         
-        # Get user categories for buttons
-        user_id = confirmation["user_id"]
-        categories = await self.category_repo.get_by_user(user_id)
+        return message_text
+    
+    def _user_id_from_confirmation_id(self, confirmation_id: str) -> Optional[str]:
+        """
+        Extract user ID from a confirmation ID of the form conf_{user_id}_{suffix}.
         
-        return {
-            "text": message_text,
-            "confirmation_id": confirmation_id,
-            "suggested_category": suggestion.get("category"),
-            "categories": categories[:8]  # Limit to 8 for Telegram inline keyboard
-        }
+        Args:
+            confirmation_id: Confirmation request ID
+        
+        Returns:
+            User ID or None if the ID has another format
+        """
+        if not confirmation_id.startswith("conf_"):
+            return None
+        
+        user_id, sep, _ = confirmation_id[len("conf_"):].rpartition("_")
+        return user_id if sep and user_id else None
+    
+    async def _load_user_categories(self, user_id: str) -> List[Dict[str, Any]]:
+        """
+        Load user categories from the repository and cache them in Redis
+        and in process memory.
+        
+        Args:
+            user_id: User ID
+        
+        Returns:
+            List of categories
+        """
+        # The Supabase-backed repository is synchronous
+        async with self._db_semaphore:
+            user_categories = await asyncio.to_thread(
+                self.category_repo.get_user_categories,
+                user_id,
+                limit=self.MAX_CATEGORY_BUTTONS
+            )
+        categories = [asdict(category) for category in user_categories]
+        self._categories_cache[user_id] = categories
+        
+        try:
+            await self.redis.setex(
+                self._user_categories_prefix_b + user_id.encode(),
+                self.CATEGORIES_CACHE_TTL,
+                orjson.dumps(categories, default=str)
+            )
+        except Exception as e:
+            logger.warning(f"Failed to cache categories for user {user_id}: {e}")
+        
+        return categories
+    
+    async def _prewarm_categories(self, user_id: str):
+        """Cache user categories unless they are already cached"""
+        if user_id in self._categories_cache:
+            return
+        if not await self.redis.exists(self._user_categories_prefix_b + user_id.encode()):
+            await self._load_user_categories(user_id)
+    
+    def _run_in_background(self, coro):
+        """Start a task without waiting for it (kept referenced until done)"""
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._on_background_done)
+    
+    def _on_background_done(self, task: asyncio.Task):
+        """Drop a finished background task and log its failure, if any"""
+        self._background_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Background task failed: {task.exception()}")
+    
+    async def invalidate_user_categories(self, user_id: str):
+        """
+        Drop cached categories after a user's categories changed.
+        
+        Args:
+            user_id: User ID
+        """
+        self._categories_cache.pop(user_id, None)
+        await self.redis.delete(self._user_categories_prefix_b + user_id.encode())
     
     async def process_confirmation(
         self,
@@ -168,62 +373,97 @@ class ConfirmationService:
         Returns:
             True if successful, False otherwise
         """
-        # Get confirmation from Redis
-        redis_key = f"{self.CONFIRMATION_PREFIX}{confirmation_id}"
-        confirmation_json = await self.redis.get(redis_key)
+        # Verify owner and remove from Redis in one atomic step, so a
+        # double tap cannot confirm the same request twice
+        redis_key = self._confirmation_prefix_b + confirmation_id.encode()
+        user_pending_key = self._user_pending_prefix_b + user_id.encode()
+        claimed = await self._claim_script(
+            keys=[redis_key, user_pending_key],
+            args=[user_id, confirmation_id]
+        )
         
-        if not confirmation_json:
+        if claimed is None:
             logger.warning(f"Confirmation not found in Redis: {confirmation_id}")
             return False
         
-        try:
-            confirmation = json.loads(confirmation_json)
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse confirmation JSON: {e}")
+        if claimed == 0:
+            logger.error(f"User {user_id} tried to confirm request of another user: {confirmation_id}")
             return False
         
-        # Verify user owns this confirmation
-        if confirmation["user_id"] != user_id:
-            logger.error(f"User {user_id} tried to confirm request for {confirmation['user_id']}")
-            return False
+        ttl_ms, *flat_fields = claimed
+        fields = {_decode(name): value for name, value in zip(flat_fields[::2], flat_fields[1::2])}
         
-        tx = confirmation["transaction_data"]
-        suggestion = confirmation["ai_suggestion"]
+        try:
+            tx = _unpack_payload(fields["tx"])
+            suggestion = orjson.loads(fields["sugg"])
+        except (KeyError, zlib.error, orjson.JSONDecodeError) as e:
+            logger.error(f"Failed to parse confirmation JSON: {e}")
+            return False
         
         # Update transaction with confirmed category
         try:
-            await self.transaction_repo.update(
-                transaction_id=tx.get("id"),
-                category=confirmed_category,
-                confirmed=True,
-                confirmed_at=datetime.now()
-            )
+            async with self._db_semaphore:
+                await self.transaction_repo.update(
+                    transaction_id=tx.get("id"),
+                    category=confirmed_category,
+                    confirmed=True,
+                    confirmed_at=datetime.now()
+                )
             
             logger.info(f"✅ Transaction {tx.get('id')} confirmed: {confirmed_category}")
         except Exception as e:
             logger.error(f"Failed to update transaction: {e}")
+            # Put the request back so the user can try again
+            await self._restore_confirmation(
+                redis_key, user_pending_key, confirmation_id, fields, ttl_ms
+            )
             return False
         
-        # Learn from correction if user changed category
+        # Learn from correction if user changed category (the reply does
+        # not depend on it, so it runs in the background)
         if confirmed_category != suggestion.get("category"):
-            await self._learn_from_correction(
+            self._run_in_background(self._learn_from_correction(
                 user_id=user_id,
                 merchant=tx.get("merchant"),
                 correct_category=confirmed_category,
                 ai_category=suggestion.get("category")
-            )
-        
-        # Remove from Redis
-        await self.redis.delete(redis_key)
-        
-        # Remove from user's pending set
-        user_pending_key = f"{self.USER_PENDING_PREFIX}{user_id}"
-        await self.redis.srem(user_pending_key, confirmation_id)
+            ))
         
         logger.info(f"🗑️ Removed confirmation from Redis: {confirmation_id}")
         
         return True
     
+    async def _restore_confirmation(
+        self,
+        redis_key: bytes,
+        user_pending_key: bytes,
+        confirmation_id: str,
+        fields: Dict[str, Any],
+        ttl_ms: int
+    ):
+        """
+        Re-create a claimed confirmation with its remaining TTL.
+        
+        Args:
+            redis_key: Confirmation key
+            user_pending_key: User's pending set key
+            confirmation_id: Confirmation request ID
+            fields: Hash fields returned by the claim script
+            ttl_ms: Remaining TTL in milliseconds
+        """
+        if ttl_ms <= 0:
+            return
+        
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.hset(redis_key, mapping=fields)
+                pipe.pexpire(redis_key, ttl_ms)
+                pipe.sadd(user_pending_key, confirmation_id)
+                pipe.expire(user_pending_key, self.CONFIRMATION_TTL)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Failed to restore confirmation {confirmation_id}: {e}")
+    
     async def _learn_from_correction(
         self,
         user_id: str,
@@ -241,24 +481,16 @@ class ConfirmationService:
             ai_category: AI-suggested category
         """
         try:
-            # Check if mapping exists
-            existing = await self.merchant_repo.get_by_merchant(user_id, merchant)
-            
-            if existing:
-                # Update existing mapping
-                await self.merchant_repo.update(
-                    mapping_id=existing["id"],
-                    category=correct_category
+            # Create or update mapping in one atomic statement (the SQLite
+            # repository is blocking, so it runs off the event loop)
+            async with self._db_semaphore:
+                await asyncio.to_thread(
+                    self.merchant_repo.upsert_mapping,
+                    user_id=user_id,
+                    merchant_name=merchant,
+                    category_id=correct_category
                 )
-                logger.info(f"📚 Updated merchant mapping: {merchant} → {correct_category}")
-            else:
-                # Create new mapping
-                await self.merchant_repo.create({
-                    "user_id": user_id,
-                    "merchant_name": merchant,
-                    "category": correct_category
-                })
-                logger.info(f"📚 Learned new merchant mapping: {merchant} → {correct_category}")
+            logger.info(f"📚 Learned merchant mapping: {merchant} → {correct_category}")
             
             # Log correction for analytics
             logger.info(
@@ -280,35 +512,189 @@ class ConfirmationService:
         Returns:
             Count of pending confirmations
         """
-        user_pending_key = f"{self.USER_PENDING_PREFIX}{user_id}"
+        user_pending_key = self._user_pending_prefix_b + user_id.encode()
         count = await self.redis.scard(user_pending_key)
         return count
     
+    async def get_pending_confirmations(self, user_id: str) -> List[Dict[str, Any]]:
+        """
+        Get all pending confirmations of a user in two Redis round-trips.
+        
+        Confirmations that already expired are pruned from the pending set.
+        
+        Args:
+            user_id: User ID
+        
+        Returns:
+            List of confirmations with text, suggested category and expiry
+        """
+        user_pending_key = self._user_pending_prefix_b + user_id.encode()
+        confirmation_ids = [_decode(cid) for cid in await self.redis.smembers(user_pending_key)]
+        if not confirmation_ids:
+            return []
+        
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for confirmation_id in confirmation_ids:
+                pipe.hmget(
+                    self._confirmation_prefix_b + confirmation_id.encode(),
+                    "user_id", "text", "category", "expires_at"
+                )
+            rows = await pipe.execute()
+        
+        confirmations = []
+        stale_ids = []
+        for confirmation_id, (owner, message_text, suggested_category, expires_at) in zip(confirmation_ids, rows):
+            if owner is None:
+                stale_ids.append(confirmation_id)
+                continue
+            
+            confirmations.append({
+                "confirmation_id": confirmation_id,
+                "text": _decode(message_text),
+                "suggested_category": _decode(suggested_category) or None,
+                "expires_at": int(expires_at)
+            })
+        
+        if stale_ids:
+            await self.redis.srem(user_pending_key, *stale_ids)
+        
+        return confirmations
+    
     async def cleanup_expired(self):
         """
-        Remove expired confirmation requests from Redis.
-        Note: Redis TTL handles most cleanup automatically.
-        This method is for manual cleanup if needed.
+        Remove confirmation keys that have no TTL and would never expire.
+        
+        Expiry itself is handled by Redis TTL and start_expiry_listener;
+        this is a backstop sweep. Keys are scanned in large batches, TTLs
+        are checked in one pipeline per batch and stale keys are UNLINKed
+        (freed in a Redis background thread).
+        
+        Only one service instance sweeps at a time; the others return
+        immediately while the lock is held.
         """
-        # Get all confirmation keys
+        lock_token = secrets.token_hex(8)
+        acquired = await self.redis.set(
+            self.CLEANUP_LOCK_KEY, lock_token, nx=True, ex=self.CLEANUP_LOCK_TTL
+        )
+        if not acquired:
+            logger.debug("Confirmation cleanup already running elsewhere, skipping")
+            return
+        
+        try:
+            await self._sweep_keys_without_ttl()
+        finally:
+            await self._release_lock_script(keys=[self.CLEANUP_LOCK_KEY], args=[lock_token])
+    
+    async def _sweep_keys_without_ttl(self):
+        """Scan confirmation keys and remove those that have no TTL"""
         pattern = f"{self.CONFIRMATION_PREFIX}*"
         cursor = 0
-        expired_count = 0
+        removed_count = 0
         
         while True:
-            cursor, keys = await self.redis.scan(cursor, match=pattern, count=100)
+            cursor, keys = await self.redis.scan(cursor, match=pattern, count=self.CLEANUP_SCAN_COUNT)
             
+            # Only keys holding a well-formed confirmation ID are ours
+            owned = []
             for key in keys:
-                # Check TTL
-                ttl = await self.redis.ttl(key)
-                if ttl == -2:  # Key doesn't exist
-                    expired_count += 1
-                elif ttl == -1:  # Key has no expiry (shouldn't happen)
-                    await self.redis.expire(key, self.CONFIRMATION_TTL)
-                    logger.warning(f"Fixed missing TTL for key: {key}")
+                key = _decode(key)
+                user_id = self._user_id_from_confirmation_id(key[len(self.CONFIRMATION_PREFIX):])
+                if user_id is not None:
+                    owned.append((key, user_id))
+            
+            if owned:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for key, _ in owned:
+                        pipe.ttl(key)
+                    ttls = await pipe.execute()
+                
+                # -1: key exists without expiry (-2 means it is already gone)
+                stale = [entry for entry, ttl in zip(owned, ttls) if ttl == -1]
+                if stale:
+                    async with self.redis.pipeline(transaction=False) as pipe:
+                        pipe.unlink(*(key for key, _ in stale))
+                        for key, user_id in stale:
+                            confirmation_id = key[len(self.CONFIRMATION_PREFIX):]
+                            pipe.srem(self._user_pending_prefix_b + user_id.encode(), confirmation_id)
+                        await pipe.execute()
+                    removed_count += len(stale)
             
             if cursor == 0:
                 break
+            
+            # Spread the sweep out instead of hammering Redis
+            await asyncio.sleep(random.uniform(0, self.CLEANUP_BATCH_PAUSE))
+        
+        if removed_count > 0:
+            logger.info(f"🗑️ Removed {removed_count} confirmations without TTL from Redis")
+    
+    async def start_expiry_listener(self):
+        """
+        Keep users' pending sets in sync with Redis TTL expiry.
+        
+        Subscribes to expired-key notifications and removes expired
+        confirmations from users' pending sets as Redis evicts them,
+        instead of periodically scanning all confirmation keys.
+        """
+        if self._expiry_task is not None:
+            return
+        
+        try:
+            await self.redis.config_set("notify-keyspace-events", "Ex")
+        except Exception as e:
+            # Managed Redis may forbid CONFIG; notifications must then be enabled server-side
+            logger.warning(f"Could not enable keyspace notifications: {e}")
+        
+        db = self.redis.connection_pool.connection_kwargs.get("db", 0)
+        self._expiry_pubsub = self.redis.pubsub()
+        await self._expiry_pubsub.psubscribe(f"__keyevent@{db}__:expired")
+        self._expiry_task = asyncio.create_task(self._listen_for_expired())
+        
+        logger.info("👂 Listening for expired confirmations")
+    
+    async def stop_expiry_listener(self):
+        """Stop the expired-key listener"""
+        if self._expiry_task is None:
+            return
+        
+        self._expiry_task.cancel()
+        try:
+            await self._expiry_task
+        except asyncio.CancelledError:
+            pass
+        
+        await self._expiry_pubsub.close()
+        self._expiry_task = None
+        self._expiry_pubsub = None
+    
+    async def _listen_for_expired(self):
+        """Dispatch expired-key notifications until cancelled"""
+        async for message in self._expiry_pubsub.listen():
+            if message["type"] != "pmessage":
+                continue
+            
+            try:
+                await self.on_key_expired(message["data"])
+            except Exception as e:
+                logger.error(f"Failed to handle expired key {message['data']}: {e}")
+    
+    async def on_key_expired(self, key):
+        """
+        Remove an expired confirmation from its user's pending set.
+        
+        Args:
+            key: Expired Redis key (str or bytes)
+        """
+        if isinstance(key, bytes):
+            key = key.decode()
+        
+        if not key.startswith(self.CONFIRMATION_PREFIX):
+            return
+        
+        confirmation_id = key[len(self.CONFIRMATION_PREFIX):]
+        user_id = self._user_id_from_confirmation_id(confirmation_id)
+        if user_id is None:
+            return
         
-        if expired_count > 0:
-            logger.info(f"🗑️ Cleaned up {expired_count} expired confirmations from Redis")
+        await self.redis.srem(self._user_pending_prefix_b + user_id.encode(), confirmation_id)
+        logger.info(f"🗑️ Removed expired confirmation from pending set: {confirmation_id}")
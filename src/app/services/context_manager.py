@@ -3,12 +3,18 @@ Context Manager for AI Services
 Gathers user-specific context for AI prompts
 Based on AI Council recommendations (Claude 3.7)
 """
+import asyncio
 from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta
+import numpy as np
+from cachetools import TTLCache
 from infrastructure.logging_config import get_logger
 
 logger = get_logger(__name__)
 
+_DAY_NAMES = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+_UNDATED = len(_DAY_NAMES)  # weekday code for transactions without a date
+
 
 class ContextManager:
     """
@@ -25,6 +31,12 @@ class ContextManager:
     MAX_TOKENS = 3000
     TOKENS_PER_TRANSACTION = 50  # Approximate
     TOKENS_PER_MERCHANT = 30
+    # Transactions that fit their 60% share of the budget
+    MAX_RECENT_TRANSACTIONS = int((MAX_TOKENS * 0.6) / TOKENS_PER_TRANSACTION)
+    
+    # Per-user cache for categories and merchant mappings (change rarely)
+    CACHE_TTL = 60  # seconds
+    CACHE_MAX_USERS = 10_000
     
     def __init__(
         self,
@@ -47,6 +59,9 @@ class ContextManager:
         self.category_repo = category_repo
         self.merchant_repo = merchant_repo
         
+        self._categories_cache = TTLCache(maxsize=self.CACHE_MAX_USERS, ttl=self.CACHE_TTL)
+        self._merchant_cache = TTLCache(maxsize=self.CACHE_MAX_USERS, ttl=self.CACHE_TTL)
+        
         logger.info("ContextManager initialized")
     
     async def get_categorization_context(
@@ -72,22 +87,26 @@ class ContextManager:
                 - amount: float
                 - currency: str
         """
-        logger.debug(f"Getting categorization context for user {user_id}")
-        
-        # 1. Get user categories
-        user_categories = await self._get_user_categories(user_id)
-        
-        # 2. Get recent transactions (last 7 days)
-        recent_transactions = await self._get_recent_transactions(user_id, days=7)
-        
-        # 3. Get merchant mappings
-        merchant_mappings = await self._get_merchant_mappings(user_id)
+        logger.debug("Getting categorization context for user %s", user_id)
+        
+        # 1-3. Fetch categories, recent transactions (last 7 days) and merchant
+        # mappings concurrently; each helper falls back to defaults on error
+        user_categories, recent_transactions, merchant_mappings = await asyncio.gather(
+            self._get_user_categories(user_id),
+            self._get_recent_transactions(user_id, days=7),
+            self._get_merchant_mappings(user_id)
+        )
         
         # 4. Token management - limit context if too large
-        recent_transactions, merchant_mappings = self._manage_tokens(
-            recent_transactions,
-            merchant_mappings
+        estimated_tokens = (
+            len(recent_transactions) * self.TOKENS_PER_TRANSACTION +
+            len(merchant_mappings) * self.TOKENS_PER_MERCHANT
         )
+        if estimated_tokens > self.MAX_TOKENS:
+            recent_transactions, merchant_mappings = self._manage_tokens(
+                recent_transactions,
+                merchant_mappings
+            )
         
         # 5. Build context
         context = {
@@ -102,9 +121,8 @@ class ContextManager:
         }
         
         logger.debug(
-            f"Context built: {len(user_categories)} categories, "
-            f"{len(recent_transactions)} transactions, "
-            f"{len(merchant_mappings)} merchant mappings"
+            "Context built: %d categories, %d transactions, %d merchant mappings",
+            len(user_categories), len(recent_transactions), len(merchant_mappings)
         )
         
         return context
@@ -132,15 +150,17 @@ class ContextManager:
         """
         logger.debug(f"Getting spending analysis context for user {user_id} ({days} days)")
         
-        # Get transactions for the period
-        start_date = datetime.now() - timedelta(days=days)
+        # Get spending totals for the period
+        now = datetime.now()
+        start_date = now - timedelta(days=days)
         transactions = await self.transaction_repo.get_by_user_and_date_range(
             user_id=user_id,
             start_date=start_date,
-            end_date=datetime.now()
+            end_date=now
         )
+        summary = self._summarize_spending(transactions)
         
-        if not transactions:
+        if not summary["transaction_count"]:
             logger.warning(f"No transactions found for user {user_id}")
             return {
                 "user_id": user_id,
@@ -151,51 +171,18 @@ class ContextManager:
                 "currency": "USD"
             }
         
-        # Calculate spending by category
-        spending_by_category = {}
-        for tx in transactions:
-            category = tx.get("category", "Other")
-            amount = abs(float(tx.get("amount", 0)))
-            spending_by_category[category] = spending_by_category.get(category, 0) + amount
-        
-        # Calculate spending by day of week
-        spending_by_day = {
-            "Monday": 0.0,
-            "Tuesday": 0.0,
-            "Wednesday": 0.0,
-            "Thursday": 0.0,
-            "Friday": 0.0,
-            "Saturday": 0.0,
-            "Sunday": 0.0
-        }
-        
-        for tx in transactions:
-            tx_date = tx.get("date")
-            if tx_date:
-                if isinstance(tx_date, str):
-                    tx_date = datetime.fromisoformat(tx_date)
-                day_name = tx_date.strftime("%A")
-                amount = abs(float(tx.get("amount", 0)))
-                spending_by_day[day_name] += amount
-        
-        # Calculate total spending
-        total_spending = sum(spending_by_category.values())
-        
-        # Get currency (from first transaction)
-        currency = transactions[0].get("currency", "USD") if transactions else "USD"
-        
         context = {
             "user_id": user_id,
-            "total_spending": total_spending,
-            "spending_by_category": spending_by_category,
-            "spending_by_day": spending_by_day,
-            "transaction_count": len(transactions),
-            "currency": currency
+            "total_spending": summary["total_spending"],
+            "spending_by_category": summary["spending_by_category"],
+            "spending_by_day": summary["spending_by_day"],
+            "transaction_count": summary["transaction_count"],
+            "currency": summary["currency"]
         }
         
         logger.debug(
-            f"Spending context built: {total_spending:.2f} {currency} "
-            f"across {len(transactions)} transactions"
+            f"Spending context built: {context['total_spending']:.2f} {context['currency']} "
+            f"across {context['transaction_count']} transactions"
         )
         
         return context
@@ -217,36 +204,30 @@ class ContextManager:
         """
         logger.debug(f"Getting budget recommendation context for user {user_id}")
         
-        # Get user data
-        user = await self.user_repo.get_by_id(user_id)
+        # Get user data and transactions for the period concurrently
+        now = datetime.now()
+        start_date = now - timedelta(days=months * 30)
+        user, transactions = await asyncio.gather(
+            self.user_repo.get_by_id(user_id),
+            self.transaction_repo.get_by_user_and_date_range(
+                user_id=user_id,
+                start_date=start_date,
+                end_date=now
+            )
+        )
+        totals_by_category = self._sum_by_category(transactions)
+        currency = transactions[0].get("currency", "USD") if transactions else "USD"
         monthly_income = user.get("monthly_income") if user else None
         financial_goals = user.get("financial_goals") if user else None
         
-        # Get transactions for the period
-        start_date = datetime.now() - timedelta(days=months * 30)
-        transactions = await self.transaction_repo.get_by_user_and_date_range(
-            user_id=user_id,
-            start_date=start_date,
-            end_date=datetime.now()
-        )
-        
-        # Calculate average monthly spending by category
-        spending_by_category = {}
-        for tx in transactions:
-            category = tx.get("category", "Other")
-            amount = abs(float(tx.get("amount", 0)))
-            spending_by_category[category] = spending_by_category.get(category, 0) + amount
-        
         # Average over months
-        for category in spending_by_category:
-            spending_by_category[category] /= months
+        spending_by_category = {
+            category: total / months for category, total in totals_by_category.items()
+        }
         
         # Calculate average monthly spending
         avg_monthly_spending = sum(spending_by_category.values())
         
-        # Get currency
-        currency = transactions[0].get("currency", "USD") if transactions else "USD"
-        
         context = {
             "user_id": user_id,
             "monthly_income": monthly_income,
@@ -258,9 +239,19 @@ class ContextManager:
         
         return context
     
+    def invalidate(self, user_id: str):
+        """
+        Drop cached categories and merchant mappings after a user's data changed.
+        
+        Args:
+            user_id: User ID
+        """
+        self._categories_cache.pop(user_id, None)
+        self._merchant_cache.pop(user_id, None)
+    
     async def _get_user_categories(self, user_id: str) -> List[str]:
         """
-        Get list of user's categories.
+        Get list of user's categories (cached for CACHE_TTL).
         
         Args:
             user_id: User ID
@@ -268,13 +259,20 @@ class ContextManager:
         Returns:
             List of category names
         """
+        cached = self._categories_cache.get(user_id)
+        if cached is not None:
+            return cached
+        
         try:
             categories = await self.category_repo.get_by_user(user_id)
             if categories:
-                return [cat.get("name") for cat in categories if cat.get("name")]
+                names = [cat.get("name") for cat in categories if cat.get("name")]
             else:
                 # Default categories if user has none
-                return ["Food", "Transport", "Shopping", "Entertainment", "Bills", "Health", "Other"]
+                names = ["Food", "Transport", "Shopping", "Entertainment", "Bills", "Health", "Other"]
+            
+            self._categories_cache[user_id] = names
+            return names
         except Exception as e:
             logger.error(f"Error getting user categories: {e}")
             return ["Other"]
@@ -292,34 +290,47 @@ class ContextManager:
             days: Number of days to look back
         
         Returns:
-            List of transaction dicts
+            List of transaction dicts (cut to MAX_RECENT_TRANSACTIONS when
+            they alone exceed the token budget)
         """
         try:
-            start_date = datetime.now() - timedelta(days=days)
+            now = datetime.now()
+            start_date = now - timedelta(days=days)
             transactions = await self.transaction_repo.get_by_user_and_date_range(
                 user_id=user_id,
                 start_date=start_date,
-                end_date=datetime.now()
+                end_date=now
             )
             
-            # Format for prompt
-            formatted = []
-            for tx in transactions:
-                formatted.append({
-                    "date": tx.get("date", "").strftime("%Y-%m-%d") if isinstance(tx.get("date"), datetime) else str(tx.get("date", "")),
+            # Rows alone over the budget would be cut to MAX_RECENT_TRANSACTIONS
+            # by _manage_tokens anyway, so don't format the rest
+            if len(transactions) * self.TOKENS_PER_TRANSACTION > self.MAX_TOKENS:
+                transactions = transactions[:self.MAX_RECENT_TRANSACTIONS]
+            
+            # Project the prompt fields (rows carry more columns than the prompt needs)
+            return [
+                {
+                    "date": self._format_date(tx.get("date", "")),
                     "merchant": tx.get("merchant", "Unknown"),
                     "amount": abs(float(tx.get("amount", 0))),
                     "category": tx.get("category", "Other")
-                })
-            
-            return formatted
+                }
+                for tx in transactions
+            ]
         except Exception as e:
             logger.error(f"Error getting recent transactions: {e}")
             return []
     
+    @staticmethod
+    def _format_date(value) -> str:
+        """Format a transaction date as YYYY-MM-DD (strings are passed through)"""
+        if isinstance(value, datetime):
+            return value.date().isoformat()
+        return str(value)
+    
     async def _get_merchant_mappings(self, user_id: str) -> List[Dict[str, str]]:
         """
-        Get merchant mappings for user.
+        Get merchant mappings for user (cached for CACHE_TTL).
         
         Args:
             user_id: User ID
@@ -327,6 +338,10 @@ class ContextManager:
         Returns:
             List of merchant mapping dicts
         """
+        cached = self._merchant_cache.get(user_id)
+        if cached is not None:
+            return cached
+        
         try:
             mappings = await self.merchant_repo.get_by_user(user_id)
             
@@ -338,11 +353,84 @@ class ContextManager:
                     "category": mapping.get("category", "Other")
                 })
             
+            self._merchant_cache[user_id] = formatted
             return formatted
         except Exception as e:
             logger.error(f"Error getting merchant mappings: {e}")
             return []
     
+    @staticmethod
+    def _sum_by_category(transactions: List[Dict[str, Any]]) -> Dict[str, float]:
+        """
+        Sum absolute amounts per category (np.bincount over category codes).
+        
+        Args:
+            transactions: List of transaction dicts
+        
+        Returns:
+            Totals by category, in order of first appearance
+        """
+        amounts = np.fromiter(
+            (abs(float(tx.get("amount", 0))) for tx in transactions),
+            dtype=np.float64, count=len(transactions)
+        )
+        category_index: Dict[str, int] = {}
+        category_codes = [
+            category_index.setdefault(tx.get("category", "Other"), len(category_index))
+            for tx in transactions
+        ]
+        totals = np.bincount(category_codes, weights=amounts, minlength=len(category_index))
+        return dict(zip(category_index, totals.tolist()))
+    
+    @staticmethod
+    def _summarize_spending(transactions: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Aggregate fetched transactions into spending totals.
+        
+        Args:
+            transactions: List of transaction dicts
+        
+        Returns:
+            Dict with:
+                - total_spending: float
+                - spending_by_category: Dict[str, float]
+                - spending_by_day: Dict[str, float] (weekday name -> amount)
+                - transaction_count: int
+                - currency: str
+        """
+        # Extract amount, category code and weekday code columns in one pass,
+        # then group-sum them with np.bincount
+        amounts = np.fromiter(
+            (abs(float(tx.get("amount", 0))) for tx in transactions),
+            dtype=np.float64, count=len(transactions)
+        )
+        category_index: Dict[str, int] = {}
+        category_codes = []
+        day_codes = []
+        for tx in transactions:
+            category_codes.append(
+                category_index.setdefault(tx.get("category", "Other"), len(category_index))
+            )
+            tx_date = tx.get("date")
+            if tx_date:
+                if isinstance(tx_date, str):
+                    tx_date = datetime.fromisoformat(tx_date)
+                day_codes.append(tx_date.weekday())
+            else:
+                day_codes.append(_UNDATED)
+        
+        by_category = np.bincount(category_codes, weights=amounts, minlength=len(category_index))
+        by_day = np.bincount(day_codes, weights=amounts, minlength=_UNDATED + 1)
+        
+        return {
+            "total_spending": float(amounts.sum()),
+            "spending_by_category": dict(zip(category_index, by_category.tolist())),
+            "spending_by_day": dict(zip(_DAY_NAMES, by_day.tolist())),
+            "transaction_count": len(transactions),
+            # Currency from first transaction
+            "currency": transactions[0].get("currency", "USD") if transactions else "USD"
+        }
+    
     def _manage_tokens(
         self,
         transactions: List[Dict],
@@ -368,20 +456,19 @@ class ContextManager:
             return transactions, merchant_mappings
         
         logger.warning(
-            f"Context too large ({total_tokens} tokens), limiting to {self.MAX_TOKENS}"
+            "Context too large (%d tokens), limiting to %d", total_tokens, self.MAX_TOKENS
         )
         
         # Limit transactions to most recent
-        max_transactions = int((self.MAX_TOKENS * 0.6) / self.TOKENS_PER_TRANSACTION)
-        limited_transactions = transactions[:max_transactions]
+        limited_transactions = transactions[:self.MAX_RECENT_TRANSACTIONS]
         
         # Limit merchant mappings to most common
         max_mappings = int((self.MAX_TOKENS * 0.4) / self.TOKENS_PER_MERCHANT)
         limited_mappings = merchant_mappings[:max_mappings]
         
         logger.debug(
-            f"Limited context: {len(limited_transactions)} transactions, "
-            f"{len(limited_mappings)} merchant mappings"
+            "Limited context: %d transactions, %d merchant mappings",
+            len(limited_transactions), len(limited_mappings)
         )
         
         return limited_transactions, limited_mappings
@@ -3,12 +3,18 @@ Crypto Card Detector Service
 Detects crypto card payments by analyzing USDT→USDC swaps
 Based on AI Council recommendations (DeepSeek Reasoner)
 """
+import asyncio
+from bisect import bisect_left, bisect_right
 from typing import List, Dict, Any, Optional, Tuple
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from infrastructure.logging_config import get_logger
 
 logger = get_logger(__name__)
 
+_NO_TIMESTAMP = -(2 ** 63)  # int64 minimum: sorts first, never inside a time window
+_MICROSECOND = timedelta(microseconds=1)
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
 
 class CryptoCardDetector:
     """
@@ -25,6 +31,7 @@ class CryptoCardDetector:
     # Configuration
     TIME_WINDOW = timedelta(minutes=5)  # Max time between USDT out and USDC in
     AMOUNT_TOLERANCE = 0.02  # 2% tolerance for fees
+    MAX_CONCURRENT_UPDATES = 10  # Per-row updates in flight
     
     # Transaction types
     USDT_OUT = "USDT_OUT"
@@ -68,14 +75,37 @@ class CryptoCardDetector:
         
         # 2. Find matching swaps
         swaps = []
-        matched_usdc_ids = set()  # Track matched USDC to avoid duplicates
         
-        for usdt_tx in usdt_out:
+        # Sorted parallel columns: timestamps and amounts are parsed once per transaction
+        usdt_out, usdt_times, usdt_amounts = self._to_columns(usdt_out)
+        usdc_in, usdc_times, usdc_amounts = self._to_columns(usdc_in)
+        
+        # Both lists are sorted: if their time ranges are further apart than
+        # the window, no pair can match
+        window = self.TIME_WINDOW // _MICROSECOND
+        if usdt_times[-1] + window < usdc_times[0] or usdc_times[-1] + window < usdt_times[0]:
+            logger.debug("USDT and USDC time ranges do not overlap")
+            return []
+        
+        for usdt_tx, usdt_time, usdt_amount in zip(usdt_out, usdt_times, usdt_amounts):
+            if usdt_time == _NO_TIMESTAMP:
+                logger.warning(f"USDT transaction {usdt_tx.get('id')} has no timestamp")
+                continue
+            
             # Find matching USDC transaction
-            match = self._find_matching_usdc(usdt_tx, usdc_in, matched_usdc_ids)
+            match = self._find_matching_usdc(
+                usdt_time, abs(usdt_amount),
+                usdc_times, usdc_amounts
+            )
             
             if match:
-                usdc_tx, confidence = match
+                usdc_index, confidence = match
+                usdc_tx = usdc_in[usdc_index]
+                
+                # A matched USDC leaves the candidates (columns stay sorted and
+                # aligned), so later windows only scan what is still available
+                for column in (usdc_in, usdc_times, usdc_amounts):
+                    del column[usdc_index]
                 
                 # Create crypto card top-up transaction
                 topup_tx = self._create_topup_transaction(
@@ -86,12 +116,11 @@ class CryptoCardDetector:
                 )
                 
                 swaps.append(topup_tx)
-                matched_usdc_ids.add(usdc_tx["id"])
                 
+                # Lazy %-formatting: built only if a handler takes the record
                 logger.info(
-                    f"✅ Detected crypto card swap: "
-                    f"{usdt_tx['amount']} USDT → {usdc_tx['amount']} USDC "
-                    f"(confidence: {confidence:.2%})"
+                    "✅ Detected crypto card swap: %s USDT → %s USDC (confidence: %.2f%%)",
+                    usdt_tx["amount"], usdc_tx["amount"], confidence * 100
                 )
         
         logger.info(f"Detected {len(swaps)} crypto card top-ups")
@@ -125,65 +154,89 @@ class CryptoCardDetector:
             elif currency == "USDC" and amount > 0:
                 usdc_in.append(tx)
         
-        # Sort by timestamp for efficient matching
-        usdt_out.sort(key=lambda x: x.get("timestamp", datetime.min))
-        usdc_in.sort(key=lambda x: x.get("timestamp", datetime.min))
-        
         return usdt_out, usdc_in
     
-    def _find_matching_usdc(
+    @staticmethod
+    def _epoch_micros(timestamp) -> int:
+        """
+        Convert a transaction timestamp to integer epoch microseconds.
+        
+        Exact integer arithmetic; naive timestamps are taken as UTC, like
+        the aware UTC datetimes from the blockchain service.
+        
+        Args:
+            timestamp: datetime, ISO string or None
+        
+        Returns:
+            Epoch microseconds (_NO_TIMESTAMP if missing)
+        """
+        if not timestamp:
+            return _NO_TIMESTAMP
+        if isinstance(timestamp, str):
+            timestamp = datetime.fromisoformat(timestamp)
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
+        return (timestamp - _EPOCH) // _MICROSECOND
+    
+    def _to_columns(
         self,
-        usdt_tx: Dict[str, Any],
-        usdc_candidates: List[Dict[str, Any]],
-        matched_ids: set
-    ) -> Optional[Tuple[Dict[str, Any], float]]:
+        transactions: List[Dict[str, Any]]
+    ) -> Tuple[List[Dict[str, Any]], List[int], List[float]]:
         """
-        Find matching USDC transaction for a USDT transaction.
+        Sort transactions by time and split them into parallel columns.
+        
+        Each timestamp is parsed exactly once; sorting and matching reuse it.
         
         Args:
-            usdt_tx: USDT outgoing transaction
-            usdc_candidates: List of USDC incoming transactions
-            matched_ids: Set of already matched USDC transaction IDs
+            transactions: List of transactions
         
         Returns:
-            Tuple of (usdc_tx, confidence) or None if no match
+            Tuple of (transactions, epoch microseconds, amounts), sorted by time
         """
-        usdt_amount = abs(float(usdt_tx.get("amount", 0)))
-        usdt_time = usdt_tx.get("timestamp")
+        times = [self._epoch_micros(tx.get("timestamp")) for tx in transactions]
+        order = sorted(range(len(transactions)), key=times.__getitem__)
+        
+        transactions = [transactions[i] for i in order]
+        times = [times[i] for i in order]
+        amounts = [float(tx.get("amount", 0)) for tx in transactions]
+        return transactions, times, amounts
+    
+    def _find_matching_usdc(
+        self,
+        usdt_time: int,
+        usdt_amount: float,
+        usdc_times: List[int],
+        usdc_amounts: List[float]
+    ) -> Optional[Tuple[int, float]]:
+        """
+        Find matching USDC transaction for a USDT transaction.
         
-        if not usdt_time:
-            logger.warning(f"USDT transaction {usdt_tx.get('id')} has no timestamp")
-            return None
+        USDC candidates (not yet matched) are given as parallel lists sorted
+        by timestamp; only candidates inside the time window (bisected) are
+        scanned.
         
-        # Convert string timestamp to datetime if needed
-        if isinstance(usdt_time, str):
-            usdt_time = datetime.fromisoformat(usdt_time)
+        Args:
+            usdt_time: USDT transaction time (epoch microseconds)
+            usdt_amount: Absolute USDT amount
+            usdc_times: USDC candidate times (epoch microseconds, sorted)
+            usdc_amounts: USDC candidate amounts
         
+        Returns:
+            Tuple of (usdc candidate index, confidence) or None if no match
+        """
+        window = self.TIME_WINDOW // _MICROSECOND
         best_match = None
         best_confidence = 0.0
         
-        for usdc_tx in usdc_candidates:
-            # Skip already matched
-            if usdc_tx["id"] in matched_ids:
-                continue
-            
-            usdc_amount = float(usdc_tx.get("amount", 0))
-            usdc_time = usdc_tx.get("timestamp")
-            
-            if not usdc_time:
-                continue
-            
-            # Convert string timestamp to datetime if needed
-            if isinstance(usdc_time, str):
-                usdc_time = datetime.fromisoformat(usdc_time)
-            
-            # Check time window
-            time_diff = abs(usdc_time - usdt_time)
-            if time_diff > self.TIME_WINDOW:
-                continue
+        # Candidates within the time window
+        lo = bisect_left(usdc_times, usdt_time - window)
+        hi = bisect_right(usdc_times, usdt_time + window)
+        
+        for i in range(lo, hi):
+            time_diff = abs(usdc_times[i] - usdt_time)
             
             # Check amount tolerance
-            amount_diff = abs(usdc_amount - usdt_amount)
+            amount_diff = abs(usdc_amounts[i] - usdt_amount)
             amount_ratio = amount_diff / usdt_amount if usdt_amount > 0 else 1.0
             
             if amount_ratio > self.AMOUNT_TOLERANCE:
@@ -193,16 +246,16 @@ class CryptoCardDetector:
             # Higher confidence for:
             # - Closer time match
             # - Closer amount match
-            time_score = 1.0 - (time_diff.total_seconds() / self.TIME_WINDOW.total_seconds())
+            time_score = 1.0 - (time_diff / window)
             amount_score = 1.0 - (amount_ratio / self.AMOUNT_TOLERANCE)
             confidence = (time_score * 0.4 + amount_score * 0.6)
             
             # Keep best match
             if confidence > best_confidence:
-                best_match = usdc_tx
+                best_match = i
                 best_confidence = confidence
         
-        if best_match:
+        if best_match is not None:
             return (best_match, best_confidence)
         
         return None
@@ -264,6 +317,8 @@ class CryptoCardDetector:
         """
         Mark transactions as internal transfers (hide from main view).
         
+        Runs the per-row updates concurrently (bounded).
+        
         Args:
             transaction_ids: List of transaction IDs to mark
         
@@ -273,15 +328,18 @@ class CryptoCardDetector:
         if not transaction_ids:
             return 0
         
+        patch = {"internal_transfer": True}
+        
         try:
-            count = 0
-            for tx_id in transaction_ids:
-                await self.transaction_repo.update(
-                    tx_id,
-                    {"internal_transfer": True}
-                )
-                count += 1
+            semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_UPDATES)
+            
+            async def update_bounded(tx_id: str):
+                async with semaphore:
+                    await self.transaction_repo.update(tx_id, patch)
+            
+            await asyncio.gather(*(update_bounded(tx_id) for tx_id in transaction_ids))
             
+            count = len(transaction_ids)
             logger.info(f"Marked {count} transactions as internal transfers")
             return count
             
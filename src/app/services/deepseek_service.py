@@ -2,19 +2,44 @@
 DeepSeek AI service for financial analysis with persistent chat.
 """
 import os
+import re
 import json
-import requests
-from typing import List, Dict, Optional
+import asyncio
+from contextlib import suppress
+import httpx
+from cachetools import TTLCache
+from typing import List, Dict, Optional, AsyncIterator
 from datetime import datetime
 from infrastructure.logging_config import get_logger
+from app.services.chat_history_store import ChatHistoryStore
 
 logger = get_logger(__name__)
 
+# Queued by the stream reader once "data: [DONE]" arrived
+_STREAM_DONE = object()
+
 
 class DeepSeekService:
     """Service for AI-powered financial analysis using DeepSeek"""
     
-    def __init__(self):
+    # Completions in flight at once (DeepSeek rate limits)
+    MAX_CONCURRENT_REQUESTS = 3
+    
+    # Transactions per batch categorization prompt (keeps the reply well
+    # under max_tokens)
+    CATEGORIZATION_BATCH_SIZE = 15
+    
+    # Messages sent per request, system prompt included
+    MAX_HISTORY_MESSAGES = 20
+    
+    # Categorization cache by (user, normalized merchant name); only
+    # confident results (0-100 scale) are served without a request
+    CATEGORIZATION_CACHE_SIZE = 50_000
+    CATEGORIZATION_CACHE_TTL = 86400  # 1 day
+    CATEGORIZATION_CACHE_MIN_CONFIDENCE = 90
+    LEARNED_MERCHANT_CONFIDENCE = 100
+    
+    def __init__(self, history_store: Optional[ChatHistoryStore] = None):
         self.api_key = os.getenv("DEEPSEEK_API_KEY")
         self.base_url = "https://api.deepseek.com/v1"
         
@@ -22,30 +47,42 @@ class DeepSeekService:
             logger.error("DEEPSEEK_API_KEY not set - AI features disabled")
             logger.error("Please set DEEPSEEK_API_KEY environment variable to enable AI features")
         
-        # Persistent chat history per user
-        self.chat_histories = {}
+        # Persistent chat history per user (Redis), system prompt excluded
+        self.history_store = history_store or ChatHistoryStore(
+            max_messages=self.MAX_HISTORY_MESSAGES - 1
+        )
+        
+        self._categorization_cache = TTLCache(
+            maxsize=self.CATEGORIZATION_CACHE_SIZE,
+            ttl=self.CATEGORIZATION_CACHE_TTL
+        )
+        
+        # One pooled HTTP/2 client for all completions (keep-alive, no TLS
+        # handshake per request)
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers={"Authorization": f"Bearer {self.api_key}"},
+            http2=True,
+            timeout=httpx.Timeout(120, connect=5),
+            limits=httpx.Limits(max_keepalive_connections=32, max_connections=64)
+        )
+        self._request_semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_REQUESTS)
+    
+    async def close(self):
+        """Close the pooled HTTP client"""
+        await self._client.aclose()
     
-    def _make_request(self, messages: List[Dict], model: str = "deepseek-chat") -> Optional[str]:
+    async def _make_request(self, messages: List[Dict], model: str = "deepseek-chat") -> Optional[str]:
         """Make request to DeepSeek API"""
         if not self.api_key:
             logger.error("DeepSeek API key not configured")
             return None
         
-        url = f"{self.base_url}/chat/completions"
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
-            "model": model,
-            "messages": messages,
-            "temperature": 0.7,
-            "max_tokens": 4000
-        }
+        payload = self._build_payload(messages, model)
         
         try:
-            response = requests.post(url, headers=headers, json=payload, timeout=120)
+            async with self._request_semaphore:
+                response = await self._client.post("/chat/completions", json=payload)
             response.raise_for_status()
             data = response.json()
             return data["choices"][0]["message"]["content"]
@@ -53,25 +90,105 @@ class DeepSeekService:
             logger.error(f"DeepSeek API request failed: {e}")
             return None
     
-    def _get_chat_history(self, user_id: str) -> List[Dict]:
-        """Get persistent chat history for user"""
-        if user_id not in self.chat_histories:
-            self.chat_histories[user_id] = []
-        return self.chat_histories[user_id]
+    async def _stream_request(self, messages: List[Dict], model: str = "deepseek-chat") -> AsyncIterator[str]:
+        """
+        Make a streaming request to DeepSeek API.
+        
+        Yields content chunks as server-sent events arrive. A background
+        reader drains the response into a queue, so the request slot is held
+        only while DeepSeek generates, not while a slow consumer catches up.
+        Raises if the request fails or the stream ends before [DONE].
+        """
+        if not self.api_key:
+            logger.error("DeepSeek API key not configured")
+            return
+        
+        payload = self._build_payload(messages, model, stream=True)
+        queue: asyncio.Queue = asyncio.Queue()
+        
+        async def read_stream():
+            try:
+                async with self._request_semaphore:
+                    async with self._client.stream("POST", "/chat/completions", json=payload) as response:
+                        response.raise_for_status()
+                        async for line in response.aiter_lines():
+                            # SSE frames: "data: {...}", terminated by "data: [DONE]"
+                            if not line.startswith("data:"):
+                                continue
+                            data = line[len("data:"):].strip()
+                            if data == "[DONE]":
+                                queue.put_nowait(_STREAM_DONE)
+                                return
+                            content = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                            if content:
+                                queue.put_nowait(content)
+                raise httpx.RemoteProtocolError("stream ended before [DONE]")
+            except Exception as e:
+                queue.put_nowait(e)
+        
+        reader = asyncio.create_task(read_stream())
+        try:
+            while True:
+                item = await queue.get()
+                if item is _STREAM_DONE:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # Consumer may stop early; don't leave the request running
+            reader.cancel()
+            with suppress(asyncio.CancelledError):
+                await reader
+    
+    @staticmethod
+    def _build_payload(messages: List[Dict], model: str, stream: bool = False) -> Dict:
+        """Build chat completion request body"""
+        payload = {
+            "model": model,
+            "messages": messages,
+            "temperature": 0.7,
+            "max_tokens": 4000
+        }
+        if stream:
+            payload["stream"] = True
+        return payload
+    
+    async def _get_chat_history(self, user_id: str) -> List[Dict]:
+        """Get persistent chat history for user (system prompt first)"""
+        history = await self.history_store.get(user_id)
+        return [{"role": "system", "content": self._get_system_prompt()}, *history]
     
-    def _add_to_history(self, user_id: str, role: str, content: str):
+    async def _add_to_history(self, user_id: str, role: str, content: str):
         """Add message to chat history"""
-        history = self._get_chat_history(user_id)
-        history.append({"role": role, "content": content})
-        
-        # Limit history to prevent token overflow (keep last 20 messages)
-        if len(history) > 20:
-            # Keep system message and last 19 messages
-            system_msg = next((msg for msg in history if msg["role"] == "system"), None)
-            history = history[-19:]
-            if system_msg and history[0]["role"] != "system":
-                history.insert(0, system_msg)
-            self.chat_histories[user_id] = history
+        history = await self.history_store.get(user_id)
+        
+        # Limit history to prevent token overflow: fold the oldest messages
+        # into a summary instead of losing them
+        if len(history) >= self.history_store.max_messages:
+            await self._summarize_history(user_id, list(history))
+        
+        await self.history_store.append(user_id, {"role": role, "content": content})
+    
+    async def _summarize_history(self, user_id: str, history: List[Dict]):
+        """Replace the oldest half of the history with one memory message"""
+        oldest = history[:len(history) // 2]
+        transcript = "\n\n".join(f"{msg['role']}: {msg['content']}" for msg in oldest)
+        
+        summary = await self._make_request([
+            {"role": "system", "content": "You summarize conversations between a user and a financial analyst AI."},
+            {"role": "user", "content": f"Summarize the following exchange in 2 sentences, keeping facts, numbers and merchant mappings:\n\n{transcript}"}
+        ])
+        if not summary:
+            # Oldest messages simply fall off the bounded history
+            return
+        
+        await self.history_store.replace_oldest(
+            user_id,
+            len(oldest),
+            {"role": "system", "content": f"Summary of earlier conversation: {summary}"}
+        )
+        logger.info(f"Summarized {len(oldest)} history messages for user {user_id}")
     
     def _get_system_prompt(self) -> str:
         """Get comprehensive system prompt for financial analysis"""
@@ -110,24 +227,35 @@ class DeepSeekService:
 
 You maintain context across conversations to provide increasingly better analysis over time."""
     
-    def initialize_user_chat(self, user_id: str):
-        """Initialize chat history for new user"""
-        if user_id not in self.chat_histories:
-            self.chat_histories[user_id] = [
-                {"role": "system", "content": self._get_system_prompt()}
-            ]
-            logger.info(f"Initialized chat history for user {user_id}")
+    async def initialize_user_chat(self, user_id: str) -> bool:
+        """
+        Check that a user's chat exists.
+        
+        The system prompt is prepended per request and never stored, so a
+        new user needs no setup.
+        
+        Returns:
+            True if the user already has stored history
+        """
+        if await self.history_store.exists(user_id):
+            return True
+        logger.info(f"Initialized chat history for user {user_id}")
+        return False
     
-    def analyze_transactions(
+    async def analyze_transactions(
         self,
         user_id: str,
         transactions: List[Dict],
         period_days: int,
         categories: Dict[str, str] = None
-    ) -> Optional[str]:
-        """Analyze transactions and generate comprehensive report"""
-        self.initialize_user_chat(user_id)
+    ) -> AsyncIterator[str]:
+        """
+        Analyze transactions and generate comprehensive report.
         
+        Streams the report: chunks are yielded as they are generated, and
+        the report is added to the chat history only if the stream completed
+        (a truncated reply is not stored as the assistant's answer).
+        """
         # Prepare transaction data for analysis
         tx_summary = self._prepare_transaction_summary(transactions, categories)
         
@@ -150,19 +278,24 @@ You maintain context across conversations to provide increasingly better analysi
 Please provide a detailed, well-structured report with specific numbers and actionable recommendations."""
         
         # Add to history and get response
-        self._add_to_history(user_id, "user", prompt)
+        await self._add_to_history(user_id, "user", prompt)
         
         # Get all messages for context
-        messages = self._get_chat_history(user_id)
+        messages = await self._get_chat_history(user_id)
         
-        # Make API request
-        response = self._make_request(messages, model="deepseek-chat")
+        # Stream API response
+        chunks = []
+        try:
+            async for chunk in self._stream_request(messages, model="deepseek-chat"):
+                chunks.append(chunk)
+                yield chunk
+        except Exception as e:
+            logger.error(f"DeepSeek API streaming request failed: {e}")
+            return
         
-        if response:
-            self._add_to_history(user_id, "assistant", response)
+        if chunks:
+            await self._add_to_history(user_id, "assistant", "".join(chunks))
             logger.info(f"Generated financial analysis for user {user_id}")
-        
-        return response
     
     def _prepare_transaction_summary(
         self,
@@ -209,15 +342,17 @@ Spending by Category:
         
         return summary
     
-    def categorize_transaction(
+    async def categorize_transaction(
         self,
         user_id: str,
         merchant_name: str,
         amount: float,
         description: str = None
     ) -> Dict:
-        """Use AI to categorize a transaction"""
-        self.initialize_user_chat(user_id)
+        """Use AI to categorize a transaction (cached by merchant)"""
+        cached = self._get_cached_categorization(user_id, merchant_name)
+        if cached:
+            return cached
         
         prompt = f"""Categorize this transaction:
 
@@ -237,24 +372,18 @@ Respond in JSON format:
     "reasoning": "brief explanation"
 }}"""
         
-        self._add_to_history(user_id, "user", prompt)
-        messages = self._get_chat_history(user_id)
+        await self._add_to_history(user_id, "user", prompt)
+        messages = await self._get_chat_history(user_id)
         
-        response = self._make_request(messages, model="deepseek-chat")
+        response = await self._make_request(messages, model="deepseek-chat")
         
         if response:
-            self._add_to_history(user_id, "assistant", response)
+            await self._add_to_history(user_id, "assistant", response)
             
             # Parse JSON response
             try:
-                # Extract JSON from response (handle markdown code blocks)
-                json_str = response
-                if "```json" in response:
-                    json_str = response.split("```json")[1].split("```")[0].strip()
-                elif "```" in response:
-                    json_str = response.split("```")[1].split("```")[0].strip()
-                
-                result = json.loads(json_str)
+                result = self._extract_json(response)
+                self._cache_categorization(user_id, merchant_name, result)
                 return result
             except Exception as e:
                 logger.error(f"Failed to parse AI categorization response: {e}")
@@ -270,9 +399,139 @@ Respond in JSON format:
             "reasoning": "AI request failed"
         }
     
-    def learn_merchant(self, user_id: str, merchant_name: str, category: str):
+    async def categorize_transactions_batch(
+        self,
+        user_id: str,
+        transactions: List[Dict]
+    ) -> List[Dict]:
+        """
+        Use AI to categorize many transactions with one request per batch.
+        
+        Merchants with a cached categorization are answered without a
+        request. The rest are sent CATEGORIZATION_BATCH_SIZE at a time as
+        numbered entries; the reply is a JSON array in the same order. A
+        batch whose reply cannot be parsed falls back to
+        categorize_transaction per entry.
+        
+        Args:
+            user_id: User ID
+            transactions: Dicts with merchant_name, amount and optional description
+        
+        Returns:
+            Categorization dicts in the same order as transactions
+        """
+        results = [
+            self._get_cached_categorization(user_id, tx.get("merchant_name"))
+            for tx in transactions
+        ]
+        misses = [i for i, result in enumerate(results) if result is None]
+        
+        for start in range(0, len(misses), self.CATEGORIZATION_BATCH_SIZE):
+            indices = misses[start:start + self.CATEGORIZATION_BATCH_SIZE]
+            batch = [transactions[i] for i in indices]
+            for i, result in zip(indices, await self._categorize_batch(user_id, batch)):
+                results[i] = result
+        return results
+    
+    async def _categorize_batch(self, user_id: str, batch: List[Dict]) -> List[Dict]:
+        """Categorize one batch of transactions with a single request"""
+        entries = "\n".join(
+            f"{i}) Merchant: {tx.get('merchant_name')} | "
+            f"Amount: ${float(tx.get('amount', 0)):.2f} | "
+            f"Description: {tx.get('description') or 'N/A'}"
+            for i, tx in enumerate(batch, 1)
+        )
+        
+        prompt = f"""Categorize the following {len(batch)} transactions:
+
+{entries}
+
+For each transaction suggest a category (e.g., Food & Dining, Shopping, Transport, etc.), a confidence level (0-100%) and brief reasoning.
+
+Respond with a JSON array of {len(batch)} objects in the same order:
+[
+    {{"category": "category name", "confidence": 95, "reasoning": "brief explanation"}}
+]"""
+        
+        await self._add_to_history(user_id, "user", prompt)
+        messages = await self._get_chat_history(user_id)
+        
+        response = await self._make_request(messages, model="deepseek-chat")
+        
+        if response:
+            try:
+                results = self._extract_json(response)
+                if isinstance(results, list) and len(results) == len(batch):
+                    # One compact history entry for the whole batch
+                    await self._add_to_history(user_id, "assistant", "\n".join(
+                        f"{tx.get('merchant_name')} -> {result.get('category')}"
+                        for tx, result in zip(batch, results)
+                    ))
+                    for tx, result in zip(batch, results):
+                        self._cache_categorization(user_id, tx.get("merchant_name"), result)
+                    return results
+                logger.error(f"AI batch categorization returned {len(results)} results for {len(batch)} transactions")
+            except Exception as e:
+                logger.error(f"Failed to parse AI batch categorization response: {e}")
+        
+        # Fall back to one request per transaction
+        return [
+            await self.categorize_transaction(
+                user_id=user_id,
+                merchant_name=tx.get("merchant_name"),
+                amount=float(tx.get("amount", 0)),
+                description=tx.get("description")
+            )
+            for tx in batch
+        ]
+    
+    @staticmethod
+    def _merchant_key(merchant_name: Optional[str]) -> str:
+        """Normalize a merchant name for cache lookups ("UBER *Trip" -> "ubertrip")"""
+        return re.sub(r"[^a-z0-9]", "", (merchant_name or "").lower())
+    
+    def _get_cached_categorization(self, user_id: str, merchant_name: Optional[str]) -> Optional[Dict]:
+        """Get a confident cached categorization for a merchant, if any"""
+        key = self._merchant_key(merchant_name)
+        if not key:
+            return None
+        
+        cached = self._categorization_cache.get((user_id, key))
+        if cached is None or cached["confidence"] < self.CATEGORIZATION_CACHE_MIN_CONFIDENCE:
+            return None
+        return dict(cached)
+    
+    def _cache_categorization(self, user_id: str, merchant_name: Optional[str], result) -> None:
+        """Remember a categorization for a merchant"""
+        key = self._merchant_key(merchant_name)
+        if not key or not isinstance(result, dict) or not result.get("category"):
+            return
+        
+        try:
+            confidence = float(result.get("confidence", 0))
+        except (TypeError, ValueError):
+            return
+        self._categorization_cache[(user_id, key)] = {**result, "confidence": confidence}
+    
+    @staticmethod
+    def _extract_json(response: str):
+        """Parse JSON from an AI response (handles markdown code blocks)"""
+        json_str = response
+        if "```json" in response:
+            json_str = response.split("```json")[1].split("```")[0].strip()
+        elif "```" in response:
+            json_str = response.split("```")[1].split("```")[0].strip()
+        
+        return json.loads(json_str)
+    
+    async def learn_merchant(self, user_id: str, merchant_name: str, category: str):
         """Teach AI about merchant-category mapping"""
-        self.initialize_user_chat(user_id)
+        # A user-confirmed mapping answers future categorizations directly
+        self._cache_categorization(user_id, merchant_name, {
+            "category": category,
+            "confidence": self.LEARNED_MERCHANT_CONFIDENCE,
+            "reasoning": "Learned merchant mapping"
+        })
         
         prompt = f"""Learn this merchant mapping:
 Merchant: {merchant_name}
@@ -280,21 +539,20 @@ Category: {category}
 
 Remember this for future categorization of similar transactions."""
         
-        self._add_to_history(user_id, "user", prompt)
-        messages = self._get_chat_history(user_id)
+        await self._add_to_history(user_id, "user", prompt)
+        messages = await self._get_chat_history(user_id)
         
-        response = self._make_request(messages, model="deepseek-chat")
+        response = await self._make_request(messages, model="deepseek-chat")
         
         if response:
-            self._add_to_history(user_id, "assistant", response)
+            await self._add_to_history(user_id, "assistant", response)
             logger.info(f"AI learned merchant mapping: {merchant_name} -> {category}")
     
-    def clear_history(self, user_id: str):
+    async def clear_history(self, user_id: str):
         """Clear chat history for user (start fresh)"""
-        if user_id in self.chat_histories:
-            del self.chat_histories[user_id]
-            logger.info(f"Cleared chat history for user {user_id}")
+        await self.history_store.clear(user_id)
+        logger.info(f"Cleared chat history for user {user_id}")
     
-    def get_history_size(self, user_id: str) -> int:
+    async def get_history_size(self, user_id: str) -> int:
         """Get number of messages in chat history"""
-        return len(self._get_chat_history(user_id))
+        return 1 + len(await self.history_store.get(user_id))
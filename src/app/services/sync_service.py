@@ -47,7 +47,7 @@ class SyncService:
         logger.info(f"Starting wallet sync: {wallet_id} ({wallet_address})")
         
         # Get transactions from blockchain
-        transactions = self.blockchain.get_wallet_transactions(
+        transactions = await self.blockchain.get_wallet_transactions(
             address=wallet_address,
             from_timestamp=last_sync_timestamp
         )
@@ -217,7 +217,7 @@ class SyncService:
                 ai_result = {"category": "Uncategorized", "confidence": 0}
         else:
             # Sync AI (old way)
-            ai_result = self.ai.categorize_transaction(
+            ai_result = await self.ai.categorize_transaction(
                 user_id=user_id,
                 merchant_name=merchant_name,
                 amount=amount,
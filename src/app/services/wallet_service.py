@@ -162,6 +162,16 @@ class WalletService:
             logger.error(f"Error updating wallet balance: {e}", exc_info=True)
             return False
     
+    def update_wallet_status(self, wallet_id: str, is_active: bool) -> bool:
+        """Enable or disable wallet auto-monitoring"""
+        try:
+            updated = self.supabase.update_wallet(wallet_id, {'is_active': is_active})
+            logger.info(f"Wallet {wallet_id} monitoring set to {is_active}")
+            return bool(updated)
+        except Exception as e:
+            logger.error(f"Error updating wallet status: {e}", exc_info=True)
+            return False
+    
     async def delete_wallet(self, wallet_id: str):
         """Delete wallet"""
         try:
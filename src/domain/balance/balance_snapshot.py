@@ -4,11 +4,20 @@ Balance Snapshot Domain Entity.
 Представляет snapshot баланса кошелька в конкретный момент времени.
 """
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
 from typing import Optional
 from decimal import Decimal
 
+# Балансы в горячих вычислениях храним как int в micro-units
+# (6 знаков, как у USDC/USDT), Decimal нужен только на границах API
+MICRO_UNITS = 10 ** 6
+
+
+def to_micro(amount: Decimal) -> int:
+    """Конвертирует Decimal сумму в int micro-units."""
+    return int((amount * MICRO_UNITS).to_integral_value())
+
 
 @dataclass
 class BalanceSnapshot:
@@ -36,11 +45,16 @@ class BalanceSnapshot:
     previous_balance: Optional[Decimal] = None
     delta: Optional[Decimal] = None
     
+    # Balance в micro-units для целочисленной арифметики
+    balance_micro: int = field(init=False, repr=False, compare=False)
+    
     def __post_init__(self):
         """Validate and calculate fields."""
         if self.balance < 0:
             raise ValueError(f"Balance cannot be negative: {self.balance}")
         
+        self.balance_micro = to_micro(self.balance)
+        
         # Calculate delta if previous_balance is set
         if self.previous_balance is not None:
             self.delta = self.balance - self.previous_balance
@@ -122,8 +136,15 @@ class BalanceDelta:
     # Confidence
     confidence: float  # 0.0 - 1.0
     
+    # Delta в micro-units
+    amount_micro: int = field(init=False, repr=False, compare=False)
+    
+    # Кэш to_dict_cached()
+    _dict_cache: Optional[dict] = field(default=None, init=False, repr=False, compare=False)
+    
     def __post_init__(self):
         """Calculate delta and confidence."""
+        self.amount_micro = self.to_snapshot.balance_micro - self.from_snapshot.balance_micro
         self.amount = self.to_snapshot.balance - self.from_snapshot.balance
         
         # Calculate time difference
@@ -164,3 +185,14 @@ class BalanceDelta:
             "time_diff": self.time_diff,
             "confidence": self.confidence,
         }
+    
+    def to_dict_cached(self) -> dict:
+        """
+        to_dict(), построенный один раз на delta.
+        
+        Delta участвует в нескольких проверках patterns; dict общий,
+        его нельзя изменять.
+        """
+        if self._dict_cache is None:
+            self._dict_cache = self.to_dict()
+        return self._dict_cache
@@ -174,6 +174,8 @@ class RateLimitExceededError(ExternalAPIError):
         if retry_after:
             message += f". Retry after {retry_after} seconds"
         
+        self.retry_after = retry_after
+        
         super().__init__(
             message=message,
             code="RATE_LIMIT_EXCEEDED",
@@ -127,6 +127,12 @@ async def retry_async(
             
             if attempt < config.max_attempts - 1:
                 delay = config.calculate_delay(attempt)
+                
+                # Honor server-provided Retry-After (capped by max_delay)
+                retry_after = getattr(e, "retry_after", None)
+                if retry_after:
+                    delay = max(delay, min(retry_after, config.max_delay))
+                
                 logger.warning(
                     f"Attempt {attempt + 1}/{config.max_attempts} failed: {e}. "
                     f"Retrying in {delay:.2f}s..."
@@ -258,9 +264,11 @@ class CircuitBreaker:
             # Success - reset circuit
             if self.state == "HALF_OPEN":
                 self.state = "CLOSED"
-                self.failure_count = 0
                 logger.info("Circuit breaker reset to CLOSED state")
             
+            # Only consecutive failures open the circuit
+            self.failure_count = 0
+            
             return result
             
         except self.expected_exception as e:
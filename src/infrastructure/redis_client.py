@@ -0,0 +1,60 @@
+"""
+Shared Redis connection pool for Redis-backed services.
+"""
+import os
+from typing import Optional
+import redis.asyncio as redis
+from infrastructure.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+MAX_CONNECTIONS = 64
+HEALTH_CHECK_INTERVAL = 30  # seconds
+
+# Singleton pool (one per process, shared by all clients)
+_redis_pool: Optional[redis.ConnectionPool] = None
+
+
+def get_redis_url() -> str:
+    """Build Redis URL from REDIS_HOST / REDIS_PORT environment variables"""
+    redis_host = os.getenv("REDIS_HOST", "localhost")
+    redis_port = os.getenv("REDIS_PORT", "6379")
+    return f"redis://{redis_host}:{redis_port}"
+
+
+def get_redis_pool() -> redis.ConnectionPool:
+    """
+    Get the process-wide Redis connection pool.
+
+    Responses are raw bytes (decode_responses=False): payloads are parsed
+    by orjson straight from bytes, without an intermediate str copy.
+
+    Returns:
+        Shared ConnectionPool
+    """
+    global _redis_pool
+
+    if _redis_pool is None:
+        _redis_pool = redis.ConnectionPool.from_url(
+            get_redis_url(),
+            max_connections=MAX_CONNECTIONS,
+            health_check_interval=HEALTH_CHECK_INTERVAL,
+            socket_keepalive=True,
+            decode_responses=False
+        )
+        logger.info(f"Created shared Redis pool (max {MAX_CONNECTIONS} connections)")
+
+    return _redis_pool
+
+
+def get_redis_client() -> redis.Redis:
+    """
+    Get a Redis client on the shared pool.
+
+    Clients are cheap; connections live in the pool, so every service
+    can take its own client without opening a pool of its own.
+
+    Returns:
+        Redis client
+    """
+    return redis.Redis(connection_pool=get_redis_pool())
@@ -2,9 +2,10 @@
 Balance Snapshot Repository.
 """
 
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime, timedelta
 from decimal import Decimal
+from itertools import groupby
 import logging
 
 from .base import BaseRepository
@@ -12,12 +13,19 @@ from src.domain.balance.balance_snapshot import BalanceSnapshot, BalanceDelta
 
 logger = logging.getLogger(__name__)
 
+# Columns read by _row_to_snapshot; all of them are in the covering index
+# idx_balance_snapshots_unique, so timerange reads are index-only scans
+SNAPSHOT_COLUMNS = "id, wallet_id, currency, balance, timestamp, source, block_number, chain_id"
+
 
 class BalanceSnapshotRepository(BaseRepository):
     """
     Repository для balance_snapshots таблицы.
     """
     
+    # Rows per multi-row INSERT (8 params each, well under asyncpg's 32767 limit)
+    BULK_INSERT_BATCH_SIZE = 1000
+    
     def __init__(self, db):
         super().__init__(db)
         self.table_name = "balance_snapshots"
@@ -64,6 +72,62 @@ class BalanceSnapshotRepository(BaseRepository):
             logger.error(f"Failed to create balance snapshot: {e}")
             return None
     
+    async def create_many(self, snapshots: List[BalanceSnapshot]) -> List[Optional[str]]:
+        """
+        Создает несколько balance snapshots одним multi-row INSERT.
+        
+        Args:
+            snapshots: List of BalanceSnapshot instances
+        
+        Returns:
+            IDs созданных snapshots (в том же порядке)
+        """
+        if not snapshots:
+            return []
+        
+        ids: List[Optional[str]] = []
+        
+        try:
+            for start in range(0, len(snapshots), self.BULK_INSERT_BATCH_SIZE):
+                batch = snapshots[start:start + self.BULK_INSERT_BATCH_SIZE]
+                
+                placeholders = []
+                params = []
+                for i, snapshot in enumerate(batch):
+                    base = i * 8
+                    placeholders.append(
+                        "(" + ", ".join(f"${base + j}" for j in range(1, 9)) + ")"
+                    )
+                    params.extend([
+                        snapshot.wallet_id,
+                        None,  # user_id будет получен через JOIN с wallets
+                        snapshot.currency,
+                        snapshot.balance,
+                        snapshot.timestamp,
+                        snapshot.source,
+                        snapshot.block_number,
+                        snapshot.chain_id
+                    ])
+                
+                query = f"""
+                    INSERT INTO balance_snapshots (
+                        wallet_id, user_id, currency, balance,
+                        timestamp, source, block_number, chain_id
+                    )
+                    VALUES {", ".join(placeholders)}
+                    RETURNING id
+                """
+                
+                results = await self.db.fetch(query, *params)
+                ids.extend(row["id"] for row in results)
+            
+            logger.debug(f"Created {len(ids)} balance snapshots")
+            return ids
+            
+        except Exception as e:
+            logger.error(f"Failed to create balance snapshots: {e}")
+            return ids
+    
     async def get_latest(
         self,
         wallet_id: str,
@@ -80,8 +144,8 @@ class BalanceSnapshotRepository(BaseRepository):
             BalanceSnapshot или None
         """
         try:
-            query = """
-                SELECT * FROM balance_snapshots
+            query = f"""
+                SELECT {SNAPSHOT_COLUMNS} FROM balance_snapshots
                 WHERE wallet_id = $1 AND currency = $2
                 ORDER BY timestamp DESC
                 LIMIT 1
@@ -98,6 +162,51 @@ class BalanceSnapshotRepository(BaseRepository):
             logger.error(f"Failed to get latest snapshot: {e}")
             return None
     
+    async def get_latest_bulk(
+        self,
+        pairs: List[Tuple[str, str]],
+        before: Optional[datetime] = None
+    ) -> Dict[Tuple[str, str], BalanceSnapshot]:
+        """
+        Получает latest snapshot для нескольких (wallet_id, currency) одним запросом.
+        
+        Args:
+            pairs: List of (wallet_id, currency)
+            before: Только snapshots строго раньше этого времени (по умолчанию - все)
+        
+        Returns:
+            Dict (wallet_id, currency) -> BalanceSnapshot (пары без snapshots отсутствуют)
+        """
+        if not pairs:
+            return {}
+        
+        try:
+            wallet_ids = [wallet_id for wallet_id, _ in pairs]
+            currencies = [currency for _, currency in pairs]
+            
+            query = f"""
+                SELECT DISTINCT ON (wallet_id, currency) {SNAPSHOT_COLUMNS}
+                FROM balance_snapshots
+                WHERE timestamp < $3
+                  AND (wallet_id, currency) IN (
+                    SELECT * FROM unnest($1::uuid[], $2::varchar[])
+                  )
+                ORDER BY wallet_id, currency, timestamp DESC
+            """
+            
+            results = await self.db.fetch(
+                query, wallet_ids, currencies, before or datetime.utcnow()
+            )
+            
+            return {
+                (str(row["wallet_id"]), row["currency"]): self._row_to_snapshot(row)
+                for row in results
+            }
+            
+        except Exception as e:
+            logger.error(f"Failed to get latest snapshots (bulk): {e}")
+            return {}
+    
     async def get_by_timerange(
         self,
         wallet_id: str,
@@ -118,10 +227,10 @@ class BalanceSnapshotRepository(BaseRepository):
             List of BalanceSnapshot
         """
         try:
-            query = """
-                SELECT * FROM balance_snapshots
-                WHERE wallet_id = $1 AND currency = $2
-                  AND timestamp BETWEEN $3 AND $4
+            query = f"""
+                SELECT {SNAPSHOT_COLUMNS} FROM balance_snapshots
+                WHERE timestamp BETWEEN $3 AND $4
+                  AND wallet_id = $1 AND currency = $2
                 ORDER BY timestamp ASC
             """
             
@@ -133,6 +242,52 @@ class BalanceSnapshotRepository(BaseRepository):
             logger.error(f"Failed to get snapshots by timerange: {e}")
             return []
     
+    async def get_by_timerange_bulk(
+        self,
+        pairs: List[Tuple[str, str]],
+        from_time: datetime,
+        to_time: datetime
+    ) -> Dict[Tuple[str, str], List[BalanceSnapshot]]:
+        """
+        Получает snapshots для нескольких (wallet_id, currency) одним запросом.
+        
+        Args:
+            pairs: List of (wallet_id, currency)
+            from_time: Начало диапазона
+            to_time: Конец диапазона
+        
+        Returns:
+            Dict (wallet_id, currency) -> List of BalanceSnapshot (по времени)
+        """
+        if not pairs:
+            return {}
+        
+        try:
+            wallet_ids = [wallet_id for wallet_id, _ in pairs]
+            currencies = [currency for _, currency in pairs]
+            
+            query = f"""
+                SELECT {SNAPSHOT_COLUMNS} FROM balance_snapshots
+                WHERE timestamp BETWEEN $3 AND $4
+                  AND (wallet_id, currency) IN (
+                    SELECT * FROM unnest($1::uuid[], $2::varchar[])
+                  )
+                ORDER BY wallet_id, currency, timestamp ASC
+            """
+            
+            results = await self.db.fetch(query, wallet_ids, currencies, from_time, to_time)
+            
+            return {
+                key: [self._row_to_snapshot(row) for row in rows]
+                for key, rows in groupby(
+                    results, key=lambda row: (str(row["wallet_id"]), row["currency"])
+                )
+            }
+            
+        except Exception as e:
+            logger.error(f"Failed to get snapshots by timerange (bulk): {e}")
+            return {}
+    
     async def get_delta(
         self,
         wallet_id: str,
@@ -192,8 +347,8 @@ class BalanceSnapshotRepository(BaseRepository):
             BalanceSnapshot или None
         """
         try:
-            query = """
-                SELECT * FROM balance_snapshots
+            query = f"""
+                SELECT {SNAPSHOT_COLUMNS} FROM balance_snapshots
                 WHERE wallet_id = $1 AND currency = $2
                   AND timestamp <= $3
                 ORDER BY timestamp DESC
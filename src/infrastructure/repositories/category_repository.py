@@ -19,19 +19,21 @@ class CategoryRepository(BaseRepository):
         super().__init__(db_path)
         self.supabase = SupabaseClient()
     
-    def get_user_categories(self, user_id: str, type: Optional[CategoryType] = None) -> List[Category]:
-        """Get all categories for a user from Supabase"""
+    def get_user_categories(self, user_id: str, type: Optional[CategoryType] = None,
+                            limit: Optional[int] = None) -> List[Category]:
+        """Get categories for a user from Supabase (at most limit, if given)"""
         try:
             logger.info(f"Fetching categories from Supabase for user {user_id}")
-            categories_data = self.supabase.get_user_categories(user_id)
+            # Type filter and limit are applied by Supabase, not after the fetch
+            categories_data = self.supabase.get_user_categories(
+                user_id,
+                category_type=type.value if type else None,
+                limit=limit
+            )
             logger.info(f"Found {len(categories_data)} categories in Supabase")
             
             categories = []
             for data in categories_data:
-                # Filter by type if specified
-                if type and data['type'] != type.value:
-                    continue
-                    
                 category = Category(
                     id=data['id'],
                     user_id=data['user_id'],
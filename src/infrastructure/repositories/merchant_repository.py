@@ -130,6 +130,39 @@ class MerchantRepository:
             'usage_count': 1
         }
     
+    def upsert_mapping(
+        self,
+        user_id: str,
+        merchant_name: str,
+        category_id: str,
+        confidence: int = 100
+    ):
+        """Create or update merchant mapping in a single statement"""
+        normalized = self._normalize_merchant_name(merchant_name)
+        
+        # Relies on UNIQUE(user_id, normalized_name); atomic, no lookup first
+        query = """
+        INSERT INTO merchant_mappings 
+        (id, user_id, merchant_name, normalized_name, category_id, confidence, usage_count)
+        VALUES (?, ?, ?, ?, ?, ?, 1)
+        ON CONFLICT(user_id, normalized_name) DO UPDATE SET
+            category_id = excluded.category_id,
+            confidence = excluded.confidence,
+            usage_count = usage_count + 1,
+            updated_at = CURRENT_TIMESTAMP
+        """
+        
+        self.db.execute(query, (
+            str(uuid.uuid4()),
+            user_id,
+            merchant_name,
+            normalized,
+            category_id,
+            confidence
+        ))
+        
+        logger.info(f"Upserted merchant mapping: {merchant_name} -> {category_id}")
+    
     def update_mapping(
         self,
         mapping_id: str,
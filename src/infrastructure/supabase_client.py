@@ -41,12 +41,17 @@ class SupabaseClient:
             logger.error(f"Supabase request error: {e}")
             return None
     
-    def select(self, table: str, columns: str = "*", filters: dict = None) -> List[Dict]:
-        """Select data from table"""
+    def select(self, table: str, columns: str = "*", filters: dict = None,
+               order: str = None, limit: int = None) -> List[Dict]:
+        """Select data from table (order/limit are applied server-side)"""
         params = {"select": columns}
         if filters:
             for key, value in filters.items():
                 params[key] = f"eq.{value}"
+        if order:
+            params["order"] = order
+        if limit is not None:
+            params["limit"] = limit
         
         result = self._request("GET", table, params=params)
         return result if result else []
@@ -103,9 +108,15 @@ class SupabaseClient:
         return user
     
     # Category operations
-    def get_user_categories(self, user_id: str) -> List[Dict]:
-        """Get user categories"""
-        return self.select("categories", filters={"user_id": user_id})
+    def get_user_categories(self, user_id: str, category_type: str = None,
+                            limit: int = None) -> List[Dict]:
+        """Get user categories (oldest first when limited)"""
+        filters = {"user_id": user_id}
+        if category_type:
+            filters["type"] = category_type
+        if limit is None:
+            return self.select("categories", filters=filters)
+        return self.select("categories", filters=filters, order="created_at.asc", limit=limit)
     
     def get_category_by_id(self, category_id: str) -> Optional[Dict]:
         """Get category by ID"""
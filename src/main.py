@@ -241,6 +241,8 @@ async def main():
         logger.error(f"Bot error: {e}", exc_info=True)
     finally:
         logger.info("Shutting down...")
+        await blockchain_service.close()
+        await deepseek_service.close()
         await bot.session.close()
         logger.info("Bot stopped")
 
@@ -151,13 +151,8 @@ class DeepSeekWorker:
         # 2. Get prompt from PromptLibrary
         prompt_messages = self.prompt_library.get_categorization_prompt(context)
         
-        # 3. Call DeepSeek (sync, will be run in executor)
-        loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(
-            None,
-            self.deepseek_service._make_request,
-            prompt_messages
-        )
+        # 3. Call DeepSeek
+        response = await self.deepseek_service._make_request(prompt_messages)
         
         if not response:
             return {
@@ -189,6 +184,8 @@ class DeepSeekWorker:
                             "merchant_name": mapping.get("merchant_name"),
                             "category": mapping.get("suggested_category")
                         })
+                        # Next prompt must see the new mapping, not the cached list
+                        self.context_manager.invalidate(user_id)
                         logger.info(f"✅ Saved new merchant mapping: {mapping.get('merchant_name')} → {mapping.get('suggested_category')}")
                     except Exception as e:
                         logger.error(f"Failed to save merchant mapping: {e}")
@@ -241,12 +238,7 @@ class DeepSeekWorker:
         prompt_messages = self.prompt_library.get_analyze_spending_prompt(context)
         
         # 3. Call DeepSeek
-        loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(
-            None,
-            self.deepseek_service._make_request,
-            prompt_messages
-        )
+        response = await self.deepseek_service._make_request(prompt_messages)
         
         return {
             "analysis": response or "Analysis unavailable",
@@ -278,12 +270,7 @@ class DeepSeekWorker:
         prompt_messages = self.prompt_library.get_budget_recommendation_prompt(context)
         
         # 3. Call DeepSeek
-        loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(
-            None,
-            self.deepseek_service._make_request,
-            prompt_messages
-        )
+        response = await self.deepseek_service._make_request(prompt_messages)
         
         # 4. Parse response
         try:
@@ -325,8 +312,8 @@ class DeepSeekWorker:
                 task_data = await self.task_queue.dequeue_task()
                 
                 if task_data is None:
-                    # No tasks available, wait a bit
-                    await asyncio.sleep(1)
+                    # dequeue_task already blocked server-side waiting for a
+                    # task, so poll again right away
                     continue
                 
                 task_id = task_data.get("task_id")
@@ -369,6 +356,7 @@ class DeepSeekWorker:
         logger.info("🛑 Shutting down worker...")
         self.running = False
         await self.task_queue.disconnect()
+        await self.deepseek_service.close()
         logger.info("✅ Worker shutdown complete")
 
 
@@ -0,0 +1,408 @@
+"""
+Unit tests for BalanceMonitor service.
+"""
+
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from src.app.services.balance_detection.balance_monitor import BalanceMonitor
+from src.domain.balance.balance_snapshot import BalanceSnapshot
+
+
+@pytest.fixture
+def balance_repo():
+    """Mock BalanceSnapshotRepository."""
+    repo = MagicMock()
+    repo.create = AsyncMock(return_value="snap-1")
+    repo.create_many = AsyncMock(
+        side_effect=lambda snapshots: [f"snap-{i}" for i in range(len(snapshots))]
+    )
+    repo.get_by_timerange = AsyncMock(return_value=[])
+    repo.get_by_timerange_bulk = AsyncMock(return_value={})
+    repo.get_latest_bulk = AsyncMock(return_value={})
+    return repo
+
+
+@pytest.fixture
+def wallet_repo():
+    """Mock WalletRepository with two active wallets."""
+    repo = MagicMock()
+    repo.get_all_active = AsyncMock(return_value=[
+        {"id": "wallet-1", "currency": "USDC"},
+        {"id": "wallet-2", "currency": "USDT"},
+    ])
+    repo.get_by_id = AsyncMock(
+        side_effect=lambda wallet_id: {"id": wallet_id, "currency": "USDC"}
+    )
+    return repo
+
+
+@pytest.fixture
+def blockchain_service():
+    """Mock blockchain service returning a fixed balance."""
+    service = MagicMock()
+    service.get_balance = AsyncMock(return_value=612.5)
+    return service
+
+
+@pytest.fixture
+def monitor(balance_repo, wallet_repo, blockchain_service):
+    """Create BalanceMonitor with mocked dependencies."""
+    return BalanceMonitor(balance_repo, wallet_repo, blockchain_service)
+
+
+@pytest.mark.unit
+@pytest.mark.balance_detection
+class TestBalanceMonitor:
+    """Tests for BalanceMonitor."""
+
+    @pytest.mark.asyncio
+    async def test_capture_snapshot(self, monitor, balance_repo):
+        """Test capturing a single snapshot."""
+        snapshot = await monitor.capture_snapshot("wallet-1", "USDC")
+
+        assert snapshot.id == "snap-1"
+        assert snapshot.balance == Decimal("612.5")
+        balance_repo.create.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_capture_all_snapshots_bulk_inserts(self, monitor, balance_repo):
+        """Test that all snapshots are saved with a single bulk insert."""
+        stats = await monitor.capture_all_snapshots()
+
+        assert stats == {"success": 2, "failed": 0}
+        balance_repo.create_many.assert_awaited_once()
+        balance_repo.create.assert_not_called()
+
+        snapshots = balance_repo.create_many.await_args.args[0]
+        assert [s.wallet_id for s in snapshots] == ["wallet-1", "wallet-2"]
+
+    @pytest.mark.asyncio
+    async def test_capture_all_snapshots_counts_missing_balances(
+        self, monitor, balance_repo, blockchain_service
+    ):
+        """Test that wallets without a balance are counted as failed."""
+        blockchain_service.get_balance.side_effect = (
+            lambda wallet_id, currency: None if wallet_id == "wallet-2" else 100
+        )
+
+        stats = await monitor.capture_all_snapshots()
+
+        assert stats == {"success": 1, "failed": 1}
+        assert len(balance_repo.create_many.await_args.args[0]) == 1
+
+    @pytest.mark.asyncio
+    async def test_capture_all_snapshots_bounds_concurrency(
+        self, monitor, wallet_repo, blockchain_service
+    ):
+        """Test that concurrent blockchain fetches are capped."""
+        wallet_repo.get_all_active.return_value = [
+            {"id": f"wallet-{i}", "currency": "USDC"} for i in range(10)
+        ]
+        monitor.max_concurrent_fetches = 3
+        in_flight = 0
+        peak = 0
+
+        async def slow_balance(wallet_id, currency):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return 1
+
+        blockchain_service.get_balance.side_effect = slow_balance
+
+        stats = await monitor.capture_all_snapshots()
+
+        assert stats["success"] == 10
+        assert peak == 3
+
+    @pytest.mark.asyncio
+    async def test_wallet_currencies_use_active_wallet_rows(self, monitor, wallet_repo):
+        """Test that currencies come from get_all_active rows without extra lookups."""
+        await monitor.capture_all_snapshots()
+        await monitor.detect_all_changes()
+
+        wallet_repo.get_by_id.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_wallet_currencies_fall_back_to_lookup(self, monitor, wallet_repo):
+        """Test the per-wallet lookup when a row has no currency column."""
+        currencies = await monitor._get_wallet_currencies({"id": "wallet-1"})
+
+        assert currencies == ["USDC"]
+        wallet_repo.get_by_id.assert_awaited_once_with("wallet-1")
+
+    @pytest.mark.asyncio
+    async def test_detect_changes_filters_insignificant(self, monitor, balance_repo):
+        """Test that only changes above the threshold become deltas."""
+        base = datetime(2025, 11, 30, 12, 0, 0)
+        balances = ["612.50", "612.51", "612.515", "505.00", "505.00"]
+        balance_repo.get_by_timerange.return_value = [
+            BalanceSnapshot(
+                id=f"snap-{i}",
+                wallet_id="wallet-1",
+                currency="USDC",
+                balance=Decimal(balance),
+                timestamp=base + timedelta(minutes=15 * i),
+                source="blockchain"
+            )
+            for i, balance in enumerate(balances)
+        ]
+
+        deltas = await monitor.detect_changes("wallet-1", "USDC")
+
+        # 612.50 -> 612.51 is exactly at the threshold (10000 micro-units)
+        assert [delta.amount for delta in deltas] == [Decimal("0.01"), Decimal("-107.515")]
+
+    @pytest.mark.asyncio
+    async def test_detect_all_changes_uses_bulk_fetch(self, monitor, balance_repo):
+        """Test that all wallets are fetched with one bulk query."""
+        base = datetime(2025, 11, 30, 12, 0, 0)
+        balance_repo.get_by_timerange_bulk.return_value = {
+            ("wallet-1", "USDC"): [
+                BalanceSnapshot(
+                    id=f"snap-{i}",
+                    wallet_id="wallet-1",
+                    currency="USDC",
+                    balance=Decimal(balance),
+                    timestamp=base + timedelta(minutes=30 * i),
+                    source="blockchain"
+                )
+                for i, balance in enumerate(["612.00", "505.00"])
+            ]
+        }
+
+        deltas = await monitor.detect_all_changes(hours=1)
+
+        assert [delta.amount for delta in deltas] == [Decimal("-107.00")]
+        balance_repo.get_by_timerange_bulk.assert_awaited_once()
+        balance_repo.get_by_timerange.assert_not_called()
+        pairs = balance_repo.get_by_timerange_bulk.await_args.args[0]
+        assert pairs == [("wallet-1", "USDC"), ("wallet-2", "USDT")]
+
+    @pytest.mark.asyncio
+    async def test_start_monitoring_corrects_drift(self, monitor):
+        """Test that the sleep is shortened by the time the cycle took."""
+        clock = iter([1000.0, 1010.0])
+        sleeps = []
+
+        async def fake_sleep(delay):
+            sleeps.append(delay)
+            raise asyncio.CancelledError
+
+        monitor.capture_all_snapshots = AsyncMock(return_value={"success": 0, "failed": 0})
+        monitor.detect_all_changes = AsyncMock(return_value=[])
+
+        with patch("src.app.services.balance_detection.balance_monitor.time.monotonic",
+                   side_effect=lambda: next(clock)), \
+             patch("src.app.services.balance_detection.balance_monitor.asyncio.sleep",
+                   side_effect=fake_sleep):
+            with pytest.raises(asyncio.CancelledError):
+                await monitor.start_monitoring()
+
+        assert sleeps == [monitor.snapshot_interval - 10.0]
+
+    @pytest.mark.asyncio
+    async def test_capture_all_snapshots_computes_incremental_deltas(
+        self, monitor, balance_repo, blockchain_service
+    ):
+        """Test that each cycle diffs against the cached last snapshot."""
+        await monitor.capture_all_snapshots()
+        assert monitor.detect_incremental_changes() == []
+
+        blockchain_service.get_balance.side_effect = (
+            lambda wallet_id, currency: 505 if wallet_id == "wallet-1" else 612.5
+        )
+        await monitor.capture_all_snapshots()
+
+        deltas = monitor.detect_incremental_changes()
+        assert [(d.wallet_id, d.amount) for d in deltas] == [("wallet-1", Decimal("-107.5"))]
+        assert monitor._last_snapshot[("wallet-1", "USDC")].balance == Decimal("505")
+        balance_repo.get_by_timerange.assert_not_called()
+        balance_repo.get_by_timerange_bulk.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_incremental_changes_not_repeated_after_failed_cycle(
+        self, monitor, wallet_repo, blockchain_service
+    ):
+        """Test that a cycle failing after capture does not report old deltas again."""
+        await monitor.capture_all_snapshots()
+        blockchain_service.get_balance.return_value = 505
+        await monitor.capture_all_snapshots()
+        assert len(monitor.detect_incremental_changes()) == 2
+
+        wallet_repo.get_all_active.side_effect = RuntimeError("db down")
+        await monitor.capture_all_snapshots()
+
+        assert monitor.detect_incremental_changes() == []
+
+    @pytest.mark.asyncio
+    async def test_capture_snapshot_reports_delta(self, monitor, blockchain_service):
+        """Test that a single-wallet capture yields its change to the next cycle."""
+        await monitor.capture_snapshot("wallet-1", "USDC")
+        blockchain_service.get_balance.return_value = 505
+
+        await monitor.capture_snapshot("wallet-1", "USDC")
+
+        deltas = monitor.detect_incremental_changes()
+        assert [(d.wallet_id, d.amount) for d in deltas] == [("wallet-1", Decimal("-107.5"))]
+
+    @pytest.mark.asyncio
+    async def test_start_monitoring_never_reads_window(self, monitor):
+        """Test that every cycle, including the first, uses the cached deltas."""
+        sleeps = []
+
+        async def fake_sleep(delay):
+            sleeps.append(delay)
+            if len(sleeps) == 2:
+                raise asyncio.CancelledError
+
+        monitor.detect_all_changes = AsyncMock(return_value=[])
+
+        with patch("src.app.services.balance_detection.balance_monitor.asyncio.sleep",
+                   side_effect=fake_sleep):
+            with pytest.raises(asyncio.CancelledError):
+                await monitor.start_monitoring()
+
+        monitor.detect_all_changes.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_cold_start_diffs_against_latest_stored_snapshot(
+        self, monitor, balance_repo, blockchain_service
+    ):
+        """Test that after a restart the first cycle diffs against old DB rows."""
+        balance_repo.get_latest_bulk.return_value = {
+            ("wallet-1", "USDC"): BalanceSnapshot(
+                id="snap-old",
+                wallet_id="wallet-1",
+                currency="USDC",
+                balance=Decimal("612.5"),
+                timestamp=datetime.utcnow() - timedelta(days=3),
+                source="blockchain"
+            )
+        }
+        blockchain_service.get_balance.return_value = 505
+
+        await monitor.capture_all_snapshots()
+
+        deltas = monitor.detect_incremental_changes()
+        assert [(d.wallet_id, d.amount) for d in deltas] == [("wallet-1", Decimal("-107.5"))]
+        balance_repo.get_latest_bulk.assert_awaited_once_with(
+            [("wallet-1", "USDC"), ("wallet-2", "USDT")]
+        )
+
+        # Cached pairs are not looked up again
+        await monitor.capture_all_snapshots()
+        balance_repo.get_latest_bulk.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_detect_changes_includes_snapshot_before_window(self, monitor, balance_repo):
+        """Test that a change against a snapshot older than the window is detected."""
+        now = datetime.utcnow()
+        old = BalanceSnapshot(
+            id="snap-old", wallet_id="wallet-1", currency="USDC",
+            balance=Decimal("612.5"), timestamp=now - timedelta(days=2), source="blockchain"
+        )
+        new = BalanceSnapshot(
+            id="snap-new", wallet_id="wallet-1", currency="USDC",
+            balance=Decimal("505"), timestamp=now - timedelta(minutes=5), source="blockchain"
+        )
+        balance_repo.get_by_timerange.return_value = [new]
+        balance_repo.get_latest_bulk.return_value = {("wallet-1", "USDC"): old}
+
+        deltas = await monitor.detect_changes("wallet-1", "USDC", hours=1)
+
+        assert [delta.amount for delta in deltas] == [Decimal("-107.5")]
+        assert "before" in balance_repo.get_latest_bulk.await_args.kwargs
+
+    @pytest.mark.asyncio
+    async def test_capture_snapshot_skips_unchanged_balance(self, monitor, balance_repo):
+        """Test that an unchanged balance returns the cached snapshot without an INSERT."""
+        first = await monitor.capture_snapshot("wallet-1", "USDC")
+        second = await monitor.capture_snapshot("wallet-1", "USDC")
+
+        balance_repo.create.assert_awaited_once()
+        assert second.id == first.id
+        assert second.timestamp >= first.timestamp
+
+    @pytest.mark.asyncio
+    async def test_capture_all_snapshots_skips_unchanged_balances(
+        self, monitor, balance_repo, blockchain_service
+    ):
+        """Test that only changed balances are bulk inserted."""
+        await monitor.capture_all_snapshots()
+
+        blockchain_service.get_balance.side_effect = (
+            lambda wallet_id, currency: 505 if wallet_id == "wallet-1" else 612.5
+        )
+        stats = await monitor.capture_all_snapshots()
+
+        assert stats == {"success": 2, "failed": 0}
+        snapshots = balance_repo.create_many.await_args.args[0]
+        assert [s.wallet_id for s in snapshots] == ["wallet-1"]
+
+    @pytest.mark.asyncio
+    async def test_capture_hot_only_skips_dormant_wallets(
+        self, monitor, balance_repo, blockchain_service
+    ):
+        """Test that hot-only cycles capture just wallets with recent changes."""
+        await monitor.capture_all_snapshots()
+        blockchain_service.get_balance.side_effect = (
+            lambda wallet_id, currency: 505 if wallet_id == "wallet-1" else 612.5
+        )
+        await monitor.capture_all_snapshots()
+        monitor._mark_hot(monitor.detect_incremental_changes())
+        blockchain_service.get_balance.reset_mock()
+
+        await monitor.capture_all_snapshots(hot_only=True)
+
+        fetched = [call.args[0] for call in blockchain_service.get_balance.await_args_list]
+        assert fetched == ["wallet-1"]
+
+    @pytest.mark.asyncio
+    async def test_capture_hot_only_returns_early_without_hot_wallets(
+        self, monitor, balance_repo, blockchain_service
+    ):
+        """Test that a hot-only cycle with no hot wallets does no work."""
+        stats = await monitor.capture_all_snapshots(hot_only=True)
+
+        assert stats == {"success": 0, "failed": 0}
+        blockchain_service.get_balance.assert_not_called()
+        balance_repo.create_many.assert_not_called()
+
+    def test_hot_wallet_expires(self, monitor):
+        """Test that hotness lapses after hot_wallet_ttl."""
+        delta = MagicMock(wallet_id="wallet-1")
+        monitor.hot_wallet_ttl = -1
+
+        monitor._mark_hot([delta])
+
+        assert not monitor._is_hot("wallet-1")
+        assert "wallet-1" not in monitor._hot_until
+
+    @pytest.mark.asyncio
+    async def test_start_monitoring_alternates_full_and_hot_scans(self, monitor):
+        """Test that only every full_scan_every-th cycle captures all wallets."""
+        sleeps = []
+
+        async def fake_sleep(delay):
+            sleeps.append(delay)
+            if len(sleeps) == 4:
+                raise asyncio.CancelledError
+
+        monitor.full_scan_every = 2
+        monitor.capture_all_snapshots = AsyncMock(return_value={"success": 0, "failed": 0})
+        monitor.detect_all_changes = AsyncMock(return_value=[])
+
+        with patch("src.app.services.balance_detection.balance_monitor.asyncio.sleep",
+                   side_effect=fake_sleep):
+            with pytest.raises(asyncio.CancelledError):
+                await monitor.start_monitoring()
+
+        hot_only = [call.kwargs["hot_only"] for call in monitor.capture_all_snapshots.await_args_list]
+        assert hot_only == [False, True, False, True]
@@ -156,6 +156,21 @@ class TestBalanceSnapshot:
                 source="blockchain"
             )
 
+    
+    def test_balance_micro_units(self, sample_wallet_id, sample_timestamp):
+        """Test that balance is mirrored as int micro-units."""
+        snapshot = BalanceSnapshot(
+            id="snap-123",
+            wallet_id=sample_wallet_id,
+            currency="USDC",
+            balance=Decimal("612.515"),
+            timestamp=sample_timestamp,
+            source="blockchain"
+        )
+        
+        assert snapshot.balance_micro == 612515000
+        assert isinstance(snapshot.balance_micro, int)
+
 
 @pytest.mark.unit
 @pytest.mark.balance_detection
@@ -193,6 +208,7 @@ class TestBalanceDelta:
         )
         
         assert delta.amount == Decimal("-107.00")
+        assert delta.amount_micro == -107000000
         assert delta.time_diff == 3600.0  # 1 hour
         assert delta.confidence == 0.9  # High confidence for 1-hour window
     
@@ -294,6 +310,41 @@ class TestBalanceDelta:
         
         assert delta.abs_amount() == Decimal("107.00")
     
+    def test_to_dict_cached(self, sample_wallet_id):
+        """Test to_dict_cached builds the dict once."""
+        from_snapshot = BalanceSnapshot(
+            id="snap-1",
+            wallet_id=sample_wallet_id,
+            currency="USDC",
+            balance=Decimal("612.00"),
+            timestamp=datetime(2025, 11, 30, 12, 0, 0),
+            source="blockchain"
+        )
+        
+        to_snapshot = BalanceSnapshot(
+            id="snap-2",
+            wallet_id=sample_wallet_id,
+            currency="USDC",
+            balance=Decimal("505.00"),
+            timestamp=datetime(2025, 11, 30, 13, 0, 0),
+            source="blockchain"
+        )
+        
+        delta = BalanceDelta(
+            wallet_id=sample_wallet_id,
+            currency="USDC",
+            from_snapshot=from_snapshot,
+            to_snapshot=to_snapshot,
+            amount=Decimal(0),
+            time_diff=0.0,
+            confidence=0.0
+        )
+        
+        cached = delta.to_dict_cached()
+        
+        assert cached == delta.to_dict()
+        assert delta.to_dict_cached() is cached
+    
     def test_confidence_calculation(self, sample_wallet_id):
         """Test confidence calculation based on time diff."""
         # Test 1 hour window (high confidence)
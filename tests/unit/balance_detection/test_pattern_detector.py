@@ -0,0 +1,326 @@
+"""
+Unit tests for PatternDetector service.
+"""
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from src.app.services.balance_detection.pattern_detector import PatternDetector, _match_pairs
+from src.domain.balance.balance_snapshot import BalanceSnapshot, BalanceDelta
+
+
+BASE_TIME = datetime(2025, 11, 30, 12, 0, 0)
+
+
+def make_delta(wallet_id, currency, from_balance, to_balance, minutes=0):
+    """Build a BalanceDelta whose change lands at BASE_TIME + minutes."""
+    to_time = BASE_TIME + timedelta(minutes=minutes)
+
+    def snapshot(balance, timestamp):
+        return BalanceSnapshot(
+            id=None,
+            wallet_id=wallet_id,
+            currency=currency,
+            balance=Decimal(balance),
+            timestamp=timestamp,
+            source="blockchain"
+        )
+
+    return BalanceDelta(
+        wallet_id=wallet_id,
+        currency=currency,
+        from_snapshot=snapshot(from_balance, to_time - timedelta(hours=1)),
+        to_snapshot=snapshot(to_balance, to_time),
+        amount=Decimal(0),
+        time_diff=0.0,
+        confidence=0.0
+    )
+
+
+@pytest.fixture
+def transaction_repo():
+    """Mock TransactionRepository without blockchain transactions."""
+    repo = MagicMock()
+    repo.get_by_timerange = AsyncMock(return_value=[])
+    return repo
+
+
+@pytest.fixture
+def detector(transaction_repo):
+    """Create PatternDetector with mocked dependencies."""
+    return PatternDetector(transaction_repo)
+
+
+@pytest.mark.unit
+@pytest.mark.balance_detection
+class TestPatternDetector:
+    """Tests for PatternDetector."""
+
+    @pytest.mark.asyncio
+    async def test_detects_transfer_in_either_order(self, detector):
+        """Test that a transfer is found whichever delta comes first."""
+        income = make_delta("wallet-b", "USDT", "0", "99", minutes=5)
+        expense = make_delta("wallet-a", "USDT", "100", "0", minutes=0)
+
+        patterns = await detector.detect_all_patterns([income, expense], "user-1")
+
+        assert len(patterns["transfers"]) == 1
+        transfer = patterns["transfers"][0]
+        assert transfer["from_wallet_id"] == "wallet-a"
+        assert transfer["to_wallet_id"] == "wallet-b"
+
+    @pytest.mark.asyncio
+    async def test_transfer_requires_time_window(self, detector):
+        """Test that deltas further apart than the window are not paired."""
+        deltas = [
+            make_delta("wallet-a", "USDT", "100", "0", minutes=0),
+            make_delta("wallet-b", "USDT", "0", "100", minutes=31),
+        ]
+
+        patterns = await detector.detect_all_patterns(deltas, "user-1")
+
+        assert patterns["transfers"] == []
+
+    @pytest.mark.asyncio
+    async def test_transfer_requires_other_wallet_and_same_currency(self, detector):
+        """Test that same-wallet and cross-currency pairs are not transfers."""
+        deltas = [
+            make_delta("wallet-a", "USDT", "100", "0", minutes=0),
+            make_delta("wallet-a", "USDT", "0", "100", minutes=1),
+            make_delta("wallet-b", "EUR", "0", "100", minutes=1),
+        ]
+
+        patterns = await detector.detect_all_patterns(deltas, "user-1")
+
+        assert patterns["transfers"] == []
+
+    @pytest.mark.asyncio
+    async def test_detect_transfer_pattern(self, detector):
+        """Test the public pairwise transfer check."""
+        expense = make_delta("wallet-a", "USDC", "100", "0")
+        income = make_delta("wallet-b", "USDC", "0", "96", minutes=10)
+
+        transfer = await detector.detect_transfer_pattern(expense, income, "user-1")
+
+        assert transfer["amount"] == 100.0
+        assert transfer["fee"] == 4.0
+
+    @pytest.mark.asyncio
+    async def test_detects_swaps_in_every_wallet(self, detector):
+        """Test that swaps are matched per wallet, not only in the last delta's wallet."""
+        deltas = [
+            make_delta("wallet-a", "USDT", "100", "0", minutes=0),
+            make_delta("wallet-a", "USDC", "0", "99", minutes=2),
+            make_delta("wallet-b", "USDT", "50", "0", minutes=0),
+            make_delta("wallet-b", "USDC", "0", "50", minutes=3),
+            make_delta("wallet-c", "EUR", "10", "0", minutes=0),
+        ]
+
+        patterns = await detector.detect_all_patterns(deltas, "user-1")
+
+        swapped = sorted(swap["from_amount"] for swap in patterns["swaps"])
+        assert swapped == [50.0, 100.0]
+
+    @pytest.mark.asyncio
+    async def test_swap_requires_same_wallet(self, detector):
+        """Test that USDT out of one wallet and USDC into another is not a swap."""
+        deltas = [
+            make_delta("wallet-a", "USDT", "100", "0"),
+            make_delta("wallet-b", "USDC", "0", "100", minutes=1),
+        ]
+
+        patterns = await detector.detect_all_patterns(deltas, "user-1")
+
+        assert patterns["swaps"] == []
+
+    @pytest.mark.asyncio
+    async def test_detects_card_payments_in_every_wallet(self, detector, transaction_repo):
+        """Test that USDC expenses of all wallets are checked for card payments."""
+        deltas = [
+            make_delta("wallet-a", "USDC", "100", "80"),
+            make_delta("wallet-b", "USDC", "100", "70"),
+            make_delta("wallet-b", "USDC", "70", "75", minutes=5),
+        ]
+
+        patterns = await detector.detect_all_patterns(deltas, "user-1")
+
+        assert sorted(p["amount"] for p in patterns["card_payments"]) == [20.0, 30.0]
+
+    @pytest.mark.asyncio
+    async def test_transfers_are_matched_one_to_one(self, detector):
+        """Test that one income is paired with only one of several expenses."""
+        deltas = [
+            make_delta("wallet-a", "USDT", "100", "0", minutes=0),
+            make_delta("wallet-c", "USDT", "100", "0", minutes=1),
+            make_delta("wallet-b", "USDT", "0", "99", minutes=2),
+        ]
+
+        patterns = await detector.detect_all_patterns(deltas, "user-1")
+
+        assert len(patterns["transfers"]) == 1
+        assert patterns["transfers"][0]["from_wallet_id"] == "wallet-a"
+
+    @pytest.mark.asyncio
+    async def test_swaps_are_matched_one_to_one(self, detector):
+        """Test that each swap leg is used once, earliest valid pair first."""
+        deltas = [
+            make_delta("wallet-a", "USDT", "200", "100", minutes=0),
+            make_delta("wallet-a", "USDT", "100", "0", minutes=10),
+            make_delta("wallet-a", "USDC", "0", "99", minutes=1),
+            make_delta("wallet-a", "USDC", "99", "197", minutes=11),
+        ]
+
+        patterns = await detector.detect_all_patterns(deltas, "user-1")
+
+        assert [s["time_diff_seconds"] for s in patterns["swaps"]] == [60.0, 60.0]
+
+    @pytest.mark.asyncio
+    async def test_transferred_usdc_is_not_a_card_payment(self, detector):
+        """Test that USDC sent to another wallet is reported only as a transfer."""
+        deltas = [
+            make_delta("wallet-a", "USDC", "100", "80"),
+            make_delta("wallet-b", "USDC", "0", "20", minutes=5),
+        ]
+
+        patterns = await detector.detect_all_patterns(deltas, "user-1")
+
+        assert len(patterns["transfers"]) == 1
+        assert patterns["card_payments"] == []
+
+    @pytest.mark.asyncio
+    async def test_matching_skips_buckets_without_counterpart(self, detector):
+        """Test that single-currency wallets and single-wallet currencies are not matched."""
+        detector._match_one_to_one = MagicMock(wraps=detector._match_one_to_one)
+        deltas = [
+            make_delta("wallet-a", "USDT", "100", "0"),
+            make_delta("wallet-a", "USDT", "0", "100", minutes=1),
+            make_delta("wallet-b", "EUR", "0", "50", minutes=1),
+        ]
+
+        patterns = await detector.detect_all_patterns(deltas, "user-1")
+
+        assert patterns["swaps"] == [] and patterns["transfers"] == []
+        detector._match_one_to_one.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_empty_deltas(self, detector):
+        """Test that no deltas yields empty pattern lists."""
+        patterns = await detector.detect_all_patterns([], "user-1")
+
+        assert patterns == {"swaps": [], "card_payments": [], "transfers": []}
+
+    @pytest.mark.asyncio
+    async def test_card_payments_prefetch_transactions_once_per_wallet(
+        self, detector, transaction_repo
+    ):
+        """Test that one transaction query covers all candidates of a wallet."""
+        transaction_repo.get_by_timerange.return_value = [
+            {"amount": 20, "timestamp": BASE_TIME + timedelta(minutes=2)},
+        ]
+        deltas = [
+            make_delta("wallet-a", "USDC", "100", "80", minutes=0),
+            make_delta("wallet-a", "USDC", "80", "50", minutes=30),
+        ]
+
+        patterns = await detector.detect_all_patterns(deltas, "user-1")
+
+        # The 20 USDC expense has a blockchain transaction, the 30 USDC one does not
+        assert [p["amount"] for p in patterns["card_payments"]] == [30.0]
+        transaction_repo.get_by_timerange.assert_awaited_once_with(
+            "wallet-a",
+            BASE_TIME - timedelta(minutes=5),
+            BASE_TIME + timedelta(minutes=35)
+        )
+
+    @pytest.mark.asyncio
+    async def test_has_blockchain_transaction_window(self, detector, transaction_repo):
+        """Test that only transactions within ±5 minutes count."""
+        transaction_repo.get_by_timerange.return_value = [
+            {"amount": 20, "timestamp": BASE_TIME - timedelta(minutes=6)},
+            {"amount": 20, "timestamp": BASE_TIME + timedelta(minutes=6)},
+        ]
+
+        assert not await detector._has_blockchain_transaction(
+            "wallet-a", Decimal("20"), BASE_TIME
+        )
+
+        transaction_repo.get_by_timerange.return_value.append(
+            {"amount": "19.5", "timestamp": BASE_TIME + timedelta(minutes=5)}
+        )
+        detector._blockchain_tx_cache.clear()
+
+        assert await detector._has_blockchain_transaction(
+            "wallet-a", Decimal("20"), BASE_TIME
+        )
+
+    @pytest.mark.asyncio
+    async def test_blockchain_transaction_checks_are_cached(self, detector, transaction_repo):
+        """Test that repeated candidates are answered without another query."""
+        deltas = [make_delta("wallet-a", "USDC", "100", "80")]
+
+        first = await detector.detect_all_patterns(deltas, "user-1")
+        second = await detector.detect_all_patterns(deltas, "user-1")
+
+        assert first["card_payments"] == second["card_payments"]
+        transaction_repo.get_by_timerange.assert_awaited_once()
+
+        # Same wallet, amount to the cent and minute hits the cached answer
+        assert not await detector._has_blockchain_transaction(
+            "wallet-a", Decimal("20.001"), BASE_TIME + timedelta(seconds=30)
+        )
+        transaction_repo.get_by_timerange.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_failed_transaction_query_is_not_cached(self, detector, transaction_repo):
+        """Test that a repository error is not remembered as 'no transaction'."""
+        transaction_repo.get_by_timerange.side_effect = RuntimeError("db down")
+
+        assert not await detector._has_blockchain_transaction(
+            "wallet-a", Decimal("20"), BASE_TIME
+        )
+
+        assert len(detector._blockchain_tx_cache) == 0
+
+    def test_within_tolerance_is_inclusive(self, detector):
+        """Test the integer 5% tolerance check at its boundary."""
+        assert detector._within_tolerance(100_000_000, 95_000_000)
+        assert detector._within_tolerance(100_000_000, 105_000_000)
+        assert not detector._within_tolerance(100_000_000, 94_999_999)
+        assert not detector._within_tolerance(0, 0)
+
+
+@pytest.mark.unit
+@pytest.mark.balance_detection
+class TestMatchPairs:
+    """Tests for the integer matching kernel."""
+
+    def test_earliest_valid_pair_wins(self):
+        """Test greedy one-to-one pairing within window bounds and tolerance."""
+        pairs = _match_pairs(
+            lo=[0, 0], hi=[2, 3],
+            amt_a=[100, 100], amt_b=[99, 100, 100],
+            tol_num=1, tol_den=20
+        )
+
+        assert pairs == [(0, 0), (1, 1)]
+
+    def test_amount_outside_tolerance_is_skipped(self):
+        """Test that candidates outside the tolerance are not matched."""
+        pairs = _match_pairs(
+            lo=[0], hi=[2], amt_a=[100], amt_b=[50, 96],
+            tol_num=1, tol_den=20
+        )
+
+        assert pairs == [(0, 1)]
+
+    def test_equal_keys_are_skipped(self):
+        """Test that pairs sharing a key are not matched."""
+        pairs = _match_pairs(
+            lo=[0], hi=[2], amt_a=[100], amt_b=[100, 100],
+            tol_num=1, tol_den=20,
+            key_a=[0], key_b=[0, 1]
+        )
+
+        assert pairs == [(0, 1)]
@@ -13,6 +13,7 @@ from infrastructure.error_handling.retry import (
     CircuitBreaker,
     CircuitBreakerOpenError
 )
+from infrastructure.error_handling.exceptions import RateLimitExceededError
 
 
 @pytest.mark.unit
@@ -70,6 +71,24 @@ class TestRetryLogic:
         
         assert result == "success"
         assert call_count == 3
+    
+    @pytest.mark.asyncio
+    async def test_retry_async_honors_retry_after(self, monkeypatch):
+        """Test that an exception's retry_after extends the backoff delay."""
+        delays = []
+        
+        async def fake_sleep(delay):
+            delays.append(delay)
+        
+        monkeypatch.setattr(asyncio, "sleep", fake_sleep)
+        error = RateLimitExceededError("Moralis", retry_after=5)
+        mock_func = AsyncMock(side_effect=[error, "success"])
+        config = RetryConfig(max_attempts=2, initial_delay=0.01, max_delay=3.0, jitter=False)
+        
+        result = await retry_async(mock_func, config=config)
+        
+        assert result == "success"
+        assert delays == [3.0]
 
 
 @pytest.mark.unit
@@ -131,3 +150,18 @@ class TestCircuitBreaker:
         assert result == "success"
         assert cb.state == "CLOSED"
         assert cb.failure_count == 0
+    
+    @pytest.mark.asyncio
+    async def test_circuit_breaker_counts_consecutive_failures(self):
+        """Test that a success resets the failure count."""
+        cb = CircuitBreaker(failure_threshold=2, recovery_timeout=1.0)
+        failing = AsyncMock(side_effect=Exception("fail"))
+        
+        with pytest.raises(Exception):
+            await cb.call(failing)
+        await cb.call(AsyncMock(return_value="success"))
+        with pytest.raises(Exception):
+            await cb.call(failing)
+        
+        assert cb.state == "CLOSED"
+        assert cb.failure_count == 1
@@ -0,0 +1,56 @@
+"""
+Unit tests for CategoryRepository (Supabase-backed)
+"""
+import pytest
+from unittest.mock import Mock, patch
+from infrastructure.repositories.category_repository import CategoryRepository
+from domain.category import CategoryType
+
+
+ROWS = [
+    {"id": "c1", "user_id": "u1", "name": "Salary", "type": "income"},
+    {"id": "c2", "user_id": "u1", "name": "Food", "type": "expense"},
+]
+
+
+@pytest.fixture
+def supabase_get():
+    """requests.request stub that applies the PostgREST type filter like Supabase"""
+    def request(method, url, params=None, **kwargs):
+        rows = [
+            row for row in ROWS
+            if "type" not in params or params["type"] == f"eq.{row['type']}"
+        ]
+        limit = params.get("limit")
+        return Mock(text="[]", json=Mock(return_value=rows[:limit] if limit else rows))
+
+    with patch("infrastructure.supabase_client.requests.request", side_effect=request) as mock:
+        yield mock
+
+
+def test_get_user_categories_filters_type_in_supabase(supabase_get):
+    """Test that only categories of the requested type are returned"""
+    categories = CategoryRepository(":memory:").get_user_categories("u1", type=CategoryType.EXPENSE)
+
+    assert [category.name for category in categories] == ["Food"]
+    assert supabase_get.call_args.kwargs["params"] == {
+        "select": "*", "user_id": "eq.u1", "type": "eq.expense"
+    }
+
+
+def test_get_user_categories_without_type_returns_all(supabase_get):
+    """Test that no type filter is sent when no type is requested"""
+    categories = CategoryRepository(":memory:").get_user_categories("u1")
+
+    assert [category.type for category in categories] == [CategoryType.INCOME, CategoryType.EXPENSE]
+    assert "type" not in supabase_get.call_args.kwargs["params"]
+
+
+def test_get_user_categories_limit_is_ordered(supabase_get):
+    """Test that a limited read is ordered by creation time server-side"""
+    categories = CategoryRepository(":memory:").get_user_categories("u1", limit=1)
+
+    assert len(categories) == 1
+    params = supabase_get.call_args.kwargs["params"]
+    assert params["limit"] == 1
+    assert params["order"] == "created_at.asc"
@@ -3,20 +3,36 @@ Tests for AI Task Queue Service
 """
 import pytest
 import asyncio
+import msgpack
 from unittest.mock import AsyncMock, MagicMock, patch
 from src.app.services.ai_task_queue import AITaskQueue, TaskStatus
 
 
+def stream_reply(stream, values, message_id=b"1-0"):
+    """Build an XREADGROUP reply (RESP3 shape) with one msgpack task entry"""
+    return {stream.encode(): [[(message_id, {b"payload": msgpack.packb(values)})]]}
+
+
+@pytest.fixture
+def mock_pipeline():
+    """Mock Redis pipeline (commands are queued, execute is awaited)"""
+    pipe_mock = MagicMock()
+    pipe_mock.__aenter__ = AsyncMock(return_value=pipe_mock)
+    pipe_mock.__aexit__ = AsyncMock(return_value=False)
+    pipe_mock.execute = AsyncMock(return_value=[])
+    return pipe_mock
+
+
 @pytest.fixture
-def mock_redis():
+def mock_redis(mock_pipeline):
     """Mock Redis client"""
     redis_mock = AsyncMock()
+    redis_mock.pipeline = MagicMock(return_value=mock_pipeline)
+    redis_mock.xgroup_create = AsyncMock()
+    redis_mock.xreadgroup = AsyncMock(return_value={})
     redis_mock.setex = AsyncMock()
-    redis_mock.zadd = AsyncMock()
-    redis_mock.zrange = AsyncMock()
-    redis_mock.zrem = AsyncMock()
-    redis_mock.get = AsyncMock()
-    redis_mock.zcard = AsyncMock()
+    redis_mock.get = AsyncMock(return_value=None)
+    redis_mock.blpop = AsyncMock()
     redis_mock.delete = AsyncMock()
     redis_mock.close = AsyncMock()
     return redis_mock
@@ -27,21 +43,18 @@ async def task_queue(mock_redis):
     """Create AITaskQueue instance with mocked Redis"""
     queue = AITaskQueue("redis://localhost:6379")
     
-    # Mock from_url to return our mock_redis
-    async def mock_from_url(*args, **kwargs):
-        return mock_redis
-    
-    with patch('redis.asyncio.from_url', side_effect=mock_from_url):
-        await queue.connect()
-        yield queue
-        await queue.disconnect()
+    # Replace the pooled client with our mock_redis
+    queue.redis_client = mock_redis
+    await queue.connect()
+    yield queue
+    await queue.disconnect()
 
 
 class TestAITaskQueue:
     """Test AITaskQueue functionality"""
     
     @pytest.mark.asyncio
-    async def test_enqueue_task(self, task_queue, mock_redis):
+    async def test_enqueue_task(self, task_queue, mock_redis, mock_pipeline):
         """Test enqueueing a task"""
         task_data = {"transaction_id": "tx123", "amount": 100}
         
@@ -55,47 +68,132 @@ class TestAITaskQueue:
         # Verify task ID format
         assert task_id.startswith("categorize_transaction:")
         
-        # Verify Redis calls
-        assert mock_redis.setex.called
-        assert mock_redis.zadd.called
+        # Verify all writes go through a single transactional pipeline
+        mock_redis.pipeline.assert_called_once_with(transaction=True)
+        mock_pipeline.xadd.assert_called_once()
+        assert mock_pipeline.setex.call_count == 1
+        mock_pipeline.execute.assert_awaited_once()
     
     @pytest.mark.asyncio
-    async def test_dequeue_task(self, task_queue, mock_redis):
+    async def test_dequeue_task(self, task_queue, mock_redis, mock_pipeline):
         """Test dequeueing a task"""
         task_id = "categorize_transaction:abc123"
-        task_data = {
-            "task_id": task_id,
-            "task_type": "categorize_transaction",
-            "data": {"amount": 100},
-            "priority": 1
-        }
         
         # Mock Redis responses
-        mock_redis.zrange.return_value = [task_id]
-        mock_redis.get.return_value = '{"task_id": "' + task_id + '", "task_type": "categorize_transaction", "data": {"amount": 100}, "priority": 1}'
+        mock_redis.xreadgroup.return_value = stream_reply(
+            "ai:tasks:stream:p1",
+            [task_id, "categorize_transaction", {"amount": 100}, "user123", 1700000000.0, 1]
+        )
         
         result = await task_queue.dequeue_task()
         
         assert result is not None
         assert result["task_id"] == task_id
         assert result["task_type"] == "categorize_transaction"
+        assert result["data"] == {"amount": 100}
+        assert result["user_id"] == "user123"
         
-        # Verify Redis calls
-        assert mock_redis.zrange.called
-        assert mock_redis.zrem.called
-        assert mock_redis.get.called
+        # The highest priority stream with an entry is read without blocking
+        mock_redis.xreadgroup.assert_awaited_once_with(
+            AITaskQueue.CONSUMER_GROUP,
+            task_queue.consumer_name,
+            {"ai:tasks:stream:p1": ">"},
+            count=1
+        )
+        assert task_queue.task_streams == [
+            "ai:tasks:stream:p1", "ai:tasks:stream:p2", "ai:tasks:stream:p3"
+        ]
+        
+        # PROCESSING and the entry location are written together
+        await asyncio.gather(*task_queue._pending_writes)
+        mock_pipeline.setex.assert_any_call(
+            f"{task_queue.TASK_STATUS_PREFIX}{task_id}".encode(),
+            task_queue.TASK_TIMEOUT,
+            TaskStatus.PROCESSING
+        )
+        mock_pipeline.setex.assert_any_call(
+            f"{task_queue.TASK_ENTRY_PREFIX}{task_id}".encode(),
+            task_queue.RESULT_TTL,
+            msgpack.packb(["ai:tasks:stream:p1", b"1-0"], use_bin_type=True)
+        )
+        mock_redis.setex.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_dequeue_polls_streams_by_priority(self, task_queue, mock_redis):
+        """Test that streams are polled highest priority first, one entry at a time"""
+        mock_redis.xreadgroup.side_effect = [
+            {},
+            stream_reply("ai:tasks:stream:p2", ["medium:1", "test", {}, None, 1.0, 2]),
+        ]
+        
+        task = await task_queue.dequeue_task()
+        
+        assert task["task_id"] == "medium:1"
+        read_streams = [call.args[2] for call in mock_redis.xreadgroup.await_args_list]
+        assert read_streams == [{"ai:tasks:stream:p1": ">"}, {"ai:tasks:stream:p2": ">"}]
+        assert not task_queue._claimed
+    
+    @pytest.mark.asyncio
+    async def test_blocking_read_requeues_surplus_entries(self, task_queue, mock_redis, mock_pipeline):
+        """Test that entries beyond the highest priority one are handed back"""
+        reply = stream_reply("ai:tasks:stream:p3", ["low:1", "test", {}, None, 1.0, 3], b"3-0")
+        reply.update(stream_reply("ai:tasks:stream:p2", ["medium:1", "test", {}, None, 1.0, 2]))
+        mock_redis.xreadgroup.side_effect = [{}, {}, {}, reply]
+        
+        task = await task_queue.dequeue_task()
+        
+        assert task["task_id"] == "medium:1"
+        assert not task_queue._claimed
+        assert mock_redis.xreadgroup.await_args.kwargs["block"] == AITaskQueue.DEQUEUE_BLOCK_MS
+        mock_pipeline.xadd.assert_called_once()
+        assert mock_pipeline.xadd.call_args.args[0] == "ai:tasks:stream:p3"
+        mock_pipeline.xack.assert_called_once_with("ai:tasks:stream:p3", AITaskQueue.CONSUMER_GROUP, b"3-0")
+        mock_pipeline.xdel.assert_called_once_with("ai:tasks:stream:p3", b"3-0")
+    
+    @pytest.mark.asyncio
+    async def test_dequeue_recreates_missing_groups(self, task_queue, mock_redis):
+        """Test that dequeue recreates consumer groups after NOGROUP"""
+        from redis.exceptions import ResponseError
+        
+        mock_redis.xreadgroup.side_effect = [ResponseError("NOGROUP No such key"), {}, {}, {}, {}]
+        mock_redis.xgroup_create.reset_mock()
+        
+        result = await task_queue.dequeue_task()
+        
+        assert result is None
+        assert mock_redis.xgroup_create.await_count == len(task_queue.task_streams)
+        assert mock_redis.xreadgroup.await_count == 5
+    
+    @pytest.mark.asyncio
+    async def test_dequeue_reclaims_stuck_tasks(self, task_queue, mock_redis, mock_pipeline):
+        """Test that tasks idle past TASK_TIMEOUT are taken over via XAUTOCLAIM"""
+        task_id = "categorize_transaction:stuck"
+        payload = msgpack.packb([task_id, "categorize_transaction", {}, None, 1.0, 2])
+        mock_pipeline.execute.return_value = [
+            [b"0-0", [], []],
+            [b"0-0", [(b"1-0", {b"payload": payload})], []],
+            [b"0-0", [], []],
+        ]
+        
+        result = await task_queue.dequeue_task()
+        
+        assert result["task_id"] == task_id
+        assert not task_queue._claimed
+        assert mock_pipeline.xautoclaim.call_count == len(task_queue.task_streams)
+        assert mock_pipeline.xautoclaim.call_args.kwargs["min_idle_time"] == task_queue.TASK_TIMEOUT * 1000
+        mock_redis.xreadgroup.assert_not_called()
     
     @pytest.mark.asyncio
     async def test_dequeue_empty_queue(self, task_queue, mock_redis):
         """Test dequeueing from empty queue"""
-        mock_redis.zrange.return_value = []
+        mock_redis.xreadgroup.return_value = {}
         
         result = await task_queue.dequeue_task()
         
         assert result is None
     
     @pytest.mark.asyncio
-    async def test_store_result(self, task_queue, mock_redis):
+    async def test_store_result(self, task_queue, mock_redis, mock_pipeline):
         """Test storing task result"""
         task_id = "categorize_transaction:abc123"
         result = {"category": "Food", "confidence": 0.95}
@@ -103,17 +201,136 @@ class TestAITaskQueue:
         await task_queue.store_result(task_id, result, TaskStatus.COMPLETED)
         
         # Verify Redis calls
-        assert mock_redis.setex.called
+        assert mock_pipeline.setex.called
+        mock_pipeline.execute.assert_awaited_once()
         
         # Check that result was stored with correct TTL
-        call_args = mock_redis.setex.call_args_list
+        call_args = mock_pipeline.setex.call_args_list
         assert any(str(task_queue.RESULT_TTL) in str(args) for args in call_args)
     
+    @pytest.mark.asyncio
+    async def test_store_result_acknowledges_entry(self, task_queue, mock_redis, mock_pipeline):
+        """Test that storing a result acks and deletes the stream entry"""
+        task_id = "categorize_transaction:abc123"
+        mock_redis.xreadgroup.return_value = stream_reply(
+            "ai:tasks:stream:p2", [task_id, "categorize_transaction", {}, None, 1.0, 2]
+        )
+        await task_queue.dequeue_task()
+        
+        await task_queue.store_result(task_id, {"category": "Food"})
+        
+        mock_pipeline.xack.assert_called_once_with(
+            "ai:tasks:stream:p2", AITaskQueue.CONSUMER_GROUP, b"1-0"
+        )
+        mock_pipeline.xdel.assert_called_once_with("ai:tasks:stream:p2", b"1-0")
+        assert task_id not in task_queue._inflight
+    
+    @pytest.mark.asyncio
+    async def test_store_result_acks_entry_dequeued_elsewhere(self, task_queue, mock_redis, mock_pipeline):
+        """Test that an instance which did not dequeue the task still acks it"""
+        task_id = "categorize_transaction:abc123"
+        mock_redis.get.return_value = msgpack.packb(["ai:tasks:stream:p2", b"7-0"], use_bin_type=True)
+        
+        await task_queue.store_result(task_id, {"category": "Food"})
+        
+        mock_redis.get.assert_awaited_once_with(f"{task_queue.TASK_ENTRY_PREFIX}{task_id}".encode())
+        mock_pipeline.xack.assert_called_once_with(
+            "ai:tasks:stream:p2", AITaskQueue.CONSUMER_GROUP, b"7-0"
+        )
+        mock_pipeline.xdel.assert_called_once_with("ai:tasks:stream:p2", b"7-0")
+        mock_pipeline.delete.assert_called_once_with(f"{task_queue.TASK_ENTRY_PREFIX}{task_id}".encode())
+    
+    @pytest.mark.asyncio
+    async def test_store_result_notifies_waiters(self, task_queue, mock_pipeline):
+        """Test that storing a result pushes a notification for get_result"""
+        task_id = "categorize_transaction:abc123"
+        
+        await task_queue.store_result(task_id, {"category": "Food"})
+        
+        notify_key = f"{task_queue.TASK_NOTIFY_PREFIX}{task_id}".encode()
+        mock_pipeline.lpush.assert_called_once_with(notify_key, "1")
+        mock_pipeline.expire.assert_called_once_with(notify_key, task_queue.RESULT_TTL)
+    
+    @pytest.mark.asyncio
+    async def test_status_written_in_same_pipeline(self, task_queue, mock_redis, mock_pipeline):
+        """Test that status transitions share the triggering op's round trip"""
+        task_id = await task_queue.enqueue_task(task_type="test", data={})
+        await task_queue.store_result(task_id, {}, TaskStatus.FAILED)
+        
+        status_key = f"{task_queue.TASK_STATUS_PREFIX}{task_id}".encode()
+        status_writes = [
+            call.args for call in mock_pipeline.setex.call_args_list
+            if call.args[0] == status_key
+        ]
+        assert status_writes == [
+            (status_key, task_queue.TASK_TIMEOUT, TaskStatus.PENDING),
+            (status_key, task_queue.TASK_TIMEOUT, TaskStatus.FAILED),
+        ]
+        mock_redis.setex.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_get_result(self, task_queue, mock_redis):
+        """Test getting a result after notification"""
+        task_id = "categorize_transaction:abc123"
+        notify_key = f"{task_queue.TASK_NOTIFY_PREFIX}{task_id}".encode()
+        mock_redis.blpop.return_value = (notify_key, b"1")
+        mock_redis.get.return_value = msgpack.packb(
+            [task_id, {"category": "Food"}, "completed", 1700000000.0]
+        )
+        
+        result = await task_queue.get_result(task_id, timeout=5)
+        
+        assert result["result"] == {"category": "Food"}
+        assert result["status"] == TaskStatus.COMPLETED
+        mock_redis.blpop.assert_awaited_once_with(notify_key, timeout=5)
+    
+    @pytest.mark.asyncio
+    async def test_get_result_timeout(self, task_queue, mock_redis):
+        """Test that get_result returns None and marks task on timeout"""
+        task_id = "categorize_transaction:abc123"
+        mock_redis.blpop.return_value = None
+        
+        result = await task_queue.get_result(task_id, timeout=1)
+        
+        assert result is None
+        await asyncio.gather(*task_queue._pending_writes)
+        mock_redis.setex.assert_awaited_once_with(
+            f"{task_queue.TASK_STATUS_PREFIX}{task_id}".encode(),
+            task_queue.TASK_TIMEOUT,
+            TaskStatus.TIMEOUT
+        )
+    
+    @pytest.mark.asyncio
+    async def test_store_result_waits_for_background_status(self, task_queue, mock_redis, mock_pipeline):
+        """Test that the PROCESSING write lands before the final status"""
+        mock_redis.xreadgroup.return_value = stream_reply(
+            "ai:tasks:stream:p1", ["t:1", "test", {}, None, 1.0, 1]
+        )
+        await task_queue.dequeue_task()
+        assert task_queue._pending_writes
+        
+        await task_queue.store_result("t:1", {})
+        
+        assert not task_queue._pending_writes
+        # Stuck-task reclaim, the PROCESSING write, then the result pipeline
+        assert mock_pipeline.execute.await_count == 3
+    
+    @pytest.mark.asyncio
+    async def test_background_status_write_failure_is_logged(self, task_queue, mock_redis):
+        """Test that a failed fire-and-forget status write does not raise"""
+        mock_redis.setex.side_effect = ConnectionError("connection lost")
+        
+        task_queue._set_status_in_background(b"task:1", TaskStatus.TIMEOUT)
+        await asyncio.gather(*task_queue._pending_writes, return_exceptions=True)
+        await asyncio.sleep(0)
+        
+        assert not task_queue._pending_writes
+    
     @pytest.mark.asyncio
     async def test_get_task_status(self, task_queue, mock_redis):
         """Test getting task status"""
         task_id = "categorize_transaction:abc123"
-        mock_redis.get.return_value = TaskStatus.PROCESSING
+        mock_redis.get.return_value = TaskStatus.PROCESSING.encode()
         
         status = await task_queue.get_task_status(task_id)
         
@@ -121,14 +338,14 @@ class TestAITaskQueue:
         assert mock_redis.get.called
     
     @pytest.mark.asyncio
-    async def test_get_queue_size(self, task_queue, mock_redis):
+    async def test_get_queue_size(self, task_queue, mock_pipeline):
         """Test getting queue size"""
-        mock_redis.zcard.return_value = 5
+        mock_pipeline.execute.return_value = [2, 2, 1]
         
         size = await task_queue.get_queue_size()
         
         assert size == 5
-        assert mock_redis.zcard.called
+        assert mock_pipeline.xlen.call_count == 3
     
     @pytest.mark.asyncio
     async def test_clear_queue(self, task_queue, mock_redis):
@@ -138,7 +355,7 @@ class TestAITaskQueue:
         assert mock_redis.delete.called
     
     @pytest.mark.asyncio
-    async def test_priority_ordering(self, task_queue, mock_redis):
+    async def test_priority_ordering(self, task_queue, mock_redis, mock_pipeline):
         """Test that tasks are ordered by priority"""
         # Enqueue high priority task
         await task_queue.enqueue_task(
@@ -154,22 +371,37 @@ class TestAITaskQueue:
             priority=3
         )
         
-        # Verify that zadd was called with correct scores
-        # High priority (1) should have lower score than low priority (3)
-        zadd_calls = mock_redis.zadd.call_args_list
-        assert len(zadd_calls) == 2
-        
-        # Extract scores from calls
-        scores = []
-        for call in zadd_calls:
-            # call[0] is positional args, call[1] is kwargs
-            if len(call[0]) > 1:
-                task_dict = call[0][1]
-                scores.extend(task_dict.values())
-        
-        # Verify high priority has lower score
-        assert len(scores) == 2
-        assert scores[0] < scores[1]  # priority 1 < priority 3
+        # Each priority has its own stream, read highest priority first
+        streams = [call.args[0] for call in mock_pipeline.xadd.call_args_list]
+        assert streams == ["ai:tasks:stream:p1", "ai:tasks:stream:p3"]
+
+
+class TestAITaskQueueConnection:
+    """Test AITaskQueue connection setup"""
+    
+    def test_client_uses_configured_pool(self):
+        """Test that the client is created eagerly on a tuned pool"""
+        queue = AITaskQueue("redis://localhost:6379")
+        
+        pool = queue.redis_client.connection_pool
+        assert pool is queue._pool
+        assert pool.max_connections == AITaskQueue.MAX_CONNECTIONS
+        assert pool.connection_kwargs["protocol"] == 3
+        assert pool.connection_kwargs["health_check_interval"] == AITaskQueue.HEALTH_CHECK_INTERVAL
+        assert pool.connection_kwargs["socket_keepalive"] is True
+    
+    @pytest.mark.asyncio
+    async def test_dequeue_creates_groups_lazily(self, mock_redis):
+        """Test that dequeue creates consumer groups when connect() was skipped"""
+        queue = AITaskQueue("redis://localhost:6379")
+        queue.redis_client = mock_redis
+        
+        await queue.dequeue_task()
+        
+        created = [call.args[:2] for call in mock_redis.xgroup_create.await_args_list]
+        assert created == [(stream, AITaskQueue.CONSUMER_GROUP) for stream in queue.task_streams]
+        # One non-blocking poll per stream, then one blocking read
+        assert mock_redis.xreadgroup.await_count == len(queue.task_streams) + 1
 
 
 class TestTaskStatus:
@@ -0,0 +1,384 @@
+"""
+Tests for BlockchainService
+"""
+import pytest
+import asyncio
+import httpx
+from datetime import datetime, timezone
+from decimal import Decimal
+from src.app.services.blockchain_service import BlockchainService
+from infrastructure.error_handling import RetryConfig
+
+
+ETH_ADDRESS = "0x" + "a" * 40
+TRON_ADDRESS = "T" + "b" * 33
+
+
+def make_service(handler):
+    """BlockchainService whose HTTP client is served by handler"""
+    service = BlockchainService()
+    service._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    service.REQUEST_RETRY_CONFIG = RetryConfig(
+        max_attempts=2,
+        initial_delay=0,
+        max_delay=0,
+        jitter=False,
+        retryable_exceptions=BlockchainService.REQUEST_RETRY_CONFIG.retryable_exceptions
+    )
+    return service
+
+
+@pytest.mark.asyncio
+async def test_get_eth_balance_fetches_native_and_tokens(monkeypatch):
+    """Test that native balance and ERC20 tokens are fetched through the pooled client"""
+    monkeypatch.setenv("MORALIS_API_KEY", "test-key")
+    requested = []
+
+    def handler(request):
+        requested.append(request.url.path)
+        if request.url.path.endswith("/balance"):
+            return httpx.Response(200, json={"balance": str(2 * 10**18)})
+        return httpx.Response(200, json=[
+            {"symbol": "USDT", "name": "Tether", "balance": "1500000", "decimals": "6"}
+        ])
+
+    service = make_service(handler)
+    balance = await service.get_wallet_balance(ETH_ADDRESS)
+    await service.close()
+
+    assert sorted(requested) == sorted([
+        f"/api/v2.2/{ETH_ADDRESS}/balance",
+        f"/api/v2.2/{ETH_ADDRESS}/erc20",
+    ])
+    assert balance["native_balance"] == Decimal("2")
+    assert balance["tokens"][0]["balance"] == Decimal("1.5")
+
+
+@pytest.mark.asyncio
+async def test_get_tron_transactions_merges_trx_and_trc20():
+    """Test that TRX and TRC20 transfers are fetched and merged newest first"""
+    def handler(request):
+        if request.url.path.endswith("/trc20"):
+            return httpx.Response(200, json={"data": [{
+                "transaction_id": "trc20-tx",
+                "value": "2500000",
+                "token_info": {"symbol": "USDT", "decimals": 6},
+                "block_timestamp": 2_000_000,
+            }]})
+        return httpx.Response(200, json={"data": [{
+            "txID": "trx-tx",
+            "raw_data": {"contract": [{"parameter": {"value": {"amount": 3_000_000}}}]},
+            "block_timestamp": 1_000_000,
+            "ret": [{"contractRet": "SUCCESS"}],
+        }]})
+
+    service = make_service(handler)
+    transactions = await service.get_wallet_transactions(TRON_ADDRESS, from_timestamp=1)
+    await service.close()
+
+    assert [tx["hash"] for tx in transactions] == ["trc20-tx", "trx-tx"]
+    assert transactions[0]["value"] == Decimal("2.5")
+    assert transactions[1]["value"] == Decimal("3")
+
+
+@pytest.mark.asyncio
+async def test_request_error_returns_none():
+    """Test that HTTP errors are logged and reported as no data"""
+    service = make_service(lambda request: httpx.Response(500))
+
+    assert await service.get_wallet_balance(ETH_ADDRESS) is None
+    assert await service.get_wallet_transactions(TRON_ADDRESS) == []
+    await service.close()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_balance_requests_share_one_fetch(monkeypatch):
+    """Test that concurrent and repeated balance refreshes hit the API once"""
+    monkeypatch.setenv("MORALIS_API_KEY", "test-key")
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.path)
+        if request.url.path.endswith("/balance"):
+            return httpx.Response(200, json={"balance": "0"})
+        return httpx.Response(200, json=[])
+
+    service = make_service(handler)
+    results = await asyncio.gather(*(service.get_wallet_balance(ETH_ADDRESS) for _ in range(5)))
+    again = await service.get_wallet_balance(ETH_ADDRESS)
+    await service.close()
+
+    assert len(calls) == 2  # native + erc20, once
+    assert all(result is again for result in results)
+    assert service._fetch_locks == {}
+
+
+@pytest.mark.asyncio
+async def test_transactions_cache_coalesces_within_minute():
+    """Test that from_timestamps within one minute share a fetch from the minute start"""
+    params = []
+
+    def handler(request):
+        params.append(request.url.params.get("min_timestamp"))
+        return httpx.Response(200, json={"data": []})
+
+    service = make_service(handler)
+    await service.get_wallet_transactions(TRON_ADDRESS, from_timestamp=125)
+    await service.get_wallet_transactions(TRON_ADDRESS, from_timestamp=170)
+    await service.close()
+
+    assert params == ["120000", "120000"]  # TRX + TRC20, fetched once
+
+
+@pytest.mark.asyncio
+async def test_failed_balance_is_not_cached():
+    """Test that a failed fetch is retried on the next call"""
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.path)
+        return httpx.Response(404)
+
+    service = make_service(handler)
+    assert await service.get_wallet_balance(TRON_ADDRESS) is None
+    assert await service.get_wallet_balance(TRON_ADDRESS) is None
+    await service.close()
+
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_partially_failed_transactions_are_not_cached():
+    """Test that a failed section makes the whole fetch uncached, not half a list"""
+    trc20_up = False
+
+    def handler(request):
+        if request.url.path.endswith("/trc20"):
+            if not trc20_up:
+                return httpx.Response(500)
+            return httpx.Response(200, json={"data": [{
+                "transaction_id": "trc20-tx",
+                "value": "1000000",
+                "token_info": {"symbol": "USDT", "decimals": 6},
+                "block_timestamp": 2_000_000,
+            }]})
+        return httpx.Response(200, json={"data": []})
+
+    service = make_service(handler)
+    assert await service.get_wallet_transactions(TRON_ADDRESS) == []
+    assert service._transactions_cache == {}
+
+    trc20_up = True
+    transactions = await service.get_wallet_transactions(TRON_ADDRESS)
+    await service.close()
+
+    assert [tx["hash"] for tx in transactions] == ["trc20-tx"]
+
+
+@pytest.mark.asyncio
+async def test_balance_without_token_list_is_not_cached(monkeypatch):
+    """Test that a failed ERC20 request does not cache a balance with no tokens"""
+    monkeypatch.setenv("MORALIS_API_KEY", "test-key")
+
+    def handler(request):
+        if request.url.path.endswith("/balance"):
+            return httpx.Response(200, json={"balance": "0"})
+        return httpx.Response(500)
+
+    service = make_service(handler)
+    assert await service.get_wallet_balance(ETH_ADDRESS) is None
+    await service.close()
+
+    assert service._balance_cache == {}
+
+
+@pytest.mark.parametrize("address,network", [
+    (ETH_ADDRESS, "ethereum"),
+    ("0x" + "c" * 37, "unknown"),
+    (TRON_ADDRESS, "tron"),
+    ("T" + "b" * 32, "unknown"),
+    ("", "unknown"),
+])
+def test_detect_network(address, network):
+    """Test network detection by address format"""
+    assert BlockchainService().detect_network(address) == network
+
+
+@pytest.mark.asyncio
+async def test_get_many_wallet_balances_is_bounded():
+    """Test that bulk balance lookups keep order and respect the concurrency limit"""
+    service = BlockchainService()
+    service.MAX_CONCURRENT_REQUESTS = 2
+    active = 0
+    peak = 0
+
+    async def fake_balance(address):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0)
+        active -= 1
+        return {"address": address}
+
+    service.get_wallet_balance = fake_balance
+    addresses = [f"T{i:033d}" for i in range(5)]
+
+    balances = await service.get_many_wallet_balances(addresses)
+    await service.close()
+
+    assert [b["address"] for b in balances] == addresses
+    assert peak == 2
+
+
+@pytest.mark.asyncio
+async def test_empty_response_body_returns_none():
+    """Test that an empty 200 response is treated as no data"""
+    service = make_service(lambda request: httpx.Response(200, content=b""))
+
+    assert await service._trongrid_request("v1/accounts/x") is None
+    await service.close()
+
+
+@pytest.mark.asyncio
+async def test_tron_transactions_merge_interleaves_sections():
+    """Test that newest-first sections are merged into one newest-first list"""
+    def handler(request):
+        if request.url.path.endswith("/trc20"):
+            data = [{"transaction_id": f"trc20-{ts}", "block_timestamp": ts} for ts in (5000, 2000)]
+        else:
+            data = [{"txID": f"trx-{ts}", "block_timestamp": ts} for ts in (6000, 3000, 1000)]
+        assert request.url.params["order_by"] == "block_timestamp,desc"
+        return httpx.Response(200, json={"data": data})
+
+    service = make_service(handler)
+    transactions = await service.get_tron_transactions(TRON_ADDRESS)
+    await service.close()
+
+    assert [tx["hash"] for tx in transactions] == [
+        "trx-6000", "trc20-5000", "trx-3000", "trc20-2000", "trx-1000"
+    ]
+
+
+@pytest.mark.asyncio
+async def test_transient_errors_are_retried():
+    """Test that 429 and 5xx responses are retried before giving up"""
+    responses = iter([httpx.Response(429, headers={"Retry-After": "0"}), httpx.Response(200, json={"ok": 1})])
+    service = make_service(lambda request: next(responses))
+
+    assert await service._trongrid_request("v1/accounts/x") == {"ok": 1}
+    await service.close()
+
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_skips_failing_provider():
+    """Test that repeated failures stop further calls to the provider"""
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.path)
+        return httpx.Response(503)
+
+    service = make_service(handler)
+    for _ in range(service.BREAKER_FAILURE_THRESHOLD + 2):
+        assert await service._trongrid_request("v1/accounts/x") is None
+    await service.close()
+
+    # Each failed call used both attempts until the circuit opened
+    assert len(calls) == service.BREAKER_FAILURE_THRESHOLD * 2
+
+
+@pytest.mark.asyncio
+async def test_transactions_follow_pagination(monkeypatch):
+    """Test that cursor pages are fetched and returned as one list"""
+    monkeypatch.setenv("MORALIS_API_KEY", "test-key")
+    cursors = []
+
+    def handler(request):
+        if request.url.path.endswith("/transfers"):
+            return httpx.Response(200, json={"result": []})
+        cursor = request.url.params.get("cursor")
+        cursors.append(cursor)
+        if cursor is None:
+            return httpx.Response(200, json={
+                "result": [{"hash": "tx-2", "block_timestamp": "2000"}],
+                "cursor": "page-2"
+            })
+        return httpx.Response(200, json={"result": [{"hash": "tx-1", "block_timestamp": "1000"}]})
+
+    service = make_service(handler)
+    transactions = await service.get_eth_transactions(ETH_ADDRESS)
+    await service.close()
+
+    assert cursors == [None, "page-2"]
+    assert [tx["hash"] for tx in transactions] == ["tx-2", "tx-1"]
+
+
+@pytest.mark.asyncio
+async def test_eth_transactions_have_utc_timestamps(monkeypatch):
+    """Test that native and token timestamps are comparable UTC datetimes"""
+    monkeypatch.setenv("MORALIS_API_KEY", "test-key")
+
+    def handler(request):
+        if request.url.path.endswith("/transfers"):
+            return httpx.Response(200, json={"result": [
+                {"transaction_hash": "token-tx", "block_timestamp": "2025-11-30T12:00:00.000Z"}
+            ]})
+        return httpx.Response(200, json={"result": [
+            {"hash": "native-tx", "block_timestamp": "2025-11-30T13:00:00.000Z"}
+        ]})
+
+    service = make_service(handler)
+    transactions = await service.get_eth_transactions(ETH_ADDRESS)
+    await service.close()
+
+    assert [tx["hash"] for tx in transactions] == ["native-tx", "token-tx"]
+    assert transactions[1]["timestamp"] == datetime(2025, 11, 30, 12, tzinfo=timezone.utc)
+
+
+@pytest.mark.asyncio
+async def test_get_tron_balance_resolves_trc20_tokens():
+    """Test that known TRC20 contracts get their symbol and unknown ones a placeholder"""
+    def handler(request):
+        return httpx.Response(200, json={"data": [{
+            "balance": 2_000_000,
+            "trc20": {
+                "TR7NHqjeKQxGTCi8q8ZY4pL8otSzgjLj6t": "1500000",
+                "Tunknown": "7000000",
+            },
+        }]})
+
+    service = make_service(handler)
+    balance = await service.get_tron_balance(TRON_ADDRESS)
+    await service.close()
+
+    assert balance["native_balance"] == Decimal("2")
+    assert [(t["symbol"], t["balance"]) for t in balance["tokens"]] == [
+        ("USDT", Decimal("1.5")),
+        ("UNKNOWN", Decimal("7")),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_get_many_wallet_balances_batches_native_eth(monkeypatch):
+    """Test that native ETH balances of several wallets come from one batched call"""
+    monkeypatch.setenv("MORALIS_API_KEY", "test-key")
+    other = "0x" + "d" * 40
+    paths = []
+
+    def handler(request):
+        paths.append(request.url.path)
+        if request.url.path.endswith("/wallets/balances"):
+            assert request.url.params["wallet_addresses[1]"] == other
+            return httpx.Response(200, json=[{"chain": "0x1", "wallet_balances": [
+                {"address": ETH_ADDRESS, "balance": str(10**18)},
+                {"address": other, "balance": str(3 * 10**18)},
+            ]}])
+        return httpx.Response(200, json=[])
+
+    service = make_service(handler)
+    balances = await service.get_many_wallet_balances([ETH_ADDRESS, other])
+    await service.close()
+
+    assert [b["native_balance"] for b in balances] == [Decimal("1"), Decimal("3")]
+    assert paths.count("/api/v2.2/wallets/balances") == 1
+    assert not any(path.endswith("/balance") for path in paths)
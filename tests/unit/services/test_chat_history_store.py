@@ -0,0 +1,84 @@
+"""
+Unit tests for Redis-backed ChatHistoryStore
+"""
+import pytest
+import orjson
+from unittest.mock import AsyncMock, MagicMock
+from src.app.services.chat_history_store import ChatHistoryStore
+
+
+@pytest.fixture
+def mock_pipeline():
+    """Mock Redis pipeline (commands are queued, execute is awaited)"""
+    pipe_mock = MagicMock()
+    pipe_mock.__aenter__ = AsyncMock(return_value=pipe_mock)
+    pipe_mock.__aexit__ = AsyncMock(return_value=False)
+    pipe_mock.execute = AsyncMock(return_value=[])
+    return pipe_mock
+
+
+@pytest.fixture
+def mock_redis(mock_pipeline):
+    """Mock Redis client"""
+    redis_mock = AsyncMock()
+    redis_mock.pipeline = MagicMock(return_value=mock_pipeline)
+    return redis_mock
+
+
+@pytest.fixture
+def store(mock_redis):
+    return ChatHistoryStore(max_messages=3, redis_client=mock_redis)
+
+
+@pytest.mark.asyncio
+async def test_get_reads_newest_first_list_every_time(store, mock_redis):
+    """Test that a history is loaded oldest first, always from Redis"""
+    mock_redis.lrange.return_value = [
+        orjson.dumps({"role": "assistant", "content": "b"}),
+        orjson.dumps({"role": "user", "content": "a"}),
+    ]
+
+    first = await store.get("user_1")
+    # Another instance appends meanwhile
+    mock_redis.lrange.return_value = [
+        orjson.dumps({"role": "user", "content": "c"}),
+        *mock_redis.lrange.return_value,
+    ]
+    second = await store.get("user_1")
+
+    assert [msg["content"] for msg in first] == ["a", "b"]
+    assert [msg["content"] for msg in second] == ["a", "b", "c"]
+    assert mock_redis.lrange.await_count == 2
+    mock_redis.lrange.assert_awaited_with("history:user_1", 0, 2)
+
+
+@pytest.mark.asyncio
+async def test_append_pushes_and_trims_atomically(store, mock_redis, mock_pipeline):
+    """Test that append is one LPUSH + LTRIM + EXPIRE transaction"""
+    message = {"role": "user", "content": "hi"}
+    await store.append("user_1", message)
+
+    mock_redis.pipeline.assert_called_once_with(transaction=True)
+    mock_pipeline.lpush.assert_called_once_with("history:user_1", orjson.dumps(message))
+    mock_pipeline.ltrim.assert_called_once_with("history:user_1", 0, 2)
+    mock_pipeline.expire.assert_called_once_with("history:user_1", ChatHistoryStore.HISTORY_TTL)
+    mock_pipeline.execute.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_replace_oldest_updates_redis(store, mock_redis, mock_pipeline):
+    """Test that the oldest messages are swapped for one message"""
+    summary = {"role": "system", "content": "summary"}
+    await store.replace_oldest("user_1", 2, summary)
+
+    mock_pipeline.rpop.assert_called_once_with("history:user_1", 2)
+    mock_pipeline.rpush.assert_called_once_with("history:user_1", orjson.dumps(summary))
+    mock_redis.pipeline.assert_called_once_with(transaction=True)
+
+
+@pytest.mark.asyncio
+async def test_clear_drops_redis_key(store, mock_redis):
+    """Test that clear deletes the user's list"""
+    await store.clear("user_1")
+
+    mock_redis.delete.assert_awaited_once_with("history:user_1")
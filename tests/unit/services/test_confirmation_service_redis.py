@@ -2,16 +2,80 @@
 Unit tests for Redis-based ConfirmationService
 """
 import pytest
-from unittest.mock import AsyncMock, MagicMock, patch
-from datetime import datetime, timedelta
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, Mock, patch
+import time
 import json
+import orjson
+from dataclasses import asdict
 from src.app.services.confirmation_service import ConfirmationService
+from src.domain.category import Category, CategoryType
+from src.infrastructure.database import Database
+from src.infrastructure.repositories.merchant_repository import MerchantRepository
+
+
+MESSAGE_FIELDS = ("user_id", "text", "category", "expires_at")
+
+
+def _category(name):
+    """User expense category as returned by CategoryRepository"""
+    return Category(id=name.lower(), user_id="123", name=name, type=CategoryType.EXPENSE)
+
+
+def _hash_reply(confirmation_data, fields):
+    """HMGET reply for a confirmation stored as a Redis hash"""
+    stored = {
+        "user_id": confirmation_data["user_id"].encode(),
+        "tx": orjson.dumps(confirmation_data["transaction_data"]),
+        "sugg": orjson.dumps(confirmation_data["ai_suggestion"]),
+        "text": ConfirmationService._format_message(
+            confirmation_data["transaction_data"], confirmation_data["ai_suggestion"]
+        ).encode(),
+        "category": (confirmation_data["ai_suggestion"].get("category") or "").encode(),
+        "expires_at": str(confirmation_data.get("expires_at", 0)).encode(),
+    }
+    return [stored[field] for field in fields]
+
+
+def _claim_reply(confirmation_data, ttl_ms=3_600_000):
+    """Claim script reply: remaining TTL followed by the removed hash fields"""
+    fields = ("user_id", "tx", "sugg", "text", "category")
+    reply = [ttl_ms]
+    for field, value in zip(fields, _hash_reply(confirmation_data, fields)):
+        reply += [field.encode(), value]
+    return reply
+
+
+@pytest.fixture
+def mock_pipeline():
+    """Mock Redis pipeline (commands are queued, execute is awaited)"""
+    pipe_mock = MagicMock()
+    pipe_mock.__aenter__ = AsyncMock(return_value=pipe_mock)
+    pipe_mock.__aexit__ = AsyncMock(return_value=False)
+    pipe_mock.execute = AsyncMock(return_value=[None, None])
+    return pipe_mock
+
+
+@pytest.fixture
+def mock_claim_script():
+    """Mock registered claim script (owner check + removal)"""
+    return AsyncMock(return_value=None)
 
 
 @pytest.fixture
-def mock_redis():
+def mock_release_lock_script():
+    """Mock registered lock release script (check-and-delete)"""
+    return AsyncMock(return_value=1)
+
+
+@pytest.fixture
+def mock_redis(mock_pipeline, mock_claim_script, mock_release_lock_script):
     """Mock Redis client"""
     redis_mock = AsyncMock()
+    redis_mock.pipeline = MagicMock(return_value=mock_pipeline)
+    redis_mock.register_script = MagicMock(
+        side_effect=lambda script: mock_claim_script if "HGETALL" in script else mock_release_lock_script
+    )
     redis_mock.setex = AsyncMock()
     redis_mock.get = AsyncMock()
     redis_mock.delete = AsyncMock()
@@ -20,16 +84,18 @@ def mock_redis():
     redis_mock.scard = AsyncMock()
     redis_mock.expire = AsyncMock()
     redis_mock.scan = AsyncMock()
-    redis_mock.ttl = AsyncMock()
+    redis_mock.config_set = AsyncMock()
     return redis_mock
 
 
 @pytest.fixture
 def mock_repos():
     """Mock repositories"""
+    category_repo = AsyncMock()
+    category_repo.get_user_categories = Mock(return_value=[])
     return {
         "transaction_repo": AsyncMock(),
-        "category_repo": AsyncMock(),
+        "category_repo": category_repo,
         "merchant_repo": AsyncMock()
     }
 
@@ -45,8 +111,21 @@ def confirmation_service(mock_redis, mock_repos):
     )
 
 
+def test_default_redis_client_uses_shared_pool(mock_repos):
+    """Test that services without an injected client share one bytes-mode pool"""
+    first = ConfirmationService(
+        mock_repos["transaction_repo"], mock_repos["category_repo"], mock_repos["merchant_repo"]
+    )
+    second = ConfirmationService(
+        mock_repos["transaction_repo"], mock_repos["category_repo"], mock_repos["merchant_repo"]
+    )
+    
+    assert first.redis.connection_pool is second.redis.connection_pool
+    assert first.redis.connection_pool.connection_kwargs["decode_responses"] is False
+
+
 @pytest.mark.asyncio
-async def test_create_confirmation_request(confirmation_service, mock_redis):
+async def test_create_confirmation_request(confirmation_service, mock_redis, mock_pipeline):
     """Test creating confirmation request in Redis"""
     user_id = "123"
     transaction_data = {
@@ -69,14 +148,63 @@ async def test_create_confirmation_request(confirmation_service, mock_redis):
     # Verify confirmation ID format
     assert confirmation_id.startswith(f"conf_{user_id}_")
     
-    # Verify Redis calls
-    assert mock_redis.setex.called
-    assert mock_redis.sadd.called
-    assert mock_redis.expire.called
+    # Verify Redis calls are sent as one transaction
+    mock_redis.pipeline.assert_called_once_with(transaction=True)
+    stored = mock_pipeline.hset.call_args.kwargs["mapping"]
+    assert stored["user_id"] == user_id
+    assert orjson.loads(stored["tx"]) == transaction_data
+    assert stored["expires_at"] - stored["created_at"] == 86400
+    mock_pipeline.sadd.assert_called_once_with(f"cfu:{user_id}".encode(), confirmation_id)
+    assert mock_pipeline.expire.called
+    mock_pipeline.execute.assert_awaited_once()
+    assert not mock_redis.setex.called
+
+
+@pytest.mark.asyncio
+async def test_confirmation_ids_are_unique(confirmation_service):
+    """Test that requests created in the same second get distinct IDs"""
+    ids = {
+        await confirmation_service.create_confirmation_request(
+            user_id="12_3", transaction_data={}, ai_suggestion={}
+        )
+        for _ in range(5)
+    }
+    
+    assert len(ids) == 5
+    assert {confirmation_service._user_id_from_confirmation_id(i) for i in ids} == {"12_3"}
+
+
+@pytest.mark.asyncio
+async def test_create_confirmation_request_prewarms_categories(
+    confirmation_service, mock_redis, mock_repos
+):
+    """Test that creating a request caches the user's categories in the background"""
+    mock_redis.exists.return_value = 0
+    mock_repos["category_repo"].get_user_categories.return_value = [_category("Transport")]
+    
+    await confirmation_service.create_confirmation_request(
+        user_id="123", transaction_data={}, ai_suggestion={}
+    )
+    await asyncio.gather(*confirmation_service._background_tasks)
+    
+    mock_repos["category_repo"].get_user_categories.assert_called_once_with("123", limit=8)
+    mock_redis.setex.assert_called_once_with(
+        b"uc:123", 300, orjson.dumps([asdict(_category("Transport"))])
+    )
 
 
 @pytest.mark.asyncio
-async def test_get_confirmation_message(confirmation_service, mock_redis, mock_repos):
+async def test_prewarm_skips_cached_categories(confirmation_service, mock_redis, mock_repos):
+    """Test that an already cached category list is not reloaded"""
+    mock_redis.exists.return_value = 1
+    
+    await confirmation_service._prewarm_categories("123")
+    
+    assert not mock_repos["category_repo"].get_user_categories.called
+
+
+@pytest.mark.asyncio
+async def test_get_confirmation_message(confirmation_service, mock_redis, mock_pipeline, mock_repos):
     """Test getting confirmation message from Redis"""
     confirmation_id = "conf_123_1234567890"
     
@@ -95,16 +223,16 @@ async def test_get_confirmation_message(confirmation_service, mock_redis, mock_r
             "confidence": 0.75,
             "reasoning": "Coffee shop"
         },
-        "created_at": datetime.now().isoformat(),
-        "expires_at": (datetime.now() + timedelta(hours=24)).isoformat()
+        "created_at": int(time.time()),
+        "expires_at": int(time.time()) + 86400
     }
-    mock_redis.get.return_value = json.dumps(confirmation_data)
+    mock_pipeline.execute.return_value = [_hash_reply(confirmation_data, MESSAGE_FIELDS), None]
     
     # Mock categories
-    mock_repos["category_repo"].get_by_user.return_value = [
-        {"name": "Food & Drinks"},
-        {"name": "Transport"},
-        {"name": "Shopping"}
+    mock_repos["category_repo"].get_user_categories.return_value = [
+        _category("Food & Drinks"),
+        _category("Transport"),
+        _category("Shopping")
     ]
     
     # Get message
@@ -117,10 +245,31 @@ async def test_get_confirmation_message(confirmation_service, mock_redis, mock_r
     assert "suggested_category" in message
     assert "categories" in message
     assert message["suggested_category"] == "Food & Drinks"
+    assert "Starbucks" in message["text"]
+
+
+@pytest.mark.asyncio
+async def test_confirmation_payload_round_trips(
+    confirmation_service, mock_pipeline, mock_repos
+):
+    """Test that the stored hash fields are read back by get_confirmation_message"""
+    confirmation_id = await confirmation_service.create_confirmation_request(
+        user_id="123",
+        transaction_data={"id": "tx_1", "amount": 12.5, "merchant": "Uber"},
+        ai_suggestion={"category": "Transport", "confidence": 0.6}
+    )
+    stored = mock_pipeline.hset.call_args.kwargs["mapping"]
+    assert isinstance(stored["tx"], bytes)
+    
+    mock_pipeline.execute.return_value = [[stored[field] for field in MESSAGE_FIELDS], None]
+    message = await confirmation_service.get_confirmation_message(confirmation_id)
+    
+    assert message["suggested_category"] == "Transport"
+    assert "Uber" in message["text"]
 
 
 @pytest.mark.asyncio
-async def test_get_confirmation_message_expired(confirmation_service, mock_redis):
+async def test_get_confirmation_message_expired(confirmation_service, mock_redis, mock_pipeline):
     """Test getting expired confirmation returns None"""
     confirmation_id = "conf_123_1234567890"
     
@@ -129,10 +278,10 @@ async def test_get_confirmation_message_expired(confirmation_service, mock_redis
         "user_id": "123",
         "transaction_data": {},
         "ai_suggestion": {},
-        "created_at": (datetime.now() - timedelta(days=2)).isoformat(),
-        "expires_at": (datetime.now() - timedelta(days=1)).isoformat()
+        "created_at": int(time.time()) - 2 * 86400,
+        "expires_at": int(time.time()) - 86400
     }
-    mock_redis.get.return_value = json.dumps(confirmation_data)
+    mock_pipeline.execute.return_value = [_hash_reply(confirmation_data, MESSAGE_FIELDS), None]
     
     # Get message
     message = await confirmation_service.get_confirmation_message(confirmation_id)
@@ -142,8 +291,87 @@ async def test_get_confirmation_message_expired(confirmation_service, mock_redis
     assert mock_redis.delete.called
 
 
+def _active_confirmation(user_id="123"):
+    """HMGET reply for a confirmation that has not expired yet"""
+    return _hash_reply({
+        "user_id": user_id,
+        "transaction_data": {"id": "tx_1", "amount": 10.0},
+        "ai_suggestion": {"category": "Transport", "confidence": 0.6},
+        "created_at": int(time.time()),
+        "expires_at": int(time.time()) + 3600
+    }, MESSAGE_FIELDS)
+
+
+@pytest.mark.asyncio
+async def test_get_confirmation_message_uses_cached_categories(
+    confirmation_service, mock_redis, mock_pipeline, mock_repos
+):
+    """Test that cached categories come from the same pipeline as the confirmation"""
+    cached = [{"name": "Transport"}, {"name": "Rent"}]
+    mock_pipeline.execute.return_value = [_active_confirmation(), json.dumps(cached)]
+    
+    message = await confirmation_service.get_confirmation_message("conf_123_1234567890")
+    
+    assert message["categories"] == cached
+    mock_redis.pipeline.assert_called_once_with(transaction=False)
+    mock_pipeline.hmget.assert_called_once_with(
+        b"cf:conf_123_1234567890", *MESSAGE_FIELDS
+    )
+    mock_pipeline.get.assert_called_once_with(b"uc:123")
+    assert not mock_repos["category_repo"].get_user_categories.called
+    assert not mock_redis.get.called
+
+
 @pytest.mark.asyncio
-async def test_process_confirmation_success(confirmation_service, mock_redis, mock_repos):
+async def test_get_confirmation_message_caches_categories_on_miss(
+    confirmation_service, mock_redis, mock_pipeline, mock_repos
+):
+    """Test that categories are loaded once and cached with a short TTL"""
+    categories = [asdict(_category("Transport"))]
+    mock_pipeline.execute.return_value = [_active_confirmation(), None]
+    mock_repos["category_repo"].get_user_categories.return_value = [_category("Transport")]
+    
+    message = await confirmation_service.get_confirmation_message("conf_123_1234567890")
+    
+    assert message["categories"] == categories
+    assert message["categories"][0]["name"] == "Transport"
+    mock_repos["category_repo"].get_user_categories.assert_called_once_with("123", limit=8)
+    mock_redis.setex.assert_called_once_with(
+        b"uc:123", 300, orjson.dumps(categories)
+    )
+
+
+@pytest.mark.asyncio
+async def test_get_confirmation_message_uses_local_categories(
+    confirmation_service, mock_pipeline, mock_repos
+):
+    """Test that repeat views take categories from process memory, not Redis"""
+    cached = [{"name": "Transport"}]
+    mock_pipeline.execute.return_value = [_active_confirmation(), orjson.dumps(cached)]
+    await confirmation_service.get_confirmation_message("conf_123_1234567890")
+    
+    mock_pipeline.get.reset_mock()
+    mock_pipeline.execute.return_value = [_active_confirmation()]
+    message = await confirmation_service.get_confirmation_message("conf_123_1234567890")
+    
+    assert message["categories"] == cached
+    assert not mock_pipeline.get.called
+    assert not mock_repos["category_repo"].get_user_categories.called
+
+
+@pytest.mark.asyncio
+async def test_invalidate_user_categories(confirmation_service, mock_redis):
+    """Test that invalidation drops the cached category list"""
+    confirmation_service._categories_cache["123"] = [{"name": "Old"}]
+    
+    await confirmation_service.invalidate_user_categories("123")
+    
+    mock_redis.delete.assert_called_once_with(b"uc:123")
+    assert "123" not in confirmation_service._categories_cache
+
+
+@pytest.mark.asyncio
+async def test_process_confirmation_success(confirmation_service, mock_claim_script, mock_pipeline, mock_repos):
     """Test successful confirmation processing"""
     confirmation_id = "conf_123_1234567890"
     user_id = "123"
@@ -161,7 +389,7 @@ async def test_process_confirmation_success(confirmation_service, mock_redis, mo
             "confidence": 0.75
         }
     }
-    mock_redis.get.return_value = json.dumps(confirmation_data)
+    mock_claim_script.return_value = _claim_reply(confirmation_data)
     
     # Mock successful transaction update
     mock_repos["transaction_repo"].update = AsyncMock()
@@ -176,22 +404,50 @@ async def test_process_confirmation_success(confirmation_service, mock_redis, mo
     # Verify success
     assert success is True
     assert mock_repos["transaction_repo"].update.called
-    assert mock_redis.delete.called
-    assert mock_redis.srem.called
+    mock_claim_script.assert_awaited_once_with(
+        keys=[f"cf:{confirmation_id}".encode(), f"cfu:{user_id}".encode()],
+        args=[user_id, confirmation_id]
+    )
+    assert not mock_pipeline.execute.called
+
+
+@pytest.mark.asyncio
+async def test_process_confirmation_bounds_db_calls(confirmation_service, mock_claim_script, mock_repos):
+    """Test that concurrent confirmations respect the repository concurrency limit"""
+    confirmation_service._db_semaphore = asyncio.Semaphore(2)
+    active = 0
+    peak = 0
+    
+    async def slow_update(**kwargs):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0)
+        active -= 1
+    
+    mock_repos["transaction_repo"].update = slow_update
+    mock_claim_script.return_value = _claim_reply({
+        "user_id": "123",
+        "transaction_data": {"id": "tx_1"},
+        "ai_suggestion": {"category": "Food"}
+    })
+    
+    results = await asyncio.gather(*(
+        confirmation_service.process_confirmation(f"conf_123_{i}", "Food", "123")
+        for i in range(5)
+    ))
+    
+    assert all(results)
+    assert peak == 2
 
 
 @pytest.mark.asyncio
-async def test_process_confirmation_wrong_user(confirmation_service, mock_redis):
+async def test_process_confirmation_wrong_user(confirmation_service, mock_claim_script, mock_repos):
     """Test confirmation processing with wrong user"""
     confirmation_id = "conf_123_1234567890"
     
-    # Mock Redis response with different user
-    confirmation_data = {
-        "user_id": "123",
-        "transaction_data": {},
-        "ai_suggestion": {}
-    }
-    mock_redis.get.return_value = json.dumps(confirmation_data)
+    # Request belongs to user 123, so the claim script refuses
+    mock_claim_script.return_value = 0
     
     # Try to process with wrong user
     success = await confirmation_service.process_confirmation(
@@ -202,10 +458,58 @@ async def test_process_confirmation_wrong_user(confirmation_service, mock_redis)
     
     # Verify failure
     assert success is False
+    assert not mock_repos["transaction_repo"].update.called
+
+
+@pytest.mark.asyncio
+async def test_large_transaction_data_is_compressed(
+    confirmation_service, mock_pipeline, mock_claim_script, mock_repos
+):
+    """Test that large transaction data is stored compressed and read back intact"""
+    transaction_data = {
+        "id": "tx_1",
+        "merchant": "Market",
+        "items": [{"name": f"item {i}", "price": i} for i in range(100)]
+    }
+    await confirmation_service.create_confirmation_request(
+        user_id="123", transaction_data=transaction_data, ai_suggestion={"category": "Food"}
+    )
+    stored = mock_pipeline.hset.call_args.kwargs["mapping"]
+    
+    assert stored["tx"][:1] == b"\x01"
+    assert len(stored["tx"]) < len(orjson.dumps(transaction_data))
+    
+    mock_claim_script.return_value = [60_000, b"user_id", b"123", b"tx", stored["tx"], b"sugg", stored["sugg"]]
+    mock_repos["transaction_repo"].update = AsyncMock()
+    
+    assert await confirmation_service.process_confirmation("conf_123_aa", "Food", "123") is True
+    assert mock_repos["transaction_repo"].update.call_args.kwargs["transaction_id"] == "tx_1"
+
+
+@pytest.mark.asyncio
+async def test_process_confirmation_restores_on_db_failure(
+    confirmation_service, mock_claim_script, mock_pipeline, mock_repos
+):
+    """Test that a failed transaction update puts the claimed request back"""
+    confirmation_data = {
+        "user_id": "123",
+        "transaction_data": {"id": "tx_1"},
+        "ai_suggestion": {"category": "Food"}
+    }
+    mock_claim_script.return_value = _claim_reply(confirmation_data, ttl_ms=5000)
+    mock_repos["transaction_repo"].update = AsyncMock(side_effect=Exception("db down"))
+    
+    success = await confirmation_service.process_confirmation("conf_123_aa", "Food", "123")
+    
+    assert success is False
+    stored = mock_pipeline.hset.call_args.kwargs["mapping"]
+    assert stored["user_id"] == b"123"
+    mock_pipeline.pexpire.assert_called_once_with(b"cf:conf_123_aa", 5000)
+    mock_pipeline.sadd.assert_called_once_with(b"cfu:123", "conf_123_aa")
 
 
 @pytest.mark.asyncio
-async def test_learn_from_correction(confirmation_service, mock_redis, mock_repos):
+async def test_learn_from_correction(confirmation_service, mock_claim_script, mock_repos):
     """Test learning from user correction"""
     confirmation_id = "conf_123_1234567890"
     user_id = "123"
@@ -222,11 +526,10 @@ async def test_learn_from_correction(confirmation_service, mock_redis, mock_repo
             "confidence": 0.75
         }
     }
-    mock_redis.get.return_value = json.dumps(confirmation_data)
+    mock_claim_script.return_value = _claim_reply(confirmation_data)
     
     # Mock merchant repo
-    mock_repos["merchant_repo"].get_by_merchant.return_value = None
-    mock_repos["merchant_repo"].create = AsyncMock()
+    mock_repos["merchant_repo"].upsert_mapping = Mock()
     mock_repos["transaction_repo"].update = AsyncMock()
     
     # Process confirmation with correction
@@ -236,9 +539,38 @@ async def test_learn_from_correction(confirmation_service, mock_redis, mock_repo
         user_id=user_id
     )
     
-    # Verify learning occurred
+    # Learning runs in the background, after the reply
     assert success is True
-    assert mock_repos["merchant_repo"].create.called
+    assert len(confirmation_service._background_tasks) == 1
+    await asyncio.gather(*confirmation_service._background_tasks)
+    
+    # Verify learning occurred in a single upsert (no lookup first)
+    mock_repos["merchant_repo"].upsert_mapping.assert_called_once_with(
+        user_id=user_id,
+        merchant_name="Starbucks",
+        category_id="Food & Drinks"
+    )
+    assert not mock_repos["merchant_repo"].get_by_merchant.called
+
+
+@pytest.mark.asyncio
+async def test_learn_from_correction_with_sqlite_repository(mock_redis, mock_repos, caplog):
+    """Test that learning writes through the real (blocking) MerchantRepository"""
+    merchant_repo = MerchantRepository(Database(":memory:"))
+    service = ConfirmationService(
+        transaction_repo=mock_repos["transaction_repo"],
+        category_repo=mock_repos["category_repo"],
+        merchant_repo=merchant_repo,
+        redis_client=mock_redis
+    )
+    
+    await service._learn_from_correction("123", "Starbucks", "Food & Drinks", "Shopping")
+    await service._learn_from_correction("123", "STARBUCKS", "Coffee", "Food & Drinks")
+    
+    mapping = merchant_repo.find_mapping("123", "Starbucks")
+    assert mapping["category_id"] == "Coffee"
+    assert mapping["usage_count"] == 2
+    assert "Failed to learn from correction" not in caplog.text
 
 
 @pytest.mark.asyncio
@@ -258,17 +590,123 @@ async def test_get_pending_count(confirmation_service, mock_redis):
 
 
 @pytest.mark.asyncio
-async def test_cleanup_expired(confirmation_service, mock_redis):
-    """Test cleanup of expired confirmations"""
-    # Mock Redis scan response
+async def test_get_pending_confirmations(confirmation_service, mock_redis, mock_pipeline):
+    """Test that pending confirmations are loaded in one pipeline and stale IDs pruned"""
+    live = _hash_reply({
+        "user_id": "123",
+        "transaction_data": {"merchant": "Uber"},
+        "ai_suggestion": {"category": "Transport"},
+        "expires_at": 2_000_000_000
+    }, MESSAGE_FIELDS)
+    mock_redis.smembers.return_value = [b"conf_123_aa", b"conf_123_bb"]
+    mock_pipeline.execute.return_value = [live, [None, None, None, None]]
+    
+    confirmations = await confirmation_service.get_pending_confirmations("123")
+    
+    assert [c["confirmation_id"] for c in confirmations] == ["conf_123_aa"]
+    assert confirmations[0]["suggested_category"] == "Transport"
+    assert confirmations[0]["expires_at"] == 2_000_000_000
+    assert "Uber" in confirmations[0]["text"]
+    assert mock_pipeline.hmget.call_count == 2
+    mock_redis.srem.assert_called_once_with(b"cfu:123", "conf_123_bb")
+
+
+@pytest.mark.asyncio
+async def test_get_pending_confirmations_empty(confirmation_service, mock_redis, mock_pipeline):
+    """Test that a user without pending confirmations costs one round-trip"""
+    mock_redis.smembers.return_value = set()
+    
+    assert await confirmation_service.get_pending_confirmations("123") == []
+    assert not mock_pipeline.execute.called
+
+
+@pytest.mark.asyncio
+async def test_cleanup_expired_unlinks_keys_without_ttl(confirmation_service, mock_redis, mock_pipeline):
+    """Test that keys that would never expire are unlinked in batches"""
     mock_redis.scan.return_value = (0, [
-        b"confirmation:conf_123_1",
-        b"confirmation:conf_123_2"
+        b"cf:conf_123_aa",
+        b"cf:conf_123_bb",
+        b"cf:conf_456_cc",
+        b"cf:not-a-confirmation"
     ])
-    mock_redis.ttl.return_value = -2  # Key doesn't exist
+    mock_pipeline.execute.side_effect = [[-1, 3600, -2], [1, 1]]
+    
+    await confirmation_service.cleanup_expired()
+    
+    mock_redis.scan.assert_called_once_with(0, match="cf:*", count=1000)
+    assert mock_pipeline.ttl.call_count == 3
+    mock_pipeline.unlink.assert_called_once_with("cf:conf_123_aa")
+    mock_pipeline.srem.assert_called_once_with(b"cfu:123", "conf_123_aa")
+    assert not mock_redis.ttl.called
+    assert not mock_redis.delete.called
+
+
+@pytest.mark.asyncio
+async def test_cleanup_expired_holds_lock(confirmation_service, mock_redis, mock_release_lock_script):
+    """Test that the sweep runs under a lock that is released by its owner"""
+    mock_redis.set.return_value = True
+    mock_redis.scan.return_value = (0, [])
     
-    # Run cleanup
     await confirmation_service.cleanup_expired()
     
-    # Verify scan was called
+    token = mock_redis.set.call_args.args[1]
+    mock_redis.set.assert_called_once_with("lock:confirmation_cleanup", token, nx=True, ex=60)
     assert mock_redis.scan.called
+    mock_release_lock_script.assert_awaited_once_with(
+        keys=["lock:confirmation_cleanup"], args=[token]
+    )
+
+
+@pytest.mark.asyncio
+async def test_cleanup_expired_skips_when_locked(confirmation_service, mock_redis, mock_release_lock_script):
+    """Test that only one instance sweeps at a time"""
+    mock_redis.set.return_value = None
+    
+    await confirmation_service.cleanup_expired()
+    
+    assert not mock_redis.scan.called
+    assert not mock_release_lock_script.called
+
+
+@pytest.mark.asyncio
+async def test_on_key_expired_removes_pending_member(confirmation_service, mock_redis):
+    """Test that an expired confirmation is dropped from the user's pending set"""
+    await confirmation_service.on_key_expired(b"cf:conf_123_1234567890")
+    
+    mock_redis.srem.assert_called_once_with(b"cfu:123", "conf_123_1234567890")
+
+
+@pytest.mark.asyncio
+async def test_on_key_expired_ignores_other_keys(confirmation_service, mock_redis):
+    """Test that expiry of unrelated keys is ignored"""
+    await confirmation_service.on_key_expired("uc:123")
+    
+    assert not mock_redis.srem.called
+
+
+@pytest.mark.asyncio
+async def test_expiry_listener_handles_notifications(confirmation_service, mock_redis):
+    """Test that the listener subscribes to expired events and reacts to them"""
+    notified = asyncio.Event()
+    
+    async def listen():
+        yield {"type": "psubscribe", "data": 1}
+        yield {"type": "pmessage", "data": b"cf:conf_42_1"}
+        notified.set()
+        await asyncio.Event().wait()
+    
+    pubsub = MagicMock()
+    pubsub.psubscribe = AsyncMock()
+    pubsub.close = AsyncMock()
+    pubsub.listen = listen
+    mock_redis.pubsub = MagicMock(return_value=pubsub)
+    mock_redis.connection_pool = MagicMock(connection_kwargs={"db": 0})
+    
+    await confirmation_service.start_expiry_listener()
+    await asyncio.wait_for(notified.wait(), timeout=1)
+    await confirmation_service.stop_expiry_listener()
+    
+    mock_redis.config_set.assert_called_once_with("notify-keyspace-events", "Ex")
+    pubsub.psubscribe.assert_called_once_with("__keyevent@0__:expired")
+    mock_redis.srem.assert_called_once_with(b"cfu:42", "conf_42_1")
+    assert pubsub.close.called
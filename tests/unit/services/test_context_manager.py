@@ -2,6 +2,7 @@
 Unit tests for ContextManager
 """
 import pytest
+import asyncio
 from unittest.mock import Mock, AsyncMock
 from datetime import datetime, timedelta
 from src.app.services.context_manager import ContextManager
@@ -97,6 +98,31 @@ class TestContextManager:
         assert result["merchant"] == "Starbucks"
         assert result["amount"] == 6.75
     
+    @pytest.mark.asyncio
+    async def test_categorization_context_fetches_concurrently(self, context_manager, mock_repos):
+        """Test that categories, transactions and mappings are fetched in parallel"""
+        active = 0
+        peak = 0
+        
+        def fetch(result):
+            async def _fetch(*args, **kwargs):
+                nonlocal active, peak
+                active += 1
+                peak = max(peak, active)
+                await asyncio.sleep(0)
+                active -= 1
+                return result
+            return _fetch
+        
+        mock_repos["category_repo"].get_by_user = fetch([{"name": "Food"}])
+        mock_repos["transaction_repo"].get_by_user_and_date_range = fetch([])
+        mock_repos["merchant_repo"].get_by_user = fetch([])
+        
+        result = await context_manager.get_categorization_context("user_123", {})
+        
+        assert result["user_categories"] == ["Food"]
+        assert peak == 3
+    
     @pytest.mark.asyncio
     async def test_get_analyze_spending_context_returns_dict(self, context_manager, mock_repos):
         """Test that get_analyze_spending_context returns a dict"""
@@ -139,6 +165,23 @@ class TestContextManager:
         assert result["spending_by_category"]["Transport"] == pytest.approx(12.00, 0.01)
         assert result["transaction_count"] == 3
     
+    @pytest.mark.asyncio
+    async def test_analyze_spending_by_day_of_week(self, context_manager, mock_repos):
+        """Test that spending is bucketed by weekday, with string and datetime dates"""
+        mock_repos["transaction_repo"].get_by_user_and_date_range = AsyncMock(return_value=[
+            {"date": datetime(2025, 12, 1), "amount": -5.00, "category": "Food"},  # Monday
+            {"date": "2025-12-01T18:30:00", "amount": -2.50, "category": "Food"},
+            {"date": datetime(2025, 12, 7), "amount": -10.00, "category": "Transport"},  # Sunday
+            {"amount": -1.00, "category": "Other"}
+        ])
+        
+        result = await context_manager.get_analyze_spending_context(user_id="user_123")
+        
+        assert result["spending_by_day"]["Monday"] == pytest.approx(7.50)
+        assert result["spending_by_day"]["Sunday"] == pytest.approx(10.00)
+        assert result["spending_by_day"]["Friday"] == 0.0
+        assert result["total_spending"] == pytest.approx(18.50)
+    
     @pytest.mark.asyncio
     async def test_analyze_spending_with_no_transactions(self, context_manager, mock_repos):
         """Test analyze spending with no transactions"""
@@ -173,6 +216,27 @@ class TestContextManager:
         assert "avg_monthly_spending" in result
         assert "spending_by_category" in result
     
+    @pytest.mark.asyncio
+    async def test_budget_context_averages_by_month(self, context_manager, mock_repos):
+        """Test that fetched budget transactions are averaged per category and month"""
+        mock_repos["user_repo"].get_by_id = AsyncMock(return_value={"monthly_income": 3000.0})
+        mock_repos["transaction_repo"].get_by_user_and_date_range = AsyncMock(return_value=[
+            {"amount": -100.0, "category": "Food", "currency": "USD"},
+            {"amount": -50.0, "category": "Transport"},
+            {"amount": 20.0, "category": "Food"},
+            {"amount": -30.0}
+        ])
+        
+        result = await context_manager.get_budget_recommendation_context(user_id="user_123", months=2)
+        
+        assert result["spending_by_category"] == {
+            "Food": pytest.approx(60.0),
+            "Transport": pytest.approx(25.0),
+            "Other": pytest.approx(15.0)
+        }
+        assert result["avg_monthly_spending"] == pytest.approx(100.0)
+        assert result["monthly_income"] == 3000.0
+    
     @pytest.mark.asyncio
     async def test_get_user_categories_returns_defaults_on_empty(self, context_manager, mock_repos):
         """Test that _get_user_categories returns defaults when user has no categories"""
@@ -216,10 +280,40 @@ class TestContextManager:
         result = await context_manager._get_recent_transactions("user_123")
         
         assert len(result) == 1
+        assert result[0]["date"] == "2025-11-29"
         assert result[0]["merchant"] == "Starbucks"
         assert result[0]["amount"] == 5.50  # Absolute value
         assert result[0]["category"] == "Food"
     
+    @pytest.mark.asyncio
+    async def test_get_recent_transactions_formats_only_budgeted_rows(self, context_manager, mock_repos):
+        """Test that only the transactions that fit the token budget are returned"""
+        mock_repos["transaction_repo"].get_by_user_and_date_range = AsyncMock(return_value=[
+            {"date": datetime(2025, 11, 29), "merchant": f"Shop {i}", "amount": -1.0}
+            for i in range(200)
+        ])
+        
+        result = await context_manager._get_recent_transactions("user_123")
+        
+        assert len(result) == context_manager.MAX_RECENT_TRANSACTIONS
+        assert result[0]["merchant"] == "Shop 0"
+    
+    @pytest.mark.asyncio
+    async def test_categorization_context_keeps_rows_within_budget(self, context_manager, mock_repos):
+        """Test that transactions under the token budget are not truncated"""
+        count = context_manager.MAX_RECENT_TRANSACTIONS + 10
+        assert count * context_manager.TOKENS_PER_TRANSACTION <= context_manager.MAX_TOKENS
+        mock_repos["transaction_repo"].get_by_user_and_date_range = AsyncMock(return_value=[
+            {"date": datetime(2025, 11, 29), "merchant": f"Shop {i}", "amount": -1.0}
+            for i in range(count)
+        ])
+        mock_repos["category_repo"].get_by_user = AsyncMock(return_value=[])
+        mock_repos["merchant_repo"].get_by_user = AsyncMock(return_value=[])
+        
+        result = await context_manager.get_categorization_context("user_123", {})
+        
+        assert len(result["recent_transactions"]) == count
+    
     @pytest.mark.asyncio
     async def test_get_merchant_mappings_formats_correctly(self, context_manager, mock_repos):
         """Test that _get_merchant_mappings formats data correctly"""
@@ -236,6 +330,38 @@ class TestContextManager:
         assert result[0]["merchant_name"] == "Starbucks"
         assert result[0]["category"] == "Food"
     
+    @pytest.mark.asyncio
+    async def test_categories_and_mappings_are_cached(self, context_manager, mock_repos):
+        """Test that categories and mappings are fetched once until invalidated"""
+        mock_repos["category_repo"].get_by_user = AsyncMock(return_value=[{"name": "Food"}])
+        mock_repos["merchant_repo"].get_by_user = AsyncMock(return_value=[
+            {"merchant_name": "Starbucks", "category": "Food"}
+        ])
+        
+        for _ in range(2):
+            assert await context_manager._get_user_categories("user_123") == ["Food"]
+            assert len(await context_manager._get_merchant_mappings("user_123")) == 1
+        
+        assert mock_repos["category_repo"].get_by_user.await_count == 1
+        assert mock_repos["merchant_repo"].get_by_user.await_count == 1
+        
+        context_manager.invalidate("user_123")
+        await context_manager._get_user_categories("user_123")
+        await context_manager._get_merchant_mappings("user_123")
+        
+        assert mock_repos["category_repo"].get_by_user.await_count == 2
+        assert mock_repos["merchant_repo"].get_by_user.await_count == 2
+    
+    @pytest.mark.asyncio
+    async def test_error_fallback_is_not_cached(self, context_manager, mock_repos):
+        """Test that a failed category fetch is retried on the next call"""
+        mock_repos["category_repo"].get_by_user = AsyncMock(
+            side_effect=[Exception("DB error"), [{"name": "Food"}]]
+        )
+        
+        assert await context_manager._get_user_categories("user_123") == ["Other"]
+        assert await context_manager._get_user_categories("user_123") == ["Food"]
+    
     def test_manage_tokens_within_limit(self, context_manager):
         """Test that _manage_tokens doesn't limit when within MAX_TOKENS"""
         transactions = [{"date": "2025-11-29", "merchant": "Test", "amount": 10.0}] * 5
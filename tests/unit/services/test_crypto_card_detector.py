@@ -3,7 +3,7 @@ Unit tests for CryptoCardDetector
 """
 import pytest
 from unittest.mock import Mock, AsyncMock
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from src.app.services.crypto_card_detector import CryptoCardDetector
 
 
@@ -108,6 +108,25 @@ class TestCryptoCardDetector:
         
         assert len(result) == 0
     
+    @pytest.mark.asyncio
+    async def test_disjoint_time_ranges_skip_matching(self, detector, base_time):
+        """Test that matching is skipped when USDT and USDC bursts are far apart"""
+        transactions = [
+            {"id": f"usdt_{i}", "currency": "USDT", "amount": -100.0,
+             "timestamp": base_time + timedelta(minutes=i)}
+            for i in range(3)
+        ] + [
+            {"id": f"usdc_{i}", "currency": "USDC", "amount": 100.0,
+             "timestamp": base_time + timedelta(days=2, minutes=i)}
+            for i in range(3)
+        ]
+        detector._find_matching_usdc = Mock()
+        
+        result = await detector.find_usdt_usdc_swaps("user_123", transactions)
+        
+        assert result == []
+        detector._find_matching_usdc.assert_not_called()
+    
     @pytest.mark.asyncio
     async def test_no_match_amount_tolerance(self, detector, base_time):
         """Test no match when amount difference exceeds tolerance"""
@@ -174,6 +193,25 @@ class TestCryptoCardDetector:
         assert result[0]["metadata"]["usdt_tx_id"] == "usdt_1"
         assert result[1]["metadata"]["usdt_tx_id"] == "usdt_2"
     
+    @pytest.mark.asyncio
+    async def test_usdc_matched_only_once(self, detector, base_time):
+        """Test that a USDC credit is paired with at most one USDT transfer"""
+        transactions = [
+            {"id": "usdt_1", "currency": "USDT", "amount": -100.0, "timestamp": base_time},
+            {"id": "usdt_2", "currency": "USDT", "amount": -100.0,
+             "timestamp": base_time + timedelta(seconds=10)},
+            {"id": "usdc_1", "currency": "USDC", "amount": 100.0,
+             "timestamp": base_time + timedelta(seconds=20)},
+            {"id": "usdc_2", "currency": "USDC", "amount": 100.0,
+             "timestamp": base_time + timedelta(minutes=4)},
+        ]
+        
+        result = await detector.find_usdt_usdc_swaps("user_123", transactions)
+        
+        assert [
+            (r["metadata"]["usdt_tx_id"], r["metadata"]["usdc_tx_id"]) for r in result
+        ] == [("usdt_1", "usdc_1"), ("usdt_2", "usdc_2")]
+    
     @pytest.mark.asyncio
     async def test_no_usdt_transactions(self, detector, base_time):
         """Test with no USDT transactions"""
@@ -266,6 +304,29 @@ class TestCryptoCardDetector:
         assert len(result) == 1
         assert result[0]["metadata"]["usdc_tx_id"] == "usdc_2"  # Should pick closer match
     
+    @pytest.mark.asyncio
+    async def test_many_swaps_matched_within_window(self, detector, base_time):
+        """Test matching over a long, unordered history with mixed timestamp types"""
+        transactions = []
+        for i in range(50):
+            usdt_time = base_time + timedelta(minutes=10 * i)
+            usdc_time = usdt_time + timedelta(seconds=20)
+            transactions.append({
+                "id": f"usdt_{i}", "currency": "USDT", "amount": -(100.0 + i),
+                "timestamp": usdt_time.isoformat() if i % 2 else usdt_time
+            })
+            transactions.append({
+                "id": f"usdc_{i}", "currency": "USDC", "amount": 100.0 + i,
+                "timestamp": usdc_time if i % 2 else usdc_time.isoformat()
+            })
+        transactions.reverse()
+        
+        result = await detector.find_usdt_usdc_swaps("user_123", transactions)
+        
+        assert [
+            (r["metadata"]["usdt_tx_id"], r["metadata"]["usdc_tx_id"]) for r in result
+        ] == [(f"usdt_{i}", f"usdc_{i}") for i in range(50)]
+    
     @pytest.mark.asyncio
     async def test_mark_as_internal_transfer(self, detector, mock_transaction_repo):
         """Test marking transactions as internal transfers"""
@@ -276,6 +337,34 @@ class TestCryptoCardDetector:
         assert count == 3
         assert mock_transaction_repo.update.call_count == 3
     
+    def test_epoch_micros_is_exact_and_utc(self):
+        """Test that timestamps convert exactly, naive ones as UTC"""
+        aware = datetime(2025, 11, 30, 12, 0, 0, 123457, tzinfo=timezone.utc)
+        
+        micros = CryptoCardDetector._epoch_micros(aware)
+        
+        assert micros == 1764504000123457
+        assert CryptoCardDetector._epoch_micros(aware.replace(tzinfo=None)) == micros
+        assert CryptoCardDetector._epoch_micros("2025-11-30T12:00:00.123457") == micros
+        assert isinstance(CryptoCardDetector._epoch_micros(None), int)
+    
+    @pytest.mark.asyncio
+    async def test_mixed_naive_and_aware_timestamps_match(self, detector, base_time):
+        """Test that a naive USDT time and an aware UTC USDC time are compared as UTC"""
+        transactions = [
+            {"id": "usdt_1", "currency": "USDT", "amount": -50.0, "timestamp": base_time},
+            {
+                "id": "usdc_1",
+                "currency": "USDC",
+                "amount": 50.0,
+                "timestamp": (base_time + timedelta(seconds=20)).replace(tzinfo=timezone.utc)
+            },
+        ]
+        
+        result = await detector.find_usdt_usdc_swaps("user_123", transactions)
+        
+        assert [r["metadata"]["usdc_tx_id"] for r in result] == ["usdc_1"]
+    
     @pytest.mark.asyncio
     async def test_mark_as_internal_transfer_empty(self, detector, mock_transaction_repo):
         """Test marking with empty list"""
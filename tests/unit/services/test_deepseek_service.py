@@ -0,0 +1,379 @@
+"""
+Tests for DeepSeekService
+"""
+import pytest
+import asyncio
+import json
+import httpx
+from collections import deque
+from cachetools import TTLCache
+from src.app.services.deepseek_service import DeepSeekService
+
+
+class InMemoryHistoryStore:
+    """ChatHistoryStore stand-in keeping histories in a dict"""
+
+    def __init__(self, max_messages):
+        self.max_messages = max_messages
+        self.histories = {}
+
+    async def get(self, user_id):
+        return self.histories.setdefault(user_id, deque(maxlen=self.max_messages))
+
+    async def append(self, user_id, message):
+        (await self.get(user_id)).append(message)
+
+    async def replace_oldest(self, user_id, count, message):
+        history = await self.get(user_id)
+        for _ in range(min(count, len(history))):
+            history.popleft()
+        history.appendleft(message)
+
+    async def exists(self, user_id):
+        return bool(self.histories.get(user_id))
+
+    async def clear(self, user_id):
+        self.histories.pop(user_id, None)
+
+
+def make_service(handler):
+    """DeepSeekService whose HTTP client is served by handler"""
+    service = DeepSeekService(
+        history_store=InMemoryHistoryStore(DeepSeekService.MAX_HISTORY_MESSAGES - 1)
+    )
+    service._client = httpx.AsyncClient(
+        base_url=service.base_url,
+        transport=httpx.MockTransport(handler)
+    )
+    return service
+
+
+def completion(content):
+    """Chat completion response body with a single message"""
+    return {"choices": [{"message": {"role": "assistant", "content": content}}]}
+
+
+@pytest.mark.asyncio
+async def test_make_request_posts_to_chat_completions(monkeypatch):
+    """Test that completions go through the pooled client"""
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test-key")
+    requested = []
+
+    def handler(request):
+        requested.append(request.url.path)
+        return httpx.Response(200, json=completion("hello"))
+
+    service = make_service(handler)
+    result = await service._make_request([{"role": "user", "content": "hi"}])
+    await service.close()
+
+    assert result == "hello"
+    assert requested == ["/v1/chat/completions"]
+
+
+@pytest.mark.asyncio
+async def test_make_request_bounds_concurrency(monkeypatch):
+    """Test that at most MAX_CONCURRENT_REQUESTS completions are in flight"""
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test-key")
+    in_flight = 0
+    peak = 0
+
+    async def handler(request):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return httpx.Response(200, json=completion("ok"))
+
+    service = make_service(handler)
+    results = await asyncio.gather(*(
+        service._make_request([{"role": "user", "content": str(i)}]) for i in range(10)
+    ))
+    await service.close()
+
+    assert results == ["ok"] * 10
+    assert peak == DeepSeekService.MAX_CONCURRENT_REQUESTS
+
+
+@pytest.mark.asyncio
+async def test_make_request_returns_none_on_http_error(monkeypatch):
+    """Test that a failed completion is reported as None"""
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test-key")
+
+    service = make_service(lambda request: httpx.Response(500))
+    result = await service._make_request([{"role": "user", "content": "hi"}])
+    await service.close()
+
+    assert result is None
+
+
+@pytest.mark.asyncio
+async def test_categorize_transactions_batch_uses_one_request_per_batch(monkeypatch):
+    """Test that a batch is categorized with one request and one history reply"""
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test-key")
+    requests_made = 0
+
+    def handler(request):
+        nonlocal requests_made
+        requests_made += 1
+        return httpx.Response(200, json=completion(
+            '```json\n[{"category": "Food", "confidence": 95, "reasoning": "cafe"},'
+            ' {"category": "Transport", "confidence": 90, "reasoning": "taxi"}]\n```'
+        ))
+
+    service = make_service(handler)
+    results = await service.categorize_transactions_batch("user_1", [
+        {"merchant_name": "Starbucks", "amount": 5.5},
+        {"merchant_name": "Uber", "amount": 12, "description": "ride"},
+    ])
+    await service.close()
+
+    assert [r["category"] for r in results] == ["Food", "Transport"]
+    assert requests_made == 1
+    # system prompt, batch prompt, one assistant summary
+    assert await service.get_history_size("user_1") == 3
+
+
+@pytest.mark.asyncio
+async def test_categorize_transactions_batch_falls_back_on_bad_reply(monkeypatch):
+    """Test that an unparseable batch reply falls back to per-transaction requests"""
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test-key")
+    replies = iter([
+        "not json",
+        '{"category": "Food", "confidence": 95, "reasoning": "cafe"}',
+        '{"category": "Transport", "confidence": 90, "reasoning": "taxi"}',
+    ])
+
+    service = make_service(lambda request: httpx.Response(200, json=completion(next(replies))))
+    results = await service.categorize_transactions_batch("user_1", [
+        {"merchant_name": "Starbucks", "amount": 5.5},
+        {"merchant_name": "Uber", "amount": 12},
+    ])
+    await service.close()
+
+    assert [r["category"] for r in results] == ["Food", "Transport"]
+
+
+@pytest.mark.asyncio
+async def test_history_overflow_is_summarized(monkeypatch):
+    """Test that a full history folds its oldest half into one summary message"""
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test-key")
+    service = make_service(lambda request: httpx.Response(200, json=completion("earlier summary")))
+    limit = DeepSeekService.MAX_HISTORY_MESSAGES
+
+    for i in range(limit):
+        await service._add_to_history("user_1", "user", f"message {i}")
+    await service.close()
+
+    history = await service._get_chat_history("user_1")
+    assert len(history) <= limit
+    assert history[0]["content"] == service._get_system_prompt()
+    assert history[1] == {"role": "system", "content": "Summary of earlier conversation: earlier summary"}
+    assert history[-1]["content"] == f"message {limit - 1}"
+
+
+@pytest.mark.asyncio
+async def test_history_overflow_drops_oldest_when_summary_fails(monkeypatch):
+    """Test that the history stays bounded when the summary request fails"""
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test-key")
+    service = make_service(lambda request: httpx.Response(500))
+    limit = DeepSeekService.MAX_HISTORY_MESSAGES
+
+    for i in range(limit + 5):
+        await service._add_to_history("user_1", "user", f"message {i}")
+    await service.close()
+
+    history = await service._get_chat_history("user_1")
+    assert len(history) == limit
+    assert history[0]["role"] == "system"
+    assert history[1]["content"] == "message 6"
+
+
+def sse_body(*contents):
+    """Streaming chat completion body with one SSE frame per content chunk"""
+    frames = [
+        "data: " + json.dumps({"choices": [{"delta": {"content": content}}]})
+        for content in contents
+    ]
+    return ("\n\n".join(frames + ["data: [DONE]"]) + "\n\n").encode()
+
+
+@pytest.mark.asyncio
+async def test_analyze_transactions_streams_chunks(monkeypatch):
+    """Test that analysis chunks are yielded as they arrive and stored once"""
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test-key")
+    payloads = []
+
+    def handler(request):
+        payloads.append(json.loads(request.content))
+        return httpx.Response(
+            200,
+            headers={"content-type": "text/event-stream"},
+            content=sse_body("Spending ", "is ", "stable.")
+        )
+
+    service = make_service(handler)
+    chunks = [
+        chunk async for chunk in service.analyze_transactions(
+            "user_1", [{"type": "expense", "amount": 10}], period_days=30
+        )
+    ]
+    await service.close()
+
+    assert chunks == ["Spending ", "is ", "stable."]
+    assert payloads[0]["stream"] is True
+    history = await service._get_chat_history("user_1")
+    assert history[-1] == {"role": "assistant", "content": "Spending is stable."}
+
+
+@pytest.mark.asyncio
+async def test_analyze_transactions_yields_nothing_on_error(monkeypatch):
+    """Test that a failed stream yields nothing and stores no reply"""
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test-key")
+
+    service = make_service(lambda request: httpx.Response(503))
+    chunks = [
+        chunk async for chunk in service.analyze_transactions("user_1", [], period_days=30)
+    ]
+    await service.close()
+
+    assert chunks == []
+    assert [msg["role"] for msg in await service._get_chat_history("user_1")] == ["system", "user"]
+
+
+@pytest.mark.asyncio
+async def test_truncated_stream_is_not_stored(monkeypatch):
+    """Test that a stream cut off before [DONE] is shown but not kept as a reply"""
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test-key")
+    body = sse_body("Spending ", "is").rsplit(b"data: [DONE]", 1)[0]
+
+    service = make_service(lambda request: httpx.Response(
+        200, headers={"content-type": "text/event-stream"}, content=body
+    ))
+    chunks = [
+        chunk async for chunk in service.analyze_transactions("user_1", [], period_days=30)
+    ]
+    await service.close()
+
+    assert chunks == ["Spending ", "is"]
+    assert [msg["role"] for msg in await service._get_chat_history("user_1")] == ["system", "user"]
+
+
+@pytest.mark.asyncio
+async def test_stream_releases_request_slot_before_consumer_finishes(monkeypatch):
+    """Test that a slow stream consumer does not hold a DeepSeek request slot"""
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test-key")
+
+    service = make_service(lambda request: httpx.Response(
+        200, headers={"content-type": "text/event-stream"}, content=sse_body("a", "b", "c")
+    ))
+    stream = service._stream_request([{"role": "user", "content": "hi"}])
+    assert await stream.__anext__() == "a"
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+    assert service._request_semaphore._value == service.MAX_CONCURRENT_REQUESTS
+    assert [chunk async for chunk in stream] == ["b", "c"]
+    await service.close()
+
+
+@pytest.mark.asyncio
+async def test_categorize_transaction_cached_by_merchant(monkeypatch):
+    """Test that a confident categorization is reused for the same merchant"""
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test-key")
+    requests_made = 0
+
+    def handler(request):
+        nonlocal requests_made
+        requests_made += 1
+        return httpx.Response(200, json=completion(
+            '{"category": "Food", "confidence": 95, "reasoning": "cafe"}'
+        ))
+
+    service = make_service(handler)
+    first = await service.categorize_transaction("user_1", "STARBUCKS #123", 5.5)
+    second = await service.categorize_transaction("user_1", "Starbucks 123", 4.0)
+    other_user = await service.categorize_transaction("user_2", "Starbucks 123", 4.0)
+    await service.close()
+
+    assert first["category"] == second["category"] == other_user["category"] == "Food"
+    assert requests_made == 2
+
+
+@pytest.mark.asyncio
+async def test_categorization_cache_entries_expire(monkeypatch):
+    """Test that cached categorizations are bounded in time, not kept forever"""
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test-key")
+    requests_made = 0
+    now = 0.0
+
+    def handler(request):
+        nonlocal requests_made
+        requests_made += 1
+        return httpx.Response(200, json=completion(
+            '{"category": "Food", "confidence": 95, "reasoning": "cafe"}'
+        ))
+
+    service = make_service(handler)
+    service._categorization_cache = TTLCache(
+        maxsize=service.CATEGORIZATION_CACHE_SIZE,
+        ttl=service.CATEGORIZATION_CACHE_TTL,
+        timer=lambda: now
+    )
+    await service.categorize_transaction("user_1", "Starbucks", 5.5)
+    await service.categorize_transaction("user_1", "Starbucks", 5.5)
+    now += service.CATEGORIZATION_CACHE_TTL + 1
+    await service.categorize_transaction("user_1", "Starbucks", 5.5)
+    await service.close()
+
+    assert requests_made == 2
+    assert list(service._categorization_cache) == [("user_1", "starbucks")]
+
+
+@pytest.mark.asyncio
+async def test_low_confidence_categorization_not_served_from_cache(monkeypatch):
+    """Test that an unsure categorization is asked again"""
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test-key")
+    requests_made = 0
+
+    def handler(request):
+        nonlocal requests_made
+        requests_made += 1
+        return httpx.Response(200, json=completion(
+            '{"category": "Shopping", "confidence": 60, "reasoning": "unclear"}'
+        ))
+
+    service = make_service(handler)
+    await service.categorize_transaction("user_1", "ACME", 20)
+    await service.categorize_transaction("user_1", "ACME", 20)
+    await service.close()
+
+    assert requests_made == 2
+
+
+@pytest.mark.asyncio
+async def test_learned_merchant_skips_batch_request(monkeypatch):
+    """Test that learned merchants are answered without a categorization request"""
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test-key")
+    prompts = []
+
+    def handler(request):
+        prompts.append(json.loads(request.content)["messages"][-1]["content"])
+        if prompts[-1].startswith("Learn"):
+            return httpx.Response(200, json=completion("Noted."))
+        return httpx.Response(200, json=completion(
+            '[{"category": "Transport", "confidence": 90, "reasoning": "taxi"}]'
+        ))
+
+    service = make_service(handler)
+    await service.learn_merchant("user_1", "Starbucks", "Coffee")
+    results = await service.categorize_transactions_batch("user_1", [
+        {"merchant_name": "STARBUCKS", "amount": 5.5},
+        {"merchant_name": "Uber", "amount": 12},
+    ])
+    await service.close()
+
+    assert [r["category"] for r in results] == ["Coffee", "Transport"]
+    assert len(prompts) == 2
+    assert "Uber" in prompts[1] and "STARBUCKS" not in prompts[1]
@@ -28,8 +28,10 @@ class TestDeepSeekWorkerConfidence:
             # Mock repositories
             worker.merchant_repo = AsyncMock()
             worker.context_manager = AsyncMock()
+            worker.context_manager.invalidate = Mock()
             worker.prompt_library = Mock()
             worker.deepseek_service = Mock()
+            worker.deepseek_service._make_request = AsyncMock()
             
             return worker
     
@@ -96,6 +98,7 @@ class TestDeepSeekWorkerConfidence:
             "merchant_name": "Starbucks",
             "category": "Food"
         })
+        worker.context_manager.invalidate.assert_called_once_with("user_123")
         assert result["auto_confirmed"] is True
     
     @pytest.mark.asyncio
@@ -238,3 +241,45 @@ class TestDeepSeekWorkerConfidence:
         # Verify still auto-confirmed despite mapping error
         assert result["auto_confirmed"] is True
         assert result["confidence"] == 0.98
+        worker.context_manager.invalidate.assert_not_called()
+
+
+class TestDeepSeekWorkerPolling:
+    """Test the worker loop when the task queue is empty"""
+    
+    @pytest.fixture
+    def worker(self):
+        """Create DeepSeekWorker instance with mocked dependencies"""
+        with patch('src.worker.AITaskQueue'), \
+             patch('src.worker.DeepSeekService'), \
+             patch('src.worker.Database'), \
+             patch('src.worker.UserRepository'), \
+             patch('src.worker.TransactionRepository'), \
+             patch('src.worker.CategoryRepository'), \
+             patch('src.worker.MerchantRepository'), \
+             patch('src.worker.ContextManager'), \
+             patch('src.worker.PromptLibrary'):
+            
+            from src.worker import DeepSeekWorker
+            return DeepSeekWorker()
+    
+    @pytest.mark.asyncio
+    async def test_empty_poll_does_not_sleep(self, worker):
+        """Test that an empty (already blocking) dequeue is retried immediately"""
+        polls = 0
+        
+        async def dequeue():
+            nonlocal polls
+            polls += 1
+            if polls == 3:
+                worker.running = False
+            return None
+        
+        worker.task_queue.dequeue_task = AsyncMock(side_effect=dequeue)
+        worker.shutdown = AsyncMock()
+        
+        with patch('src.worker.asyncio.sleep', new=AsyncMock()) as sleep:
+            await worker.process_tasks()
+        
+        sleep.assert_not_called()
+        assert worker.task_queue.dequeue_task.await_count == 3